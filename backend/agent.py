@@ -1,7 +1,5 @@
 import asyncio, json
 
-from concurrent.futures import ThreadPoolExecutor
-
 from pydantic_ai import Agent, RunContext, ModelRetry
 from pydantic_ai.tools import ToolDefinition, Tool
 from pydantic_ai.messages import ToolReturn
@@ -11,10 +9,13 @@ from textwrap import dedent
 
 from plotly.graph_objects import Figure
 
+from deps.sql_executor import get_sql_executor, LEGACY_AGENT_SQL_EXECUTOR
+from deps.sql_schema_index import SQLSchemaIndex, get_schema_index
 from state import State, SQLType
 from results.tool_results import PandasDataFrame, PlotlyFigure, SQLQueryResult
 
-from utils import get_plotly_environment
+from settings import settings
+from utils import get_plotly_environment, get_recent_message_text
 
 
 
@@ -31,6 +32,13 @@ def instructions(ctx: RunContext[State]) -> str:
         Reply in the user's language.
     """
 
+def get_legacy_schema_index(ctx: RunContext[State]) -> SQLSchemaIndex:
+    # Table ids are generated on reflection, so they identify the reflected tables
+    return get_schema_index(
+        ("legacy", tuple(table.id for table in ctx.deps.sql_dependency.tables)),
+        ctx.deps.sql_dependency.tables
+    )
+
 async def prepare_sql_tool(
     ctx: RunContext[State], tool_def: ToolDefinition
 ) -> ToolDefinition | None:
@@ -53,12 +61,25 @@ async def prepare_sql_tool(
     else:
         dialect_string = None
     
+    table_subset = None
+    subset_string = ""
+    
+    if len(ctx.deps.sql_dependency.tables) > settings.SQL_SCHEMA_SUBSET_TOP_K:
+        
+        table_subset = get_legacy_schema_index(ctx).get_relevant_tables(
+            get_recent_message_text(ctx),
+            settings.SQL_SCHEMA_SUBSET_TOP_K
+        )
+        
+        subset_string = f"Only {len(table_subset)} of {len(ctx.deps.sql_dependency.tables)} tables are shown. Use the search_database_tables tool to find other tables."
+    
     tool_description = dedent(f"""
         This tool allows you to execute SQL queries on the connected database.
         The database has the following shape:
         <database>
-        {ctx.deps.sql_dependency.get_prompt()}
+        {ctx.deps.sql_dependency.get_prompt(table_subset=table_subset)}
         </database>
+        {subset_string}
         IMPORTANT: {dialect_string}
     """)
     
@@ -72,16 +93,15 @@ async def prepare_sql_tool(
 async def execute_sql_query(ctx: RunContext[State], query: str) -> PandasDataFrame:
     """Executes the SQL and returns the resulting table in JSON"""
 
-    async def execute_query():
-        with ThreadPoolExecutor() as executor:
-            return await asyncio.get_event_loop().run_in_executor(
-                executor,
+    try:
+        result_df = await asyncio.wait_for(
+            asyncio.get_running_loop().run_in_executor(
+                get_sql_executor(LEGACY_AGENT_SQL_EXECUTOR),
                 ctx.deps.sql_dependency.get_dataframe_from_query,
                 query
-            )
-
-    try:
-        result_df = await asyncio.wait_for(execute_query(), timeout=300)
+            ),
+            timeout=300
+        )
 
                 
         
@@ -96,13 +116,24 @@ async def execute_sql_query(ctx: RunContext[State], query: str) -> PandasDataFra
     
     result = SQLQueryResult(
         query=query,
-        result=PandasDataFrame.model_validate(result_df.to_dict(orient="split"))
+        result=PandasDataFrame.from_dataframe(result_df)
     )
     
     ctx.deps.sql_query_results.append(result)
 
     return result.result
 
+@agent.tool(retries=5)
+async def search_database_tables(ctx: RunContext[State], query: str, k: int = 10) -> list[dict]:
+    """Searches the tables of the database by keywords and returns up to k matching tables with their columns"""
+    
+    tables = get_legacy_schema_index(ctx).search(query, k)
+    
+    if not tables:
+        raise ModelRetry(f"No tables found for '{query}'. Try other keywords.")
+    
+    return [table.get_dict() for table in tables]
+
 async def prepare_plotly_tool(
     ctx: RunContext[State], tool_def: ToolDefinition
 ) -> ToolDefinition | None:
@@ -9,13 +9,13 @@ from textwrap import dedent
 from pydantic_ai import Agent, RunContext, ModelRetry, ToolReturn, ToolDefinition
 from pydantic_ai.ag_ui import StateDeps
 
-from ag_ui.core import StateSnapshotEvent, EventType
-
 from states.dashboard_state import DashboardState
 from states.dashboard_config_state import DashboardSQLQueryState
 from results.dashboard_config_results import DashboardSQLQueryResult
 from results.tool_results import PandasDataFrame, PlotlyFigure
 from results.plotly_chart_config_results import BoxChartConfig, ScatterChartConfig, PieChartConfig, LineChartConfig, HistogramChartConfig, BarChartConfig
+from settings import settings
+from utils import get_recent_message_text
 
 dashboard_agent = Agent(deps_type=StateDeps[DashboardState], model="anthropic:claude-sonnet-4-0")
 
@@ -23,6 +23,23 @@ dashboard_agent = Agent(deps_type=StateDeps[DashboardState], model="anthropic:cl
 async def dashboard_instructions(ctx: RunContext[StateDeps[DashboardState]]) -> str:
 
     sql_dependency = await ctx.deps.state.get_sql_dependency()
+    
+    if len(sql_dependency.table_summaries) <= settings.SQL_SCHEMA_SUBSET_TOP_K:
+        database_prompt = sql_dependency.get_instruction_prompt()
+        
+    else:
+        
+        conversation_text = get_recent_message_text(ctx)
+        
+        if ctx.deps.state.dashboard_config.dashboard_sql_query is not None:
+            conversation_text += "\n" + ctx.deps.state.dashboard_config.dashboard_sql_query.parametrized_query
+        
+        relevant_tables = await sql_dependency.get_relevant_tables_async(conversation_text)
+        
+        database_prompt = dedent(f"""
+            The database has {len(sql_dependency.table_summaries)} tables, only the {len(relevant_tables)} tables most relevant to the conversation are listed.
+            Use the search_database_tables tool to find other tables.
+        """) + sql_dependency.get_prompt(short=True, table_subset=relevant_tables, include_table_ids=True)
        
     return dedent(f"""
         You are an AI agent that helps create dashboard configurations based on a connected SQL database.
@@ -33,7 +50,7 @@ async def dashboard_instructions(ctx: RunContext[StateDeps[DashboardState]]) ->
         Make suggestions for dashboards based on the data available in the database.
         The database has the following tables available:
         <database>
-        {sql_dependency.get_instruction_prompt()}
+        {database_prompt}
         </database>
         {sql_dependency.get_dialect_prompt()}
         You can create one SQL query to fetch all the data you need.
@@ -47,6 +64,31 @@ async def dashboard_instructions(ctx: RunContext[StateDeps[DashboardState]]) ->
         4. Communicate with the user, suggest improvements and apply changes. 
     """)
 
+@dashboard_agent.tool()
+async def search_database_tables(
+    ctx: RunContext[StateDeps[DashboardState]],
+    query: str,
+    k: int = 10
+) -> ToolReturn:
+    """
+    Search the tables of the database by keywords, e.g. business terms, table or column names.
+    Returns up to k matching tables with their ids and columns, the most relevant first.
+    Use this tool if the tables you need are not listed in your instructions.
+    """
+    
+    sql_dependency = await ctx.deps.state.get_sql_dependency()
+    
+    tables = await sql_dependency.search_tables_async(query, k)
+    
+    if not tables:
+        raise ModelRetry(f"No tables found for '{query}'. Try other keywords.")
+    
+    return ToolReturn(
+        return_value=[table.get_dict(short=True, include_table_id=True) for table in tables],
+        metadata=ctx.deps.state.get_state_events()
+    )
+
+
 @dashboard_agent.tool()
 async def explore_database_table(
     ctx: RunContext[StateDeps[DashboardState]],
@@ -59,19 +101,14 @@ async def explore_database_table(
     
     sql_dependency = await ctx.deps.state.get_sql_dependency()
     
-    table = sql_dependency.get_table_by_id(table_id)
+    table = await sql_dependency.get_table_async(table_id)
     
     if table is None:
         raise ModelRetry(f"Table with id {table_id} not found in the database")
     
     return ToolReturn(
         return_value=table.get_dict(),
-        metadata=[
-            StateSnapshotEvent(
-                type=EventType.STATE_SNAPSHOT,
-                snapshot=DashboardState.model_validate(ctx.deps.state)
-            )
-        ]
+        metadata=ctx.deps.state.get_state_events()
     )
     
 
@@ -89,22 +126,22 @@ async def get_database_table_content(
     
     sql_dependency = await ctx.deps.state.get_sql_dependency()
     
-    table = sql_dependency.get_table_by_id(table_id)
+    table = await sql_dependency.get_table_async(table_id)
     
     if sql_dependency.connection_params.type == "postgres":
-        sql_query = f"SELECT * FROM {table.table_name} LIMIT {n}"
+        sql_query = f"SELECT * FROM {table.qualified_name} LIMIT {n}"
     
     elif sql_dependency.connection_params.type == "mysql":
-        sql_query = f"SELECT * FROM {table.table_name} LIMIT {n}"
+        sql_query = f"SELECT * FROM {table.qualified_name} LIMIT {n}"
         
     elif sql_dependency.connection_params.type == "mssql":
-        sql_query = f"SELECT TOP {n} * FROM {table.table_name}"
+        sql_query = f"SELECT TOP {n} * FROM {table.qualified_name}"
 
     if table is None:
         raise ModelRetry(f"Table with id {table_id} not found in the database")
     
     try:
-        df = await asyncio.to_thread(sql_dependency.get_dataframe_from_query, sql_query)
+        df = await sql_dependency.get_dataframe_from_query_async(sql_query, max_rows=n)
         result = PandasDataFrame.from_dataframe(df)
         
     except Exception as exc:
@@ -112,12 +149,7 @@ async def get_database_table_content(
     
     return ToolReturn(
         return_value=result.model_dump_json(),
-        metadata=[
-            StateSnapshotEvent(
-                type=EventType.STATE_SNAPSHOT,
-                snapshot=DashboardState.model_validate(ctx.deps.state)
-            )
-        ]
+        metadata=ctx.deps.state.get_state_events()
     )
     
 
@@ -159,27 +191,19 @@ async def execute_sql_query(
     sql_dependency = await ctx.deps.state.get_sql_dependency()
     
     try:
-        result_df = await asyncio.wait_for(
-            asyncio.to_thread(sql_dependency.get_dataframe_from_query, query),
-            timeout=180
-        )
-        result = PandasDataFrame.from_dataframe(result_df.head(n=n))
+        result_df = await sql_dependency.get_dataframe_from_query_async(query, timeout=180, max_rows=n)
+        result = PandasDataFrame.from_dataframe(result_df)
 
         
     except asyncio.TimeoutError as exc:
-        raise ModelRetry("SQL query execution timed out after 30 seconds") from exc
+        raise ModelRetry("SQL query execution timed out after 180 seconds and was cancelled") from exc
 
     except Exception as exc:
         raise ModelRetry(f"Error while executing SQL query: {exc}") from exc
     
     return ToolReturn(
         return_value=result.model_dump_json(),
-        metadata=[
-            StateSnapshotEvent(
-                type=EventType.STATE_SNAPSHOT,
-                snapshot=DashboardState.model_validate(ctx.deps.state)
-            )
-        ]
+        metadata=ctx.deps.state.get_state_events()
     )
     
     
@@ -225,12 +249,7 @@ async def save_dashboard_sql_query(
     
     return ToolReturn(
         return_value=ctx.deps.state.default_dataframe.head(),
-        metadata=[
-            StateSnapshotEvent(
-                type=EventType.STATE_SNAPSHOT,
-                snapshot=DashboardState.model_validate(ctx.deps.state)
-            )
-        ]
+        metadata=ctx.deps.state.get_state_events()
     )
     
 async def prepare_save_dashboard_figure_config(
@@ -268,12 +287,7 @@ async def add_dashboard_figure_config(
     
     return ToolReturn(
         return_value=ctx.deps.state.default_figures[-1],
-        metadata=[
-            StateSnapshotEvent(
-                type=EventType.STATE_SNAPSHOT,
-                snapshot=DashboardState.model_validate(ctx.deps.state)
-            )
-        ]
+        metadata=ctx.deps.state.get_state_events()
     )
     
     
@@ -312,12 +326,7 @@ async def remove_dashboard_figure_config(
     
     return ToolReturn(
         return_value=[fig.model_dump_json(indent=2) for fig in ctx.deps.state.default_figures],
-        metadata=[
-            StateSnapshotEvent(
-                type=EventType.STATE_SNAPSHOT,
-                snapshot=DashboardState.model_validate(ctx.deps.state)
-            )
-        ]
+        metadata=ctx.deps.state.get_state_events()
     )
     
     
@@ -359,10 +368,5 @@ async def edit_dashboard_figure_config(
     
     return ToolReturn(
         return_value=[fig.model_dump_json(indent=2) for fig in ctx.deps.state.default_figures],
-        metadata=[
-            StateSnapshotEvent(
-                type=EventType.STATE_SNAPSHOT,
-                snapshot=DashboardState.model_validate(ctx.deps.state)
-            )
-        ]
+        metadata=ctx.deps.state.get_state_events()
     )
\ No newline at end of file
@@ -1,23 +1,44 @@
-from typing import List
+from contextlib import aclosing
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 
+import logfire
+
+from deps.sql_admission import SQLAdmissionError
 from models.dashboard_config_models import DashboardConfigModel
+from models.json_model_batch import scan_pks, get_many_projections
+from schemas.dashboard_config import DashboardConfigSummary
+from schemas.pagination import Page
 from states.dashboard_config_state import DashboardConfigState
-from schemas.dashboard_evaluation import DashboardEvaluationRequest, DashboardEvaluationResponse
+from schemas.dashboard_evaluation import DashboardEvaluationRequest, DashboardEvaluationResponse, DashboardEvaluationErrorEvent
 
 dashboard_config_router = APIRouter()
-    
+
 @dashboard_config_router.get("/dashboard-config")
-async def get_dashboards() -> List[DashboardConfigModel]:
-    pks = await DashboardConfigModel.all_pks()
-    dashboard_configs = []
+async def get_dashboards(cursor: str | None = Query(None, pattern=r"^\d+$"), limit: int | None = Query(None, gt=0)) -> Page[DashboardConfigSummary]:
+    """
+    Lists summaries of the dashboard configurations without their chart configs, loaded in one pipelined round trip.
+    Without a limit, all dashboards are returned in a single page.
+    """
     
-    async for pk in pks:
-        dashboard_config = await DashboardConfigModel.get(pk)
-        dashboard_configs.append(dashboard_config)
-        
-    return dashboard_configs
+    pks, next_cursor = await scan_pks(DashboardConfigModel, cursor=int(cursor or 0), limit=limit)
+    
+    projections = await get_many_projections(
+        DashboardConfigModel,
+        pks,
+        paths={
+            "sql_dependency_id": "$.dashboard_sql_query.sql_dependency_id",
+            "parametrized_query": "$.dashboard_sql_query.parametrized_query",
+            "title": "$.chart_config.title"
+        },
+        array_lengths={"parameter_count": "$.dashboard_sql_query.dashboard_sql_query_parameters"}
+    )
+    
+    return Page[DashboardConfigSummary](
+        items=[DashboardConfigSummary.model_validate(projection) for projection in projections],
+        next_cursor=str(next_cursor) if next_cursor is not None else None
+    )
 
 @dashboard_config_router.post("/dashboard-config")
 async def create_dashboard_config(
@@ -29,8 +50,53 @@ async def create_dashboard_config(
     await dashboard_config_model.save()
     return dashboard_config_model
 
-@dashboard_config_router.post("/dashboard-config/evaluate-state")
+@dashboard_config_router.post("/dashboard-config/evaluate-state", response_model=DashboardEvaluationResponse)
 async def evaluate_dashboard_config_from_state(
-    dashboard_evaluation_request: DashboardEvaluationRequest
-) -> DashboardEvaluationResponse:
-    return await dashboard_evaluation_request.evaluate()
\ No newline at end of file
+    dashboard_evaluation_request: DashboardEvaluationRequest,
+    use_cache: bool = Query(True, description="Serve the query result from the query cache"),
+    max_age: float | None = Query(None, ge=0, description="Maximum age in seconds of a cached query result")
+) -> Response:
+    """
+    Serializes the response directly, as FastAPI would otherwise validate every cell of the data frame a second time.
+    """
+    try:
+        dashboard_evaluation_response = await dashboard_evaluation_request.evaluate(use_cache=use_cache, max_cache_age=max_age)
+    except SQLAdmissionError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    
+    return Response(content=dashboard_evaluation_response.model_dump_json(), media_type="application/json")
+
+@dashboard_config_router.post("/dashboard-config/evaluate-state/stream")
+async def stream_dashboard_config_evaluation_from_state(
+    dashboard_evaluation_request: DashboardEvaluationRequest,
+    use_cache: bool = Query(True, description="Serve the query result from the query cache"),
+    max_age: float | None = Query(None, ge=0, description="Maximum age in seconds of a cached query result")
+) -> StreamingResponse:
+    """
+    Streams the evaluation as newline delimited JSON events: the schema and row count of the data frame,
+    every figure as soon as it is rendered, the data frame and finally a done event.
+    The query runs before the response starts, so its errors still get a status code.
+    """
+    
+    events = dashboard_evaluation_request.evaluate_stream(use_cache=use_cache, max_cache_age=max_age)
+    
+    try:
+        schema_event = await anext(events)
+    except SQLAdmissionError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    
+    async def stream_events():
+        
+        async with aclosing(events):
+            
+            yield schema_event.model_dump_json() + "\n"
+            
+            try:
+                async for event in events:
+                    yield event.model_dump_json() + "\n"
+            
+            except Exception as exc:
+                logfire.exception("Streaming the dashboard evaluation failed")
+                yield DashboardEvaluationErrorEvent(message=str(exc)).model_dump_json() + "\n"
+    
+    return StreamingResponse(stream_events(), media_type="application/x-ndjson")
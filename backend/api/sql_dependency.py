@@ -1,20 +1,137 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+
+from datetime import datetime, timezone
+
+from uuid import UUID
+
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
 
 from redis_om import NotFoundError
 
 from cryptography.fernet import Fernet
 
+import logfire
+
 from models.sql_dependency_model import SQLBaseDependencyModel
-from deps.sql_dependency import SQLConnectionParams
-from schemas.sql_dependency import SQLBaseDependencyCreateRequest
+from models.sql_reflection_job_model import SQLReflectionJobModel
+from models.sql_schema_snapshot_model import SQLSchemaSnapshotModel
+from deps.sql_admission import SQLAdmissionMetrics, get_admission_controller
+from deps.sql_dependency import SQLConnectionParams, SQLDatabaseTable
+from deps.sql_executor import SQLExecutorMetrics, get_sql_executor_metrics
+from models.json_model_batch import scan_pks, get_many_projections
+from schemas.pagination import Page
+from schemas.sql_dependency import SQLBaseDependencyCreateRequest, SQLDependencySummary
 from settings import settings
 
 sql_dependency_router = APIRouter()
 
 
+async def keep_reflection_job_alive(reflection_job: SQLReflectionJobModel) -> None:
+    """
+    Renews the lock of a running reflection job and records its heartbeat until cancelled.
+    """
+    
+    while True:
+        
+        await asyncio.sleep(settings.SQL_REFLECTION_HEARTBEAT_INTERVAL)
+        
+        try:
+            await SQLReflectionJobModel.renew_lock(reflection_job.pk)
+            reflection_job.heartbeat_at = datetime.now(timezone.utc)
+            await reflection_job.save()
+            
+        except Exception as exc:
+            logfire.warn("Heartbeat of reflection job {pk} failed: {error}", pk=reflection_job.pk, error=str(exc))
+
+
+async def run_reflection_job(dependency_pk: str, incremental: bool = False) -> None:
+    """
+    Reflects the schema of a SQL dependency in the background and records the progress in its reflection job.
+    The caller has to hold the reflection lock of the dependency, which is released once the job finished.
+    
+    Every run stores a snapshot of the table fingerprints. Incremental runs compare it against the previous snapshot
+    and only reflect the tables whose fingerprint changed. Without a previous snapshot, all tables are reflected.
+    """
+    
+    started_at = datetime.now(timezone.utc)
+    
+    reflection_job = SQLReflectionJobModel(
+        pk=dependency_pk,
+        status="running",
+        incremental=incremental,
+        started_at=started_at,
+        heartbeat_at=started_at
+    )
+    await reflection_job.save()
+    
+    heartbeat = asyncio.create_task(keep_reflection_job_alive(reflection_job))
+    
+    try:
+        sql_dependency_model = await SQLBaseDependencyModel.get(dependency_pk)
+        
+        # Taken before reflecting, so changes made during the reflection are picked up by the next refresh
+        try:
+            schema_snapshot = await sql_dependency_model.take_schema_snapshot_async()
+        except Exception as exc:
+            logfire.warn("Schema snapshot of SQL dependency {pk} failed: {error}", pk=dependency_pk, error=str(exc))
+            schema_snapshot = None
+        
+        previous_schema_snapshot = None
+        
+        if incremental and schema_snapshot is not None:
+            try:
+                previous_schema_snapshot = await SQLSchemaSnapshotModel.get(dependency_pk)
+            except NotFoundError:
+                pass
+        
+        if previous_schema_snapshot is None:
+            metadata = await sql_dependency_model.get_metadata_async()
+            await asyncio.to_thread(sql_dependency_model.set_tables_from_metadata, metadata)
+            refreshed_table_count = len(sql_dependency_model.table_summaries)
+            
+        else:
+            schema_diff = previous_schema_snapshot.diff(schema_snapshot)
+            
+            if not schema_diff.is_empty:
+                await sql_dependency_model.load_tables()
+                metadata = await sql_dependency_model.get_metadata_async(tables=schema_diff.get_tables_to_reflect())
+                await asyncio.to_thread(
+                    sql_dependency_model.update_tables_from_metadata,
+                    metadata,
+                    {fingerprint.key for fingerprint in schema_diff.removed}
+                )
+                
+            refreshed_table_count = len(schema_diff.added) + len(schema_diff.changed) + len(schema_diff.removed)
+        
+        await sql_dependency_model.save()
+        
+        if schema_snapshot is not None:
+            await SQLSchemaSnapshotModel(pk=dependency_pk, **schema_snapshot.model_dump()).save()
+        
+    except Exception as exc:
+        logfire.exception("Reflection of SQL dependency {pk} failed", pk=dependency_pk)
+        reflection_job.status = "failed"
+        reflection_job.error = str(exc)
+        
+    else:
+        reflection_job.status = "completed"
+        reflection_job.table_count = len(sql_dependency_model.table_summaries)
+        reflection_job.refreshed_table_count = refreshed_table_count
+        
+    heartbeat.cancel()
+    
+    try:
+        reflection_job.finished_at = datetime.now(timezone.utc)
+        await reflection_job.save()
+        
+    finally:
+        await SQLReflectionJobModel.release_lock(dependency_pk)
+
+
 @sql_dependency_router.post("/sql-dependency")
 async def create_sql_dependency(
-    sql_dependency_request: SQLBaseDependencyCreateRequest
+    sql_dependency_request: SQLBaseDependencyCreateRequest,
+    background_tasks: BackgroundTasks
 ) -> SQLBaseDependencyModel:
 
     sql_connection_params = SQLConnectionParams(
@@ -28,16 +145,56 @@ async def create_sql_dependency(
 
     sql_dependency_model = SQLBaseDependencyModel(
         name=sql_dependency_request.name,
-        connection_params=sql_connection_params
+        connection_params=sql_connection_params,
+        reflection_filter=sql_dependency_request.reflection_filter,
+        tables=[]
     )
-    
-    metadata = sql_dependency_model.get_metadata()
-    sql_dependency_model.set_tables_from_metadata(metadata)
 
     await sql_dependency_model.save()
+    await SQLReflectionJobModel.acquire_lock(sql_dependency_model.pk)
+    await SQLReflectionJobModel(pk=sql_dependency_model.pk, heartbeat_at=datetime.now(timezone.utc)).save()
+    
+    background_tasks.add_task(run_reflection_job, sql_dependency_model.pk)
     
     return sql_dependency_model
 
+@sql_dependency_router.get("/sql-dependency/{dependency_pk}/reflection")
+async def get_sql_dependency_reflection(dependency_pk: str) -> SQLReflectionJobModel:
+    try:
+        reflection_job = await SQLReflectionJobModel.get(dependency_pk)
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Reflection job not found")
+    
+    # The lock of a job lost with its process expired without the job finishing
+    if reflection_job.status in ("pending", "running") and not await SQLReflectionJobModel.is_locked(dependency_pk):
+        reflection_job.status = "failed"
+        reflection_job.error = "The reflection job stopped without finishing"
+    
+    return reflection_job
+
+@sql_dependency_router.post("/sql-dependency/{dependency_pk}/refresh")
+async def refresh_sql_dependency(dependency_pk: str, background_tasks: BackgroundTasks, incremental: bool = True) -> SQLReflectionJobModel:
+    """
+    Starts a reflection job, which by default only re-reflects the tables that changed since the last snapshot.
+    Returns 409 while another reflection of the dependency holds its lock.
+    """
+    
+    try:
+        await SQLBaseDependencyModel.get(dependency_pk)
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="SQL Dependency not found")
+    
+    # Jobs that stopped sending heartbeats lost their lock, so they don't block refreshes
+    if not await SQLReflectionJobModel.acquire_lock(dependency_pk):
+        raise HTTPException(status_code=409, detail="Reflection job already in progress")
+    
+    reflection_job = SQLReflectionJobModel(pk=dependency_pk, incremental=incremental, heartbeat_at=datetime.now(timezone.utc))
+    await reflection_job.save()
+    
+    background_tasks.add_task(run_reflection_job, dependency_pk, incremental)
+    
+    return reflection_job
+
 @sql_dependency_router.get("/sql-dependency/{dependency_pk}")
 async def get_sql_dependency(dependency_pk: str) -> SQLBaseDependencyModel:
     try:
@@ -45,14 +202,73 @@ async def get_sql_dependency(dependency_pk: str) -> SQLBaseDependencyModel:
     except NotFoundError:
         raise HTTPException(status_code=404, detail="SQL Dependency not found")
     
+@sql_dependency_router.get("/sql-dependency/{dependency_pk}/tables")
+async def get_sql_dependency_tables(dependency_pk: str) -> list[SQLDatabaseTable]:
+    try:
+        sql_dependency_model = await SQLBaseDependencyModel.get(dependency_pk)
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="SQL Dependency not found")
+    
+    return await sql_dependency_model.load_tables()
+
+@sql_dependency_router.get("/sql-dependency/{dependency_pk}/tables/{table_id}")
+async def get_sql_dependency_table(dependency_pk: str, table_id: UUID) -> SQLDatabaseTable:
+    try:
+        sql_dependency_model = await SQLBaseDependencyModel.get(dependency_pk)
+        return await sql_dependency_model.get_table_async(table_id)
+    except (NotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail="Table not found")
+    
+@sql_dependency_router.get("/sql-dependency/{dependency_pk}/admission-metrics")
+async def get_sql_dependency_admission_metrics(dependency_pk: str) -> SQLAdmissionMetrics:
+    return get_admission_controller(dependency_pk).get_metrics()
+    
+@sql_dependency_router.get("/sql-executor-metrics")
+async def get_sql_executors_metrics() -> list[SQLExecutorMetrics]:
+    return get_sql_executor_metrics()
+    
+@sql_dependency_router.delete("/sql-dependency/{dependency_pk}")
+async def delete_sql_dependency(dependency_pk: str) -> None:
+    deleted = await SQLBaseDependencyModel.delete(dependency_pk)
+    
+    if not deleted:
+        raise HTTPException(status_code=404, detail="SQL Dependency not found")
+    
+    await SQLReflectionJobModel.delete(dependency_pk)
+    await SQLSchemaSnapshotModel.delete(dependency_pk)
+    await SQLReflectionJobModel.release_lock(dependency_pk)
+    
 @sql_dependency_router.get("/sql-dependency")
-async def get_all_sql_dependencies() -> list[SQLBaseDependencyModel]:
-    primary_keys = await SQLBaseDependencyModel.all_pks()
+async def get_all_sql_dependencies(cursor: str | None = Query(None, pattern=r"^\d+$"), limit: int | None = Query(None, gt=0)) -> Page[SQLDependencySummary]:
+    """
+    Lists summaries of the SQL dependencies without their tables, loaded in one pipelined round trip.
+    Without a limit, all dependencies are returned in a single page.
+    """
     
-    sql_dependencies: list[SQLBaseDependencyModel] = []
+    pks, next_cursor = await scan_pks(SQLBaseDependencyModel, cursor=int(cursor or 0), limit=limit)
     
-    async for pk in primary_keys:
-        sql_dependency = await SQLBaseDependencyModel.get(pk)
-        sql_dependencies.append(sql_dependency)
+    projections = await get_many_projections(
+        SQLBaseDependencyModel,
+        pks,
+        paths={
+            "name": "$.name",
+            "type": "$.connection_params.type",
+            "host": "$.connection_params.host",
+            "database": "$.connection_params.database",
+            "schema_version": "$.schema_version"
+        },
+        array_lengths={"table_count": "$.table_summaries", "inline_table_count": "$.tables"}
+    )
+    
+    for projection in projections:
+        
+        inline_table_count = projection.pop("inline_table_count")
+        
+        # Dependencies stored before table summaries existed only have their tables inline
+        if projection["table_count"] is None:
+            projection["table_count"] = inline_table_count
 
-    return sql_dependencies
\ No newline at end of file
+    return Page[SQLDependencySummary](
+        items=[SQLDependencySummary.model_validate(projection) for projection in projections],
+        next_cursor=str(next_cursor) if next_cursor is not None else None
+    )
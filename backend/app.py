@@ -17,7 +17,13 @@ load_dotenv()
 
 from states.dashboard_state import DashboardState
 from models.dashboard_config_models import DashboardConfigModel
-from models.sql_dependency_model import SQLBaseDependencyModel
+from models.sql_dependency_model import SQLBaseDependencyModel, sql_dependency_cache
+from models.sql_reflection_job_model import SQLReflectionJobModel
+from models.sql_schema_snapshot_model import SQLSchemaSnapshotModel
+from models.sql_table_model import SQLTableModel
+from deps.sql_engine_registry import sql_engine_registry
+from deps.sql_executor import start_sql_executors, shutdown_sql_executors
+from results.plotly_figure_renderer import start_figure_render_pool, shutdown_figure_render_pool
 from settings import settings
 from agents.dashboard_agent import dashboard_agent
 from api.dashboard_config import dashboard_config_router as dashboard_router
@@ -32,8 +38,20 @@ async def lifespan(app: FastAPI):
         url=redis_url,
         decode_responses=True
     )
+    SQLReflectionJobModel.Meta.database = SQLBaseDependencyModel.Meta.database
+    SQLSchemaSnapshotModel.Meta.database = SQLBaseDependencyModel.Meta.database
+    SQLTableModel.Meta.database = SQLBaseDependencyModel.Meta.database
+    
+    start_sql_executors()
+    start_figure_render_pool()
+    sql_dependency_cache.start_listener()
     
     yield
+    
+    await sql_dependency_cache.stop_listener()
+    shutdown_sql_executors()
+    shutdown_figure_render_pool()
+    await sql_engine_registry.dispose_all()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from threading import Lock
+from typing import AsyncIterator
+
+from pydantic import BaseModel
+
+import logfire
+
+from settings import settings
+
+
+sql_admission_wait_time = logfire.metric_histogram(
+    "sql.admission.wait_time",
+    unit="s",
+    description="Time SQL queries waited for admission to their dependency"
+)
+sql_admission_queue_depth = logfire.metric_up_down_counter(
+    "sql.admission.queue_depth",
+    description="SQL queries waiting for admission to their dependency"
+)
+
+
+class SQLQueryPriority(IntEnum):
+    """
+    Admission priority of a query, lower values are admitted first.
+    """
+    
+    INTERACTIVE = 0
+    AGENT = 1
+    
+
+class SQLAdmissionError(Exception):
+    pass
+
+
+class SQLAdmissionQueueFullError(SQLAdmissionError):
+    pass
+
+
+class SQLAdmissionTimeoutError(SQLAdmissionError):
+    pass
+
+
+class SQLAdmissionMetrics(BaseModel):
+    in_flight: int
+    queue_depth: int
+    max_in_flight: int
+    max_queue: int
+    admitted: int
+    rejected: int
+    timed_out: int
+    average_wait_time: float
+    max_wait_time: float
+    
+
+class SQLAdmissionController:
+    """
+    Limits the number of in-flight queries against one SQL dependency.
+    
+    Queries beyond `max_in_flight` wait in a bounded priority queue, in which interactive queries go ahead of
+    agent queries and queries of the same priority are admitted in arrival order.
+    """
+    
+    def __init__(self, key: str, max_in_flight: int, max_queue: int, timeout: float) -> None:
+        self.key = key
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._in_flight: int = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._admitted: int = 0
+        self._rejected: int = 0
+        self._timed_out: int = 0
+        self._total_wait_time: float = 0.0
+        self._max_wait_time: float = 0.0
+        
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, waiter in self._waiters if not waiter.done())
+    
+    @asynccontextmanager
+    async def admit(self, priority: SQLQueryPriority = SQLQueryPriority.AGENT, timeout: float | None = None) -> AsyncIterator[None]:
+        
+        await self.acquire(priority=priority, timeout=timeout)
+        
+        try:
+            yield
+            
+        finally:
+            self.release()
+    
+    async def acquire(self, priority: SQLQueryPriority = SQLQueryPriority.AGENT, timeout: float | None = None) -> None:
+        
+        started_at = time.monotonic()
+        
+        if self._in_flight < self.max_in_flight and not self.queue_depth:
+            self._in_flight += 1
+            self._record_admission(started_at)
+            return
+        
+        if self.queue_depth >= self.max_queue:
+            self._rejected += 1
+            raise SQLAdmissionQueueFullError(f"Too many queries waiting for SQL dependency {self.key}")
+        
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        sql_admission_queue_depth.add(1, {"sql_dependency": self.key})
+        
+        try:
+            await asyncio.wait_for(waiter, timeout=timeout or self.timeout)
+            
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            
+            # The slot may have been handed over right before the wait was abandoned
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+                
+            else:
+                waiter.cancel()
+                sql_admission_queue_depth.add(-1, {"sql_dependency": self.key})
+                
+            if isinstance(exc, asyncio.TimeoutError):
+                self._timed_out += 1
+                raise SQLAdmissionTimeoutError(f"Timed out waiting for admission to SQL dependency {self.key}") from exc
+            
+            raise
+        
+        self._record_admission(started_at)
+        
+    def release(self) -> None:
+        
+        self._in_flight -= 1
+        
+        while self._waiters:
+            
+            _, _, waiter = heapq.heappop(self._waiters)
+            
+            if waiter.done():
+                continue
+            
+            waiter.set_result(None)
+            self._in_flight += 1
+            sql_admission_queue_depth.add(-1, {"sql_dependency": self.key})
+            break
+        
+    def get_metrics(self) -> SQLAdmissionMetrics:
+        
+        return SQLAdmissionMetrics(
+            in_flight=self._in_flight,
+            queue_depth=self.queue_depth,
+            max_in_flight=self.max_in_flight,
+            max_queue=self.max_queue,
+            admitted=self._admitted,
+            rejected=self._rejected,
+            timed_out=self._timed_out,
+            average_wait_time=self._total_wait_time / self._admitted if self._admitted else 0.0,
+            max_wait_time=self._max_wait_time
+        )
+        
+    def _record_admission(self, started_at: float) -> None:
+        
+        wait_time = time.monotonic() - started_at
+        
+        self._admitted += 1
+        self._total_wait_time += wait_time
+        self._max_wait_time = max(self._max_wait_time, wait_time)
+        
+        sql_admission_wait_time.record(wait_time, {"sql_dependency": self.key})
+
+
+_admission_controllers: dict[str, SQLAdmissionController] = {}
+_admission_controllers_lock = Lock()
+
+
+def get_admission_controller(key: str) -> SQLAdmissionController:
+    
+    with _admission_controllers_lock:
+        
+        if key not in _admission_controllers:
+            _admission_controllers[key] = SQLAdmissionController(
+                key=key,
+                max_in_flight=settings.SQL_MAX_IN_FLIGHT_QUERIES,
+                max_queue=settings.SQL_MAX_QUEUED_QUERIES,
+                timeout=settings.SQL_ADMISSION_TIMEOUT
+            )
+            
+        return _admission_controllers[key]
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import math
+
+from typing import Any
+
+from sqlalchemy import Engine, NullPool, create_engine, event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+
+
+# MSSQL queries are cancelled by closing their connection, so its session id is not needed
+BACKEND_ID_QUERIES: dict[str, str] = {
+    "postgresql": "SELECT pg_backend_pid()",
+    "mysql": "SELECT CONNECTION_ID()",
+}
+
+# Keys in the info dictionary of a DBAPI connection, which lives as long as the connection itself
+BACKEND_ID_INFO_KEY = "backend_id"
+STATEMENT_TIMEOUT_INFO_KEY = "statement_timeout"
+
+
+class SQLQueryCancelledError(Exception):
+    pass
+
+
+class SQLQueryHandle:
+    """
+    Tracks the server-side identity of a running query, so it can be interrupted from another task or thread.
+    """
+    
+    def __init__(self) -> None:
+        self.dialect_name: str | None = None
+        self.backend_id: int | None = None
+        self.dbapi_connection: Any = None
+        self.is_async: bool = False
+        self.cancelled: bool = False
+        
+    def attach(self, dialect_name: str, backend_id: int | None, dbapi_connection: Any, is_async: bool = False) -> None:
+        
+        if self.cancelled:
+            raise SQLQueryCancelledError("The query was cancelled before it started")
+        
+        self.dialect_name = dialect_name
+        self.backend_id = backend_id
+        self.dbapi_connection = dbapi_connection
+        self.is_async = is_async
+        
+
+def get_statement_timeout_query(dialect_name: str, timeout: float) -> str | None:
+    """
+    Returns the statement that limits the execution time of the following statements in the session.
+    MSSQL has no session setting for this, pymssql connections get their query timeout on connect instead.
+    """
+    
+    milliseconds = math.ceil(timeout * 1000)
+    
+    if dialect_name == "postgresql":
+        return f"SET statement_timeout = {milliseconds}"
+    
+    elif dialect_name == "mysql":
+        return f"SET SESSION max_execution_time = {milliseconds}"
+    
+    return None
+
+
+def get_cancel_query(dialect_name: str, backend_id: int) -> str | None:
+    
+    if dialect_name == "postgresql":
+        return f"SELECT pg_cancel_backend({int(backend_id)})"
+    
+    elif dialect_name == "mysql":
+        return f"KILL QUERY {int(backend_id)}"
+    
+    return None
+
+
+def register_connection_events(engine: Engine) -> None:
+    """
+    Reads the backend id of every new DBAPI connection of the engine once, instead of once per query.
+    Async engines register their `sync_engine`, whose DBAPI connections are adapted to the blocking interface.
+    """
+    
+    backend_id_query = BACKEND_ID_QUERIES.get(engine.dialect.name)
+    
+    if backend_id_query is None:
+        return
+    
+    @event.listens_for(engine, "connect")
+    def set_backend_id(dbapi_connection: Any, connection_record: Any) -> None:
+        
+        cursor = dbapi_connection.cursor()
+        
+        try:
+            cursor.execute(backend_id_query)
+            connection_record.info[BACKEND_ID_INFO_KEY] = cursor.fetchone()[0]
+        
+        finally:
+            cursor.close()
+        
+        # Drivers which begin a transaction with the first statement must not hand out the connection in one
+        dbapi_connection.rollback()
+
+
+def prepare_connection(connection: Connection, timeout: float | None = None, query_handle: SQLQueryHandle | None = None) -> None:
+    
+    dialect_name = connection.dialect.name
+    
+    # The timeout stays set on the pooled connection, a connection which ran a query with a timeout is reset to no limit (0)
+    if connection.info.get(STATEMENT_TIMEOUT_INFO_KEY) != timeout:
+        
+        statement_timeout_query = get_statement_timeout_query(dialect_name, timeout or 0)
+        
+        if statement_timeout_query is not None:
+            
+            connection.exec_driver_sql(statement_timeout_query)
+            
+            # Settings changed in a transaction are reverted by the rollback when the connection returns to the pool
+            connection.commit()
+            
+            connection.info[STATEMENT_TIMEOUT_INFO_KEY] = timeout
+    
+    if query_handle is not None:
+        query_handle.attach(
+            dialect_name=dialect_name,
+            backend_id=connection.info.get(BACKEND_ID_INFO_KEY),
+            dbapi_connection=connection.connection.dbapi_connection
+        )
+        
+        
+async def prepare_connection_async(connection: AsyncConnection, timeout: float | None = None, query_handle: SQLQueryHandle | None = None) -> None:
+    
+    dialect_name = connection.dialect.name
+    
+    # The timeout stays set on the pooled connection, a connection which ran a query with a timeout is reset to no limit (0)
+    if connection.info.get(STATEMENT_TIMEOUT_INFO_KEY) != timeout:
+        
+        statement_timeout_query = get_statement_timeout_query(dialect_name, timeout or 0)
+        
+        if statement_timeout_query is not None:
+            
+            await connection.exec_driver_sql(statement_timeout_query)
+            
+            # Settings changed in a transaction are reverted by the rollback when the connection returns to the pool
+            await connection.commit()
+            
+            connection.info[STATEMENT_TIMEOUT_INFO_KEY] = timeout
+    
+    if query_handle is not None:
+        
+        raw_connection = await connection.get_raw_connection()
+        
+        # The connection of the driver itself, e.g. the aiosqlite connection, not its SQLAlchemy adapter
+        query_handle.attach(
+            dialect_name=dialect_name,
+            backend_id=connection.info.get(BACKEND_ID_INFO_KEY),
+            dbapi_connection=raw_connection.driver_connection,
+            is_async=True
+        )
+
+
+def cancel_query(engine: Engine, query_handle: SQLQueryHandle) -> None:
+    """
+    Interrupts the statement tracked by the handle on the server.
+    
+    Postgres queries are cancelled through the psycopg2 connection (falling back to `pg_cancel_backend`),
+    MySQL queries with `KILL QUERY`, pymssql connections are closed and SQLite connections interrupted.
+    """
+    
+    query_handle.cancelled = True
+    
+    dialect_name = query_handle.dialect_name
+    dbapi_connection = query_handle.dbapi_connection
+    
+    if dialect_name is None:
+        return
+    
+    if dialect_name == "postgresql" and hasattr(dbapi_connection, "cancel"):
+        dbapi_connection.cancel()
+        return
+    
+    if query_handle.backend_id is not None:
+        
+        cancel_statement = get_cancel_query(dialect_name, query_handle.backend_id)
+        
+        if cancel_statement is not None:
+            
+            # Connections of the pool may all be taken by running queries, including the one to cancel
+            cancel_engine = create_engine(engine.url, poolclass=NullPool)
+            
+            try:
+                with cancel_engine.connect() as connection:
+                    connection.execute(text(cancel_statement))
+                    connection.commit()
+                    
+            finally:
+                cancel_engine.dispose()
+            return
+    
+    if dialect_name == "mssql":
+        dbapi_connection.close()
+        
+    elif dialect_name == "sqlite":
+        dbapi_connection.interrupt()
+        
+
+async def cancel_query_async(async_engine: AsyncEngine, query_handle: SQLQueryHandle) -> None:
+    """
+    Async variant of `cancel_query`. SQLite queries are interrupted through the aiosqlite connection,
+    which interrupts the statement running on its worker thread without waiting for it.
+    The cancel statements of other dialects run on a dedicated connection outside of the pool of the engine.
+    """
+    
+    query_handle.cancelled = True
+    
+    if query_handle.dialect_name is None:
+        return
+    
+    if query_handle.dialect_name == "sqlite":
+        await query_handle.dbapi_connection.interrupt()
+        return
+    
+    if query_handle.backend_id is None:
+        return
+    
+    cancel_statement = get_cancel_query(query_handle.dialect_name, query_handle.backend_id)
+    
+    if cancel_statement is None:
+        return
+    
+    cancel_engine = create_async_engine(async_engine.url, poolclass=NullPool)
+    
+    try:
+        async with cancel_engine.connect() as connection:
+            await connection.execute(text(cancel_statement))
+            await connection.commit()
+            
+    finally:
+        await cancel_engine.dispose()
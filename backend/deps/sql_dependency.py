@@ -1,8 +1,15 @@
 from __future__ import annotations
 
+import asyncio
 import json
 
-from typing import TypedDict, Optional, List, Self
+from contextlib import aclosing
+
+from functools import partial
+
+from hashlib import sha256
+
+from typing import Any, TypedDict, Optional, List, Self, Iterator, AsyncIterator, Awaitable
 
 from textwrap import dedent
 
@@ -12,14 +19,31 @@ from uuid import UUID, uuid4
 
 from cryptography.fernet import Fernet
 
-from pydantic import BaseModel, computed_field, Field, model_validator
+from pydantic import BaseModel, computed_field, Field, PrivateAttr, model_validator
 
-from sqlalchemy import create_engine, MetaData, text, Engine
+from sqlalchemy import MetaData, Table, text, Engine
+from sqlalchemy.engine import URL, Connection
+from sqlalchemy.exc import DBAPIError, NoReferencedTableError, NoReferencedColumnError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncConnection
+from sqlalchemy.sql.elements import TextClause
 
 from pandas import DataFrame, read_sql_query
 
+import logfire
 
+from deps.sql_admission import SQLAdmissionController, SQLQueryPriority, get_admission_controller
+from deps.sql_cancellation import SQLQueryHandle, prepare_connection, prepare_connection_async, cancel_query, cancel_query_async
+from deps.sql_engine_registry import sql_engine_registry
+from deps.sql_executor import get_sql_executor, SQL_REFLECTION_EXECUTOR
+from deps.sql_reflection import SQLReflectionFilter, reflect_metadata_async, reflect_tables_async
+from deps.sql_schema_index import SQLSchemaIndex, get_schema_index, get_cached_schema_index
+from deps.sql_schema_snapshot import SQLSchemaSnapshot, take_schema_snapshot
+from deps.sql_prompt import sql_prompt_cache, render_prompt
+from deps.sql_query_cache import sql_query_cache, normalize_query, get_query_cache_key
+from deps.sql_rewrite import limit_query, exclude_columns_from_query
+from deps.sql_streaming import SQLFetchBudget, collect_dataframe_chunks, collect_dataframe_chunks_async
 from settings import settings
+from utils import import_dependency
 
 class SQLType(StrEnum):
     MSSQL = "mssql"
@@ -27,6 +51,23 @@ class SQLType(StrEnum):
     POSTGRES = "postgres"
     SQLITE = "sqlite"
     
+SQL_DRIVERNAMES: dict[SQLType, str] = {
+    SQLType.MSSQL: "mssql+pymssql",
+    SQLType.MYSQL: "mysql+pymysql",
+    SQLType.POSTGRES: "postgresql+psycopg2",
+    SQLType.SQLITE: "sqlite",
+}
+
+# Installed with the postgres-async, mysql-async and sqlite-async extras, without its driver a dialect runs queries on the SQL executor
+SQL_ASYNC_DRIVERS: dict[SQLType, tuple[str, str]] = {
+    SQLType.MYSQL: ("mysql+aiomysql", "aiomysql"),
+    SQLType.POSTGRES: ("postgresql+asyncpg", "asyncpg"),
+    SQLType.SQLITE: ("sqlite+aiosqlite", "aiosqlite"),
+}
+    
+def as_statement(query: str | TextClause) -> TextClause:
+    return text(query) if isinstance(query, str) else query
+    
 class SQLDatasourceDict(TypedDict):
     sql_dialect: SQLType
     tables: list[SQLDatabaseTable]
@@ -43,6 +84,70 @@ class SQLConnectionParams(BaseModel):
     def password(self) -> str:
         return Fernet(settings.DB_PASSWORD_KEY).decrypt(self.encrypted_password).decode()
     
+    @property
+    def fingerprint(self) -> str:
+        """
+        Hash of everything that identifies a connection, used to detect changed connection parameters.
+        """
+        
+        return sha256(
+            "|".join([
+                self.type,
+                self.host,
+                str(self.port),
+                self.username,
+                self.database,
+                self.encrypted_password.decode()
+            ]).encode()
+        ).hexdigest()
+    
+    def get_url(self) -> URL:
+        
+        if self.type not in SQL_DRIVERNAMES:
+            raise ValueError("Unsupported SQL dialect")
+        
+        return self._create_url(SQL_DRIVERNAMES[self.type])
+    
+    def get_connect_args(self) -> dict:
+        """
+        Driver arguments for new connections.
+        MSSQL has no session statement timeout, so the query timeout of pymssql is set on connect.
+        """
+        
+        if self.type == SQLType.MSSQL:
+            return {"timeout": settings.SQL_STATEMENT_TIMEOUT}
+        
+        return {}
+    
+    def get_async_url(self) -> URL | None:
+        """
+        Returns the URL for the async driver of the dialect, or None if no async driver is installed.
+        """
+        
+        if self.type not in SQL_ASYNC_DRIVERS:
+            return None
+        
+        drivername, module_name = SQL_ASYNC_DRIVERS[self.type]
+        
+        if import_dependency(module_name, errors="ignore") is None:
+            return None
+        
+        return self._create_url(drivername)
+    
+    def _create_url(self, drivername: str) -> URL:
+        
+        if self.type == SQLType.SQLITE:
+            return URL.create(drivername=drivername, database=self.database)
+        
+        return URL.create(
+            drivername=drivername,
+            username=self.username,
+            password=self.password,
+            host=self.host,
+            port=self.port,
+            database=self.database
+        )
+    
 class JoinDict(TypedDict):
     table: str
     table_id: Optional[str]
@@ -75,6 +180,8 @@ class SQLJoin(BaseModel):
     table_id: UUID
     column_key: str
     column_id: UUID
+    constraint: str | None = None
+    composite: bool = False
 
 class SQLTableColumn(BaseModel):
     id: UUID = Field(default_factory=uuid4)
@@ -88,19 +195,41 @@ class SQLTableColumn(BaseModel):
     unique: bool | None = None
     comment: str | None = None
     join: SQLJoin | None = None
+    joins: list[SQLJoin] = []
+    
+    def get_joins(self) -> list[SQLJoin]:
+        """
+        Returns all joins of the column. Columns stored before `joins` existed only have `join` set.
+        """
+        
+        if self.joins:
+            return self.joins
+        
+        return [self.join] if self.join is not None else []
 
 
 class SQLDatabaseTable(BaseModel):
     id: UUID = Field(default_factory=uuid4)
     table_name: str
+    schema_name: str | None = None
     description: str | None
     comment: str | None
     columns: list[SQLTableColumn] = []
     
+    @property
+    def qualified_name(self) -> str:
+        """
+        Schema qualified name of the table, in the format of SQLAlchemy's `Table.key`.
+        Not named `key`, which `SQLTableModel` inherits from `JsonModel` as the key of its record.
+        Tables of the default schema are reflected without schema and keep their plain name.
+        """
+        
+        return f"{self.schema_name}.{self.table_name}" if self.schema_name else self.table_name
+    
     def get_dict(self, short: bool = False, table_subset: list[SQLDatabaseTable] | None = None, include_table_id: bool = False, include_column_ids: bool = False) -> TableDict:
             
         table_dict: TableDict = {
-            "table_name": self.table_name,
+            "table_name": self.qualified_name,
             "description": self.description,
             "comment": self.comment,
             "columns": []
@@ -109,6 +238,8 @@ class SQLDatabaseTable(BaseModel):
         if include_table_id:
             table_dict["id"] = str(self.id)
             
+        table_subset_ids = {table.id for table in table_subset} if table_subset is not None else None
+            
         for column in self.columns:
             
             if short:
@@ -127,29 +258,33 @@ class SQLDatabaseTable(BaseModel):
                     }.items() if ((value is not None) and (not column.exclude))
                 }
             
-                if column.join is not None:
+                joins = column.get_joins()
+                
+                if table_subset_ids is not None:
+                    joins = [join for join in joins if join.table_id in table_subset_ids]
                     
-                    if table_subset is None:
-                        
-                        column_dict["join"] = {
-                            "table": column.join.table,
-                            "column_key": column.join.column_key
-                        }
-                        
-                        if include_column_ids:
-                            column_dict["join"]["id"] = column.join.column_id
-                        
-                    else:
+                join_dicts = []
+                
+                for join in joins:
+                    
+                    join_dict = {
+                        "table": join.table,
+                        "column_key" if table_subset_ids is None else "column": join.column_key
+                    }
+                    
+                    if join.composite:
+                        join_dict["constraint"] = join.constraint
+                    
+                    if include_column_ids:
+                        join_dict["id"] = join.column_id
                         
-                        if column.join.table_id in [table.id for table in table_subset]:
-                            
-                            column_dict["join"] = {
-                                "table": column.join.table,
-                                "column": column.join.column_key
-                            }
-                            
-                            if include_column_ids:
-                                column_dict["join"]["id"] = column.join.column_id
+                    join_dicts.append(join_dict)
+                    
+                if len(join_dicts) == 1:
+                    column_dict["join"] = join_dicts[0]
+                    
+                elif len(join_dicts) > 1:
+                    column_dict["joins"] = join_dicts
                                 
             if include_column_ids:
                 column_dict["id"] = str(column.id)
@@ -169,11 +304,41 @@ class SQLDatabaseTable(BaseModel):
             else:
                 column.exclude = False
 
+    def get_instruction_dict(self) -> TableDict:
+        return self.get_summary().get_instruction_dict()
+    
+    def get_summary(self) -> SQLTableSummary:
+        return SQLTableSummary(
+            id=self.id,
+            table_name=self.table_name,
+            schema_name=self.schema_name,
+            description=self.description,
+            comment=self.comment,
+            column_count=len(self.columns)
+        )
+    
+    
+class SQLTableSummary(BaseModel):
+    """
+    Table without its columns, kept on the dependency so listing tables doesn't require loading them.
+    """
+    
+    id: UUID
+    table_name: str
+    schema_name: str | None = None
+    description: str | None = None
+    comment: str | None = None
+    column_count: int = 0
+    
+    @property
+    def qualified_name(self) -> str:
+        return f"{self.schema_name}.{self.table_name}" if self.schema_name else self.table_name
+
     def get_instruction_dict(self) -> TableDict:
         
         table_dict: TableDict = {
             "id": str(self.id),
-            "name": self.table_name
+            "name": self.qualified_name
         }
         
         if self.description:
@@ -190,43 +355,114 @@ class SQLBaseDependency(BaseModel):
     name: str
     connection_params: SQLConnectionParams | None = None
     tables: list[SQLDatabaseTable] | None = None
+    table_summaries: list[SQLTableSummary] = []
     table_subset: list[SQLDatabaseTable] | None = None
     column_names_to_exclude: list[str]| None = None
+    reflection_filter: SQLReflectionFilter | None = None
+    schema_version: int = 0
+    
+    _tables_by_id: dict[UUID, SQLDatabaseTable] | None = PrivateAttr(default=None)
+    _columns_by_id: dict[UUID, SQLTableColumn] | None = PrivateAttr(default=None)
+    _tables_by_key: dict[str, SQLDatabaseTable] | None = PrivateAttr(default=None)
+    _excluded_column_names: frozenset[str] | None = PrivateAttr(default=None)
+    
+    def __setattr__(self, name: str, value: Any) -> None:
+        
+        super().__setattr__(name, value)
+        
+        if name == "tables":
+            self.mark_tables_changed()
+            
+        elif name == "column_names_to_exclude":
+            
+            self._excluded_column_names = None
+            
+            # Columns whose names are no longer excluded are included again
+            for table in self.tables or []:
+                table.set_exclude_columns_by_name(self.get_excluded_column_names())
+            
+            self.schema_version += 1
             
     
+    @model_validator(mode="after")
+    def set_table_summaries(self) -> Self:
+        
+        # Dependencies stored before table summaries existed
+        if self.tables and not self.table_summaries:
+            self.table_summaries = [table.get_summary() for table in self.tables]
+            
+        return self
+    
+    def mark_tables_changed(self) -> None:
+        """
+        Drops the indexes, refreshes the table summaries and bumps the schema version.
+        Called when `tables` is assigned. Code which appends to, removes from or replaces items of `tables` in place
+        bypasses `__setattr__` and has to call it itself, so lookups never pay for detecting changes.
+        """
+        
+        self.invalidate_id_indexes()
+        self.table_summaries = [table.get_summary() for table in self.tables or []]
+        self.schema_version += 1
+    
     @model_validator(mode="after")
     def set_exclude_columns(self) -> Self:
         
-        if self.column_names_to_exclude is not None:
+        excluded_column_names = self.get_excluded_column_names()
+        
+        if excluded_column_names and self.tables is not None:
             
-            for column_name in self.column_names_to_exclude:
+            for table in self.tables:
                 
-                for table in self.tables:
-                    
-                    for column in table.columns:
-                        if column.name == column_name:
-                            column.exclude = True
+                for column in table.columns:
+                    if column.name in excluded_column_names:
+                        column.exclude = True
                                 
         return self
-            
-    def get_engine(self) -> Engine:
+    
+    def get_excluded_column_names(self) -> frozenset[str]:
         
-        if self.connection_params.type == SQLType.MSSQL:
-            return create_engine(
-                f"mssql+pymssql://{self.connection_params.username}:{self.connection_params.password}@{self.connection_params.host}:{self.connection_params.port}/{self.connection_params.database}"
-            )
+        if self._excluded_column_names is None:
+            self._excluded_column_names = frozenset(self.column_names_to_exclude or [])
             
-        elif self.connection_params.type == SQLType.MYSQL:
-            return create_engine(
-                f"mysql+pymysql://{self.connection_params.username}:{self.connection_params.password}@{self.connection_params.host}:{self.connection_params.port}/{self.connection_params.database}"
-            )
+        return self._excluded_column_names
             
-        elif self.connection_params.type == SQLType.POSTGRES:
-            return create_engine(
-                f"postgresql+psycopg2://{self.connection_params.username}:{self.connection_params.password}@{self.connection_params.host}:{self.connection_params.port}/{self.connection_params.database}"
-            )
+    @property
+    def engine_key(self) -> str:
+        return self.name
             
-        raise ValueError("Unsupported SQL dialect")
+    def get_engine(self) -> Engine:
+        """
+        Returns the pooled engine of this dependency from the process-wide engine registry.
+        """
+        
+        return sql_engine_registry.get_engine(
+            key=self.engine_key,
+            fingerprint=self.connection_params.fingerprint,
+            url=self.connection_params.get_url(),
+            connect_args=self.connection_params.get_connect_args()
+        )
+    
+    def get_async_engine(self) -> AsyncEngine | None:
+        """
+        Returns the pooled async engine of this dependency, or None if the dialect has no async driver available.
+        """
+        
+        async_url = self.connection_params.get_async_url()
+        
+        if async_url is None:
+            return None
+        
+        return sql_engine_registry.get_async_engine(
+            key=self.engine_key,
+            fingerprint=self.connection_params.fingerprint,
+            url=async_url
+        )
+    
+    def get_admission_controller(self) -> SQLAdmissionController:
+        return get_admission_controller(self.engine_key)
+    
+    def dispose_engine(self) -> None:
+        sql_engine_registry.dispose(self.engine_key)
                 
     def get_metadata(self) -> MetaData:
 
@@ -234,68 +470,198 @@ class SQLBaseDependency(BaseModel):
         metadata.reflect(bind=self.get_engine())
         return metadata
     
+    async def get_metadata_async(self, tables: list[tuple[str | None, list[str]]] | None = None) -> MetaData:
+        """
+        Reflects the tables matching the reflection filter in parallel without blocking the event loop.
+        If `tables` is given as (schema, table names), only those tables are reflected.
+        """
+        
+        if tables is not None:
+            return await reflect_tables_async(self.get_engine(), tables)
+        
+        return await reflect_metadata_async(self.get_engine(), self.reflection_filter)
+    
+    async def take_schema_snapshot_async(self) -> SQLSchemaSnapshot:
+        """
+        Fingerprints the tables matching the reflection filter, see `deps.sql_schema_snapshot`.
+        """
+        
+        return await asyncio.get_running_loop().run_in_executor(
+            get_sql_executor(SQL_REFLECTION_EXECUTOR),
+            partial(take_schema_snapshot, self.get_engine(), self.reflection_filter)
+        )
+    
+    def _get_table_from_sa_table(self, sa_table: Table, existing_table: SQLDatabaseTable | None = None) -> SQLDatabaseTable:
+        """
+        Builds a table without joins from a reflected table.
+        The ids of an existing table and its columns are kept, so references to them stay valid across refreshes.
+        """
+        
+        existing_column_ids = {column.name: column.id for column in existing_table.columns} if existing_table is not None else {}
+        
+        table = SQLDatabaseTable(
+            table_name=sa_table.name,
+            schema_name=sa_table.schema,
+            comment=sa_table.comment,
+            description=sa_table.description,
+            columns=[]
+        )
+        
+        if existing_table is not None:
+            table.id = existing_table.id
+        
+        for sa_column in sa_table.columns:
+            
+            column = SQLTableColumn(
+                table_id=table.id,
+                name=sa_column.name,
+                key=sa_column.key,
+                type=str(sa_column.type),
+                nullable=sa_column.nullable,
+                unique=sa_column.unique,
+                primary_key=sa_column.primary_key,
+                comment=sa_column.comment,
+            )
+            
+            if sa_column.name in existing_column_ids:
+                column.id = existing_column_ids[sa_column.name]
+            
+            table.columns.append(column)
+            
+        return table
+    
     def set_tables_from_metadata(self, metadata: MetaData) -> None:
+        """
+        Builds the tables from reflected metadata.
+        
+        Tables and columns are indexed by (schema qualified) table key and column name in a single pass,
+        so foreign keys resolve in constant time. Every foreign key a column takes part in is kept in its joins,
+        joins of composite foreign keys share the name of their constraint.
+        """
         
         tables: list[SQLDatabaseTable] = []
+        tables_by_key: dict[str, SQLDatabaseTable] = {}
+        columns_by_key: dict[tuple[str, str], SQLTableColumn] = {}
         
         for sa_table in metadata.tables.values():
             
-            table = SQLDatabaseTable(
-                provider=self,
-                table_name=sa_table.name,
-                comment=sa_table.comment,
-                description=sa_table.description,
-                columns=[]
-            )
+            table = self._get_table_from_sa_table(sa_table)
             
-            for sa_column in sa_table.columns:
-                
-                table.columns.append(
-                    SQLTableColumn(
-                        table_id=table.id,
-                        name=sa_column.name,
-                        key=sa_column.key,
-                        type=str(sa_column.type),
-                        nullable=sa_column.nullable,
-                        unique=sa_column.unique,
-                        primary_key=sa_column.primary_key,
-                        comment=sa_column.comment,
-                    )
-                )
+            for column in table.columns:
+                columns_by_key[(sa_table.key, column.name)] = column
                 
             tables.append(table)
+            tables_by_key[sa_table.key] = table
             
         for sa_table in metadata.tables.values():
             
-            for sa_column in sa_table.columns:
+            for constraint_idx, constraint in enumerate(sa_table.foreign_key_constraints):
+                
+                constraint_name = constraint.name or f"{sa_table.name}_fk_{constraint_idx}"
+                composite = len(constraint.elements) > 1
                 
-                if sa_column.foreign_keys:
+                for foreign_key in constraint.elements:
                     
-                    child_table: SQLDatabaseTable = next(
-                        table for table in tables if table.table_name == sa_table.name
-                    )
+                    # Tables outside of the reflection filter can't be joined
+                    try:
+                        sa_parent_column = foreign_key.column
+                    except (NoReferencedTableError, NoReferencedColumnError):
+                        continue
                     
-                    child_column: SQLTableColumn = next(
-                        column for column in child_table.columns if column.name == sa_column.name
-                    )
+                    child_column = columns_by_key.get((sa_table.key, foreign_key.parent.name))
+                    parent_table = tables_by_key.get(sa_parent_column.table.key)
+                    parent_column = columns_by_key.get((sa_parent_column.table.key, sa_parent_column.name))
                     
-                    for foreign_key in sa_column.foreign_keys:
-                        
-                        parent_table: SQLDatabaseTable = next(
-                            table for table in tables if table.table_name == foreign_key.column.table.name
-                        )
-                        
-                        parent_column: SQLTableColumn = next(
-                            column for column in parent_table.columns if column.name == foreign_key.column.name
+                    if child_column is None or parent_table is None or parent_column is None:
+                        continue
+                    
+                    child_column.joins.append(
+                        SQLJoin(
+                            table=parent_table.qualified_name,
+                            table_id=parent_table.id,
+                            column_key=parent_column.key,
+                            column_id=parent_column.id,
+                            constraint=constraint_name,
+                            composite=composite
                         )
+                    )
+                    
+                    if child_column.join is None:
+                        child_column.join = child_column.joins[0]
                         
-                        child_column.join = SQLJoin(
-                            table=parent_table.table_name,
+        self.tables = tables
+        self.set_exclude_columns()
+        
+    def update_tables_from_metadata(self, metadata: MetaData, removed_table_keys: set[str] | None = None) -> None:
+        """
+        Replaces the tables reflected in `metadata` and drops the removed tables, keeping all other tables as they are.
+        
+        Used by incremental refreshes, which only reflect the tables whose fingerprint changed.
+        Like in `set_tables_from_metadata`, tables are matched by their (schema qualified) key. As unchanged tables
+        are not part of the metadata, foreign keys are resolved by the keys of their targets.
+        """
+        
+        removed_table_keys = removed_table_keys or set()
+        existing_tables = {table.qualified_name: table for table in self.tables or []}
+        
+        refreshed_tables = {
+            sa_table.key: self._get_table_from_sa_table(sa_table, existing_tables.get(sa_table.key))
+            for sa_table in metadata.tables.values()
+        }
+        
+        tables = [
+            refreshed_tables.pop(table.qualified_name, table) for table in self.tables or []
+            if table.qualified_name not in removed_table_keys
+        ]
+        tables.extend(refreshed_tables.values())
+        
+        tables_by_key = {table.qualified_name: table for table in tables}
+        columns_by_key = {(table.qualified_name, column.name): column for table in tables for column in table.columns}
+        
+        for sa_table in metadata.tables.values():
+            
+            for constraint_idx, constraint in enumerate(sa_table.foreign_key_constraints):
+                
+                constraint_name = constraint.name or f"{sa_table.name}_fk_{constraint_idx}"
+                composite = len(constraint.elements) > 1
+                
+                for foreign_key in constraint.elements:
+                    
+                    # "schema.table.column" or "table.column", the table part matches `Table.key`
+                    parent_table_key, parent_column_name = foreign_key.target_fullname.rsplit(".", 1)
+                    
+                    child_column = columns_by_key.get((sa_table.key, foreign_key.parent.name))
+                    parent_table = tables_by_key.get(parent_table_key)
+                    parent_column = columns_by_key.get((parent_table_key, parent_column_name))
+                    
+                    if child_column is None or parent_table is None or parent_column is None:
+                        continue
+                    
+                    child_column.joins.append(
+                        SQLJoin(
+                            table=parent_table.qualified_name,
                             table_id=parent_table.id,
                             column_key=parent_column.key,
-                            column_id=parent_column.id
+                            column_id=parent_column.id,
+                            constraint=constraint_name,
+                            composite=composite
                         )
-                        
+                    )
+                    
+                    if child_column.join is None:
+                        child_column.join = child_column.joins[0]
+        
+        # Joins of unchanged tables may point to columns which no longer exist
+        column_ids = {column.id for column in columns_by_key.values()}
+        
+        for table in tables:
+            
+            for column in table.columns:
+                
+                if any(join.column_id not in column_ids for join in column.get_joins()):
+                    column.joins = [join for join in column.get_joins() if join.column_id in column_ids]
+                    column.join = column.joins[0] if column.joins else None
+                    
         self.tables = tables
         self.set_exclude_columns()
         
@@ -312,7 +678,7 @@ class SQLBaseDependency(BaseModel):
         
         if table_subset is None:
             
-            for table in self.tables:
+            for table in self.tables or []:
                 datasource_dict["tables"].append(table.get_dict(
                     short=short,
                     include_table_id=include_table_ids
@@ -329,31 +695,570 @@ class SQLBaseDependency(BaseModel):
         
         return datasource_dict
     
-    def get_prompt(self, short: bool = False, table_subset: list[SQLDatabaseTable] | None = None, include_datasource_info: bool = False, include_table_ids: bool = False) -> str:
+    def get_prompt(self, short: bool = False, table_subset: list[SQLDatabaseTable] | None = None, include_datasource_info: bool = False, include_table_ids: bool = False, compact: bool | None = None) -> str:
+        """
+        Renders the schema for prompts. Rendered prompts are cached per dependency and schema version.
+        `compact` (defaults to the SQL_COMPACT_PROMPTS setting) renders without indentation, with abbreviated keys and deduplicated type names.
+        """
         
-        return json.dumps(self.get_dict(short=short, table_subset=table_subset, include_datasource_info=include_datasource_info, include_table_ids=include_table_ids), indent=4)
+        compact = settings.SQL_COMPACT_PROMPTS if compact is None else compact
+        
+        return sql_prompt_cache.get_or_render(
+            (
+                "prompt",
+                self.engine_key,
+                self.schema_version,
+                short,
+                tuple(table.id for table in table_subset) if table_subset is not None else None,
+                include_datasource_info,
+                include_table_ids,
+                compact
+            ),
+            lambda: render_prompt(
+                self.get_dict(short=short, table_subset=table_subset, include_datasource_info=include_datasource_info, include_table_ids=include_table_ids),
+                compact=compact
+            )
+        )
     
-    def get_dataframe_from_query(self, query: str) -> DataFrame:
+    def get_query_cache_key(self, query: str | TextClause, parameters: dict[str, Any] | None = None, max_rows: int | None = None, budget: SQLFetchBudget | None = None) -> str:
+        
+        return get_query_cache_key(
+            dependency_key=self.engine_key,
+            normalized_query=normalize_query(query if isinstance(query, str) else query.text, self.connection_params.type),
+            parameters=parameters,
+            fingerprint=self.connection_params.fingerprint,
+            column_names_to_exclude=sorted(self.column_names_to_exclude or []),
+            max_rows=max_rows,
+            budget=budget.model_dump() if budget is not None else None
+        )
+    
+    def get_dataframe_from_query(self, query: str | TextClause, parameters: dict[str, Any] | None = None, timeout: float | None = None, max_rows: int | None = None, budget: SQLFetchBudget | None = None, query_handle: SQLQueryHandle | None = None, use_cache: bool = True, max_cache_age: float | None = None) -> DataFrame:
         """"
-        Returns a DataFrame from a SQL query
+        Returns a DataFrame from a SQL query.
+        The statement timeout of the session is set to `timeout` (or the configured default) seconds.
+        If `max_rows` is set, at most `max_rows` rows are fetched from the database.
+        Otherwise, the result is streamed until the fetch budget is exhausted, which is reported in `df.attrs["truncated"]`.
+        Results are served from the query cache if `use_cache` is set and they were fetched at most `max_cache_age` seconds ago.
         """
         
-        df = read_sql_query(text(query), self.get_engine())
+        cache_key = self.get_query_cache_key(query, parameters=parameters, max_rows=max_rows, budget=budget) if use_cache and settings.SQL_QUERY_CACHE_ENABLED else None
         
-        if self.column_names_to_exclude is not None:
-            df = df.drop(columns=[col for col in self.column_names_to_exclude if col in df.columns], errors='ignore')
+        if cache_key is not None:
+            
+            df = sql_query_cache.get(cache_key, max_age=max_cache_age)
+            
+            if df is not None:
+                return df
+            
+        projected_query = self.exclude_columns_from_query(query)
         
+        try:
+            df = self._query_dataframe(projected_query, parameters=parameters, timeout=timeout, max_rows=max_rows, budget=budget, query_handle=query_handle)
+            
+        except DBAPIError as exc:
+            
+            if not self._should_retry_unprojected(query, projected_query, query_handle, exc):
+                raise
+            
+            df = self._query_dataframe(query, parameters=parameters, timeout=timeout, max_rows=max_rows, budget=budget, query_handle=query_handle)
+        
+        if cache_key is not None:
+            sql_query_cache.set(cache_key, df)
+            
         return df
     
-    def get_table_by_id(self, table_id: UUID) -> SQLDatabaseTable:
-        for table in self.tables:
-            if table.id == table_id:
-                return table
-        raise ValueError(f"Table with id {table_id} not found")
+    def _query_dataframe(self, query: str | TextClause, parameters: dict[str, Any] | None = None, timeout: float | None = None, max_rows: int | None = None, budget: SQLFetchBudget | None = None, query_handle: SQLQueryHandle | None = None) -> DataFrame:
+        
+        if max_rows is None:
+            return collect_dataframe_chunks(
+                self._stream_dataframe_from_query(query, parameters=parameters, timeout=timeout, query_handle=query_handle),
+                budget=budget
+            )
+        
+        with self.get_engine().connect() as connection:
+            
+            prepare_connection(
+                connection,
+                timeout=timeout or settings.SQL_STATEMENT_TIMEOUT,
+                query_handle=query_handle
+            )
+            
+            try:
+                df = self._read_limited_dataframe(connection, query, parameters, max_rows)
+                
+            except Exception:
+                
+                if query_handle is not None and query_handle.cancelled:
+                    connection.invalidate()
+                    
+                raise
+        
+        return self.drop_excluded_columns(df)
+    
+    def stream_dataframe_from_query(self, query: str | TextClause, parameters: dict[str, Any] | None = None, chunk_size: int | None = None, timeout: float | None = None, query_handle: SQLQueryHandle | None = None) -> Iterator[DataFrame]:
+        """
+        Yields the result of a SQL query in DataFrame chunks of `chunk_size` rows read from a server-side cursor.
+        Closing the generator early stops fetching.
+        """
+        
+        yield from self._stream_dataframe_from_query(self.exclude_columns_from_query(query), parameters=parameters, chunk_size=chunk_size, timeout=timeout, query_handle=query_handle)
+    
+    def _stream_dataframe_from_query(self, query: str | TextClause, parameters: dict[str, Any] | None = None, chunk_size: int | None = None, timeout: float | None = None, query_handle: SQLQueryHandle | None = None) -> Iterator[DataFrame]:
+        
+        with self.get_engine().connect() as connection:
+            
+            prepare_connection(
+                connection,
+                timeout=timeout or settings.SQL_STATEMENT_TIMEOUT,
+                query_handle=query_handle
+            )
+            
+            result = connection.execution_options(stream_results=True).execute(as_statement(query), parameters or {})
+            columns = list(result.keys())
+            exhausted = False
+            
+            try:
+                
+                yielded = False
+                
+                for partition in result.partitions(chunk_size or settings.SQL_FETCH_CHUNK_SIZE):
+                    yield self.drop_excluded_columns(DataFrame.from_records(partition, columns=columns, coerce_float=True))
+                    yielded = True
+                    
+                if not yielded:
+                    yield self.drop_excluded_columns(DataFrame(columns=columns))
+                    
+                exhausted = True
+                
+            except Exception:
+                
+                if query_handle is not None and query_handle.cancelled:
+                    connection.invalidate()
+                    
+                raise
+            
+            finally:
+                
+                # Closing an unbuffered MySQL cursor drains the remaining rows, so the connection is dropped instead
+                if not exhausted and self.connection_params.type == SQLType.MYSQL:
+                    connection.invalidate()
+                else:
+                    result.close()
+    
+    def _read_limited_dataframe(self, connection: Connection, query: str | TextClause, parameters: dict[str, Any] | None, max_rows: int) -> DataFrame:
+        """
+        Pushes the row limit into the query if it can be rewritten safely.
+        Otherwise, the rows are read from a server-side cursor which is abandoned after `max_rows` rows.
+        """
+        
+        limited_query = limit_query(query, self.connection_params.type, max_rows) if isinstance(query, str) else None
+        
+        if limited_query is not None:
+            return read_sql_query(text(limited_query), connection, params=parameters)
+        
+        result = connection.execution_options(stream_results=True).execute(as_statement(query), parameters or {})
+        
+        df = DataFrame.from_records(result.fetchmany(max_rows), columns=list(result.keys()), coerce_float=True)
+        
+        if self.connection_params.type == SQLType.MYSQL:
+            connection.invalidate()
+        else:
+            result.close()
+            
+        return df
+    
+    async def get_dataframe_from_query_async(self, query: str | TextClause, parameters: dict[str, Any] | None = None, timeout: float | None = None, max_rows: int | None = None, budget: SQLFetchBudget | None = None, use_cache: bool = True, max_cache_age: float | None = None, priority: SQLQueryPriority = SQLQueryPriority.AGENT) -> DataFrame:
+        """
+        Returns a DataFrame from a SQL query without blocking the event loop.
+        Uses the async driver of the dialect if available and falls back to the bounded SQL executor otherwise.
+        
+        Queries that miss the cache pass the admission controller of the dependency with the given priority first.
+        If the timeout expires or the calling task is cancelled, the statement is cancelled on the server
+        before the error is raised.
+        """
+        
+        cache_key = self.get_query_cache_key(query, parameters=parameters, max_rows=max_rows, budget=budget) if use_cache and settings.SQL_QUERY_CACHE_ENABLED else None
+        
+        if cache_key is not None:
+            
+            df = await sql_query_cache.get_async(cache_key, max_age=max_cache_age)
+            
+            if df is not None:
+                return df
+        
+        query_handle = SQLQueryHandle()
+        
+        async with self.get_admission_controller().admit(priority=priority):
+            df = await self._await_cancellable_query(
+                self._fetch_projected_dataframe_async(query, parameters=parameters, timeout=timeout, max_rows=max_rows, budget=budget, query_handle=query_handle),
+                timeout=timeout,
+                query_handle=query_handle
+            )
+        
+        if cache_key is not None:
+            await sql_query_cache.set_async(cache_key, df)
+            
+        return df
+    
+    async def _await_cancellable_query(self, fetch: Awaitable[DataFrame], timeout: float | None, query_handle: SQLQueryHandle) -> DataFrame:
+        """
+        Awaits a fetch, cancelling its statement on the server if the timeout expires or the calling task is cancelled.
+        The statement is cancelled before the fetch itself, as drivers like aiosqlite only release the connection
+        of a cancelled fetch once its statement returned.
+        """
+        
+        fetch_task = asyncio.ensure_future(fetch)
+        
+        try:
+            done, _ = await asyncio.wait({fetch_task}, timeout=timeout)
+        
+        except asyncio.CancelledError:
+            await asyncio.shield(self._cancel_fetch(fetch_task, query_handle))
+            raise
+        
+        if not done:
+            await asyncio.shield(self._cancel_fetch(fetch_task, query_handle))
+            raise asyncio.TimeoutError()
+        
+        return fetch_task.result()
+    
+    async def _cancel_fetch(self, fetch_task: asyncio.Future[DataFrame], query_handle: SQLQueryHandle) -> None:
+        
+        await self.cancel_query(query_handle)
+        
+        fetch_task.cancel()
+        
+        # Waits for the connection to be released, the interrupted statement fails or the fetch is cancelled
+        await asyncio.gather(fetch_task, return_exceptions=True)
+    
+    async def _fetch_projected_dataframe_async(self, query: str | TextClause, parameters: dict[str, Any] | None, timeout: float | None, max_rows: int | None, budget: SQLFetchBudget | None, query_handle: SQLQueryHandle) -> DataFrame:
+        
+        projected_query = await self.exclude_columns_from_query_async(query)
+        
+        try:
+            return await self._fetch_dataframe_async(projected_query, parameters=parameters, timeout=timeout, max_rows=max_rows, budget=budget, query_handle=query_handle)
+        
+        except DBAPIError as exc:
+            
+            if not self._should_retry_unprojected(query, projected_query, query_handle, exc):
+                raise
+            
+            return await self._fetch_dataframe_async(query, parameters=parameters, timeout=timeout, max_rows=max_rows, budget=budget, query_handle=query_handle)
+    
+    async def _fetch_dataframe_async(self, query: str | TextClause, parameters: dict[str, Any] | None, timeout: float | None, max_rows: int | None, budget: SQLFetchBudget | None, query_handle: SQLQueryHandle) -> DataFrame:
+        
+        async_engine = self.get_async_engine()
+        
+        if async_engine is None:
+            return await asyncio.get_running_loop().run_in_executor(
+                get_sql_executor(),
+                partial(self._query_dataframe, query, parameters=parameters, timeout=timeout, max_rows=max_rows, budget=budget, query_handle=query_handle)
+            )
+        
+        if max_rows is None:
+            return await collect_dataframe_chunks_async(
+                self._stream_dataframe_from_query_async(async_engine, query, parameters=parameters, timeout=timeout, query_handle=query_handle),
+                budget=budget
+            )
+        
+        async with async_engine.connect() as connection:
+            
+            await prepare_connection_async(
+                connection,
+                timeout=timeout or settings.SQL_STATEMENT_TIMEOUT,
+                query_handle=query_handle
+            )
+            
+            df = await self._read_limited_dataframe_async(connection, query, parameters, max_rows)
+        
+        return self.drop_excluded_columns(df)
+    
+    async def stream_dataframe_from_query_async(self, query: str | TextClause, parameters: dict[str, Any] | None = None, chunk_size: int | None = None, timeout: float | None = None) -> AsyncIterator[DataFrame]:
+        """
+        Async variant of `stream_dataframe_from_query`. Requires an async driver for the dialect.
+        """
+        
+        async_engine = self.get_async_engine()
+        
+        if async_engine is None:
+            raise ValueError(f"No async driver available for {self.connection_params.type}")
+        
+        projected_query = await self.exclude_columns_from_query_async(query)
+        
+        async with aclosing(self._stream_dataframe_from_query_async(async_engine, projected_query, parameters=parameters, chunk_size=chunk_size, timeout=timeout)) as chunks:
+            
+            async for chunk in chunks:
+                yield chunk
+    
+    async def _stream_dataframe_from_query_async(self, async_engine: AsyncEngine, query: str | TextClause, parameters: dict[str, Any] | None = None, chunk_size: int | None = None, timeout: float | None = None, query_handle: SQLQueryHandle | None = None) -> AsyncIterator[DataFrame]:
+        
+        async with async_engine.connect() as connection:
+            
+            await prepare_connection_async(
+                connection,
+                timeout=timeout or settings.SQL_STATEMENT_TIMEOUT,
+                query_handle=query_handle
+            )
+            
+            result = await connection.stream(as_statement(query), parameters or {})
+            columns = list(result.keys())
+            exhausted = False
+            
+            try:
+                
+                yielded = False
+                
+                async for partition in result.partitions(chunk_size or settings.SQL_FETCH_CHUNK_SIZE):
+                    yield self.drop_excluded_columns(DataFrame.from_records(partition, columns=columns, coerce_float=True))
+                    yielded = True
+                    
+                if not yielded:
+                    yield self.drop_excluded_columns(DataFrame(columns=columns))
+                    
+                exhausted = True
+                
+            finally:
+                
+                if not exhausted and self.connection_params.type == SQLType.MYSQL:
+                    await connection.invalidate()
+                else:
+                    await result.close()
+    
+    async def _read_limited_dataframe_async(self, connection: AsyncConnection, query: str | TextClause, parameters: dict[str, Any] | None, max_rows: int) -> DataFrame:
+        
+        limited_query = limit_query(query, self.connection_params.type, max_rows) if isinstance(query, str) else None
+        
+        if limited_query is not None:
+            result = await connection.execute(text(limited_query), parameters or {})
+            return DataFrame.from_records(result.all(), columns=list(result.keys()), coerce_float=True)
+        
+        result = await connection.stream(as_statement(query), parameters or {})
+        
+        df = DataFrame.from_records(await result.fetchmany(max_rows), columns=list(result.keys()), coerce_float=True)
+        
+        if self.connection_params.type == SQLType.MYSQL:
+            await connection.invalidate()
+        else:
+            await result.close()
+            
+        return df
+    
+    async def cancel_query(self, query_handle: SQLQueryHandle) -> None:
+        """
+        Cancels the query tracked by the handle on the server. Cancellation is best effort and never raises.
+        """
+        
+        try:
+            
+            if query_handle.is_async:
+                await cancel_query_async(self.get_async_engine(), query_handle)
+                
+            else:
+                await asyncio.to_thread(cancel_query, self.get_engine(), query_handle)
+                
+        except Exception as exc:
+            logfire.warn("Failed to cancel SQL query: {error}", error=str(exc))
+    
+    def exclude_columns_from_query(self, query: str | TextClause) -> str | TextClause:
+        """
+        Removes excluded columns from the projection of simple SELECT queries before they are executed.
+        Queries that can not be rewritten are returned unchanged, their excluded columns are dropped from the result instead.
+        """
+        
+        if not isinstance(query, str):
+            return query
+        
+        projected_query = exclude_columns_from_query(
+            query,
+            self.connection_params.type,
+            self.get_excluded_column_names(),
+            self.get_table_column_names
+        )
+        
+        return projected_query if projected_query is not None else query
+    
+    async def exclude_columns_from_query_async(self, query: str | TextClause) -> str | TextClause:
+        """
+        Variant of `exclude_columns_from_query` for dependencies whose tables may not be loaded.
+        The tables whose stars have to be expanded are looked up first and their columns loaded, see `load_table_columns`.
+        """
+        
+        if not isinstance(query, str) or not self.get_excluded_column_names():
+            return query
+        
+        if self.tables is None:
+            
+            star_tables: list[tuple[str, str | None]] = []
+            
+            # Records the table of a star with unknown columns, which stops the rewrite right there
+            def get_star_table_column_names(table_name: str, schema_name: str | None) -> list[str] | None:
+                
+                column_names = self.get_table_column_names(table_name, schema_name)
+                
+                if column_names is None:
+                    star_tables.append((table_name, schema_name))
+                
+                return column_names
+            
+            exclude_columns_from_query(query, self.connection_params.type, self.get_excluded_column_names(), get_star_table_column_names)
+            
+            if star_tables:
+                await self.load_table_columns(star_tables)
+        
+        return self.exclude_columns_from_query(query)
+    
+    async def load_table_columns(self, table_names: list[tuple[str, str | None]]) -> None:
+        """
+        Makes the column names of the given (table name, schema) available to `get_table_column_names`.
+        Tables of this class are always in memory, subclasses which store them separately load them here.
+        """
+    
+    def _should_retry_unprojected(self, query: str | TextClause, projected_query: str | TextClause, query_handle: SQLQueryHandle | None, exc: DBAPIError) -> bool:
+        """
+        Stars are expanded to the reflected columns of their table, which fail if the reflection is stale,
+        e.g. after a column was dropped. A failed rewritten query is therefore run once more as written,
+        its excluded columns are dropped from the result instead.
+        """
+        
+        if projected_query is query or (query_handle is not None and query_handle.cancelled):
+            return False
+        
+        logfire.warn("Rewritten SQL query failed, running it as written: {error}", error=str(exc))
+        
+        return True
+    
+    def drop_excluded_columns(self, df: DataFrame) -> DataFrame:
+        
+        excluded_column_names = self.get_excluded_column_names()
+        
+        if excluded_column_names:
+            
+            columns_to_drop = [col for col in df.columns if col in excluded_column_names]
+            
+            if columns_to_drop:
+                df = df.drop(columns=columns_to_drop)
+        
+        return df
+    
+    def invalidate_id_indexes(self) -> None:
+        self._tables_by_id = None
+        self._columns_by_id = None
+        self._tables_by_key = None
+    
+    def _build_id_indexes(self) -> None:
+        """
+        Builds the id -> table, id -> column and (schema qualified) key -> table indexes on first use.
+        The indexes are dropped whenever `tables` is reassigned or marked as changed, see `mark_tables_changed`.
+        """
+        
+        if self._tables_by_id is not None:
+            return
+        
+        tables = self.tables or []
+        
+        tables_by_id: dict[UUID, SQLDatabaseTable] = {}
+        columns_by_id: dict[UUID, SQLTableColumn] = {}
+        tables_by_key: dict[str, SQLDatabaseTable] = {}
+        
+        for table in tables:
+            tables_by_id[table.id] = table
+            tables_by_key.setdefault(table.qualified_name.lower(), table)
+            
+            for column in table.columns:
+                columns_by_id[column.id] = column
+                
+        self._tables_by_id = tables_by_id
+        self._columns_by_id = columns_by_id
+        self._tables_by_key = tables_by_key
+    
+    def get_table_by_id(self, table_id: UUID | str) -> SQLDatabaseTable:
+        
+        if isinstance(table_id, str):
+            table_id = UUID(table_id)
+        
+        self._build_id_indexes()
+        
+        table = self._tables_by_id.get(table_id)
+        
+        if table is None:
+            raise ValueError(f"Table with id {table_id} not found")
+        
+        return table
+    
+    def get_table_column_names(self, table_name: str, schema_name: str | None = None) -> list[str] | None:
+        """
+        Returns the column names of a table referenced in a query, matched on its schema qualified key.
+        Unqualified names only match tables of the default schema, which are reflected without schema,
+        so a table is never confused with one of the same name in another schema.
+        """
+        
+        self._build_id_indexes()
+        
+        table = self._tables_by_key.get(f"{schema_name}.{table_name}".lower() if schema_name else table_name.lower())
+        
+        if table is None:
+            return None
+        
+        return [column.name for column in table.columns]
+    
+    def set_loaded_tables(self, tables: list[SQLDatabaseTable]) -> None:
+        """
+        Sets tables loaded from storage. Unlike assigning `tables`, this doesn't change the schema version.
+        """
+        
+        self.__dict__["tables"] = tables
+        self.invalidate_id_indexes()
+        self.set_exclude_columns()
+    
+    async def load_tables(self) -> list[SQLDatabaseTable]:
+        """
+        Returns all tables with their columns. Subclasses which store tables separately load them here.
+        """
+        
+        return self.tables or []
+    
+    async def get_table_async(self, table_id: UUID | str) -> SQLDatabaseTable:
+        
+        await self.load_tables()
+        
+        return self.get_table_by_id(table_id)
+    
+    async def get_schema_index_async(self) -> SQLSchemaIndex[SQLDatabaseTable]:
+        """
+        Returns the lexical index over the tables, built once per dependency and schema version.
+        The tables are only loaded if the index is not cached yet, and the index is built in a thread,
+        as tokenizing large schemas would block the event loop.
+        """
+        
+        key = (self.engine_key, self.schema_version)
+        schema_index = get_cached_schema_index(key)
+        
+        if schema_index is None:
+            schema_index = await asyncio.to_thread(get_schema_index, key, await self.load_tables())
+            
+        return schema_index
+    
+    async def search_tables_async(self, query: str, k: int = 10) -> list[SQLDatabaseTable]:
+        return (await self.get_schema_index_async()).search(query, k)
+    
+    async def get_relevant_tables_async(self, query: str, k: int | None = None) -> list[SQLDatabaseTable]:
+        """
+        Returns the `k` (defaults to SQL_SCHEMA_SUBSET_TOP_K) tables most relevant to the query, or all tables if there are not more than `k`.
+        """
+        
+        k = k or settings.SQL_SCHEMA_SUBSET_TOP_K
+        
+        if len(self.table_summaries) <= k:
+            return await self.load_tables()
+        
+        return (await self.get_schema_index_async()).get_relevant_tables(query, k)
     
     def get_tables_by_ids(self, table_ids: list[UUID]) -> list[SQLDatabaseTable]:
+        
+        table_ids = set(table_ids)
+        
         return [
-            table for table in self.tables if table.id in table_ids
+            table for table in self.tables or [] if table.id in table_ids
         ]
         
     def dump_model_to_dict(self) -> dict:
@@ -370,25 +1275,28 @@ class SQLBaseDependency(BaseModel):
         if isinstance(column_id, str):
             column_id = UUID(column_id)
             
-        for table in self.tables:
-            for column in table.columns:
-                if column.id == column_id:
-                    return column
+        self._build_id_indexes()
                 
-        return None
+        return self._columns_by_id.get(column_id)
     
     
     def get_instruction_dict(self) -> SQLDependencyDict:
         
         sql_dep_instruction_dict = SQLDependencyDict(
             name=self.name,
-            tables=[table.get_instruction_dict() for table in self.tables]
+            tables=[table_summary.get_instruction_dict() for table_summary in self.table_summaries]
         )
         
         return sql_dep_instruction_dict
     
-    def get_instruction_prompt(self) -> str:
-        return json.dumps(self.get_instruction_dict(), indent=4)
+    def get_instruction_prompt(self, compact: bool | None = None) -> str:
+        
+        compact = settings.SQL_COMPACT_PROMPTS if compact is None else compact
+        
+        return sql_prompt_cache.get_or_render(
+            ("instruction_prompt", self.engine_key, self.schema_version, compact),
+            lambda: render_prompt(self.get_instruction_dict(), compact=compact)
+        )
     
     def get_dialect_prompt(self) -> str:
         
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import asyncio
+
+from threading import Lock
+
+from sqlalchemy import create_engine, Engine
+from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+
+from deps.sql_cancellation import register_connection_events
+from settings import settings
+
+
+def get_pool_kwargs() -> dict:
+    return {
+        "pool_size": settings.SQL_POOL_SIZE,
+        "max_overflow": settings.SQL_MAX_OVERFLOW,
+        "pool_timeout": settings.SQL_POOL_TIMEOUT,
+        "pool_recycle": settings.SQL_POOL_RECYCLE,
+        "pool_pre_ping": settings.SQL_POOL_PRE_PING
+    }
+
+
+class SQLEngineRegistry:
+    """
+    Process-wide registry of pooled SQLAlchemy engines.
+
+    Engines are keyed by the dependency key and a fingerprint of its connection
+    parameters, so a changed connection never reuses a stale pool.
+    """
+
+    def __init__(self) -> None:
+        self._engines: dict[str, tuple[str, Engine]] = {}
+        self._async_engines: dict[str, tuple[str, AsyncEngine]] = {}
+        self._disposal_tasks: set[asyncio.Task] = set()
+        self._lock = Lock()
+
+    def get_engine(self, key: str, fingerprint: str, url: URL, connect_args: dict | None = None) -> Engine:
+
+        with self._lock:
+
+            cached = self._engines.get(key)
+
+            if cached is not None:
+
+                cached_fingerprint, engine = cached
+
+                if cached_fingerprint == fingerprint:
+                    return engine
+
+                engine.dispose()
+
+            engine = create_engine(url, connect_args=connect_args or {}, **get_pool_kwargs())
+            register_connection_events(engine)
+
+            self._engines[key] = (fingerprint, engine)
+
+            return engine
+
+    def get_async_engine(self, key: str, fingerprint: str, url: URL) -> AsyncEngine:
+
+        with self._lock:
+
+            cached = self._async_engines.get(key)
+
+            if cached is not None:
+
+                cached_fingerprint, async_engine = cached
+
+                if cached_fingerprint == fingerprint:
+                    return async_engine
+
+                self._dispose_async_engine(async_engine)
+
+            async_engine = create_async_engine(url, **get_pool_kwargs())
+            register_connection_events(async_engine.sync_engine)
+
+            self._async_engines[key] = (fingerprint, async_engine)
+
+            return async_engine
+
+    def dispose(self, key: str, fingerprint: str | None = None) -> None:
+        """
+        Disposes the engines registered under `key`.
+        If a fingerprint is given, the engines are only disposed if they were created for different connection parameters.
+        """
+
+        with self._lock:
+            engine = self._pop_stale(self._engines, key, fingerprint)
+            async_engine = self._pop_stale(self._async_engines, key, fingerprint)
+
+        if engine is not None:
+            engine.dispose()
+
+        if async_engine is not None:
+            self._dispose_async_engine(async_engine)
+
+    async def dispose_all(self) -> None:
+
+        with self._lock:
+            engines = [engine for _, engine in self._engines.values()]
+            async_engines = [async_engine for _, async_engine in self._async_engines.values()]
+            self._engines.clear()
+            self._async_engines.clear()
+
+        for engine in engines:
+            engine.dispose()
+
+        for async_engine in async_engines:
+            await async_engine.dispose()
+
+    @staticmethod
+    def _pop_stale(engines: dict, key: str, fingerprint: str | None):
+
+        cached = engines.get(key)
+
+        if cached is None:
+            return None
+
+        cached_fingerprint, engine = cached
+
+        if fingerprint is not None and cached_fingerprint == fingerprint:
+            return None
+
+        del engines[key]
+
+        return engine
+
+    def _dispose_async_engine(self, async_engine: AsyncEngine) -> None:
+        """
+        Closing pooled async connections has to be awaited, so it is scheduled on the running loop.
+        Without a running loop, the pool is dereferenced and its connections are left to the garbage collector.
+        """
+
+        try:
+            loop = asyncio.get_running_loop()
+
+        except RuntimeError:
+            async_engine.sync_engine.dispose(close=False)
+            return
+
+        task = loop.create_task(async_engine.dispose())
+        self._disposal_tasks.add(task)
+        task.add_done_callback(self._disposal_tasks.discard)
+
+
+sql_engine_registry = SQLEngineRegistry()
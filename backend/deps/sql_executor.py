@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+
+from pydantic import BaseModel
+
+import logfire
+
+from settings import settings
+
+
+SQL_QUERY_EXECUTOR = "sql-query"
+LEGACY_AGENT_SQL_EXECUTOR = "legacy-agent-sql"
+SQL_REFLECTION_EXECUTOR = "sql-reflection"
+
+sql_executor_active_threads = logfire.metric_up_down_counter(
+    "sql.executor.active_threads",
+    description="Threads of a SQL executor currently running a query"
+)
+
+
+class SQLExecutorMetrics(BaseModel):
+    name: str
+    max_workers: int
+    threads: int
+    active: int
+    pending: int
+    utilisation: float
+
+
+class SQLExecutor(ThreadPoolExecutor):
+    """
+    Named, size-bounded thread pool for blocking SQL work that tracks how many of its threads are busy.
+    """
+    
+    def __init__(self, name: str, max_workers: int) -> None:
+        super().__init__(max_workers=max_workers, thread_name_prefix=name)
+        self.name = name
+        self.max_workers = max_workers
+        self._active: int = 0
+        self._pending: int = 0
+        self._metrics_lock = Lock()
+        
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        
+        with self._metrics_lock:
+            self._pending += 1
+        
+        def run():
+            
+            with self._metrics_lock:
+                self._pending -= 1
+                self._active += 1
+                
+            sql_executor_active_threads.add(1, {"executor": self.name})
+                
+            try:
+                return fn(*args, **kwargs)
+            
+            finally:
+                
+                with self._metrics_lock:
+                    self._active -= 1
+                    
+                sql_executor_active_threads.add(-1, {"executor": self.name})
+        
+        return super().submit(run)
+    
+    def get_metrics(self) -> SQLExecutorMetrics:
+        
+        with self._metrics_lock:
+            
+            return SQLExecutorMetrics(
+                name=self.name,
+                max_workers=self.max_workers,
+                threads=len(self._threads),
+                active=self._active,
+                pending=self._pending,
+                utilisation=self._active / self.max_workers
+            )
+
+
+_sql_executors: dict[str, SQLExecutor] = {}
+_sql_executors_lock = Lock()
+
+
+def get_sql_executor_sizes() -> dict[str, int]:
+    return {
+        SQL_QUERY_EXECUTOR: settings.SQL_EXECUTOR_MAX_WORKERS,
+        LEGACY_AGENT_SQL_EXECUTOR: settings.LEGACY_AGENT_SQL_EXECUTOR_MAX_WORKERS,
+        SQL_REFLECTION_EXECUTOR: settings.SQL_REFLECTION_MAX_WORKERS,
+    }
+
+
+def start_sql_executors() -> None:
+    """
+    Creates the configured SQL executors. Called from the lifespan of the FastAPI app.
+    """
+    
+    for name in get_sql_executor_sizes():
+        get_sql_executor(name)
+
+
+def get_sql_executor(name: str = SQL_QUERY_EXECUTOR) -> SQLExecutor:
+    """
+    Returns the shared executor with the given name.
+    Executors are created on first use if they were not started with the app, e.g. in scripts.
+    """
+    
+    with _sql_executors_lock:
+        
+        if name not in _sql_executors:
+            _sql_executors[name] = SQLExecutor(
+                name=name,
+                max_workers=get_sql_executor_sizes()[name]
+            )
+            
+        return _sql_executors[name]
+    
+    
+def get_sql_executor_metrics() -> list[SQLExecutorMetrics]:
+    
+    with _sql_executors_lock:
+        return [executor.get_metrics() for executor in _sql_executors.values()]
+
+
+def shutdown_sql_executors() -> None:
+    
+    with _sql_executors_lock:
+        executors = list(_sql_executors.values())
+        _sql_executors.clear()
+        
+    for executor in executors:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from datetime import datetime, date, time
+from functools import lru_cache
+from typing import Any
+
+from pydantic import TypeAdapter
+
+from sqlalchemy import text, bindparam, String, Integer, Float, Date, Boolean, DateTime, Time
+from sqlalchemy.sql.elements import TextClause
+
+
+SQL_PARAMETER_TYPES = {
+    "str": (str, String),
+    "int": (int, Integer),
+    "float": (float, Float),
+    "date": (date, Date),
+    "bool": (bool, Boolean),
+    "datetime": (datetime, DateTime),
+    "time": (time, Time),
+}
+
+
+@lru_cache(maxsize=1024)
+def compile_parametrized_query(parametrized_query: str, parameter_types: tuple[tuple[str, str], ...]) -> TextClause:
+    """
+    Compiles a query with `{name}` placeholders into a `text()` construct with typed bind parameters.
+    
+    The compiled statement is cached per template and parameter types, so executions with different values
+    reuse the same statement instead of producing a distinct SQL string per value combination.
+    """
+    
+    query = parametrized_query
+    bind_parameters = []
+    
+    for name, parameter_type in parameter_types:
+        
+        placeholder = "{" + name + "}"
+        
+        if placeholder not in query:
+            raise ValueError(f"Parameter '{name}' not found in query")
+        
+        if parameter_type not in SQL_PARAMETER_TYPES:
+            raise ValueError(f"Unsupported parameter type '{parameter_type}'")
+        
+        query = query.replace(placeholder, f":{name}")
+        bind_parameters.append(bindparam(name, type_=SQL_PARAMETER_TYPES[parameter_type][1]()))
+        
+    return text(query).bindparams(*bind_parameters)
+
+
+@lru_cache(maxsize=None)
+def get_parameter_type_adapter(parameter_type: str) -> TypeAdapter:
+    return TypeAdapter(SQL_PARAMETER_TYPES[parameter_type][0])
+
+
+def coerce_parameter_value(value: Any, parameter_type: str) -> Any:
+    """
+    Converts a parameter value to the python type of its declared parameter type, e.g. an ISO string to a date.
+    """
+    
+    if parameter_type not in SQL_PARAMETER_TYPES:
+        raise ValueError(f"Unsupported parameter type '{parameter_type}'")
+    
+    if parameter_type == "str":
+        return str(value)
+    
+    return get_parameter_type_adapter(parameter_type).validate_python(value)
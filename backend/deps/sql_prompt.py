@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import json
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Hashable
+
+from settings import settings
+
+
+COMPACT_PROMPT_KEYS: dict[str, str] = {
+    "datasource_type": "ds",
+    "sql_dialect": "dialect",
+    "tables": "tbls",
+    "table_name": "tbl",
+    "name": "n",
+    "description": "desc",
+    "comment": "cmt",
+    "columns": "cols",
+    "key": "k",
+    "type": "t",
+    "nullable": "null",
+    "unique": "uq",
+    "join": "fk",
+    "joins": "fks",
+    "table": "ref",
+    "column_key": "ref_col",
+    "column": "ref_col",
+    "constraint": "con",
+}
+
+
+def compact_prompt_dict(prompt_dict: dict) -> dict:
+    """
+    Abbreviates the keys of a schema dict and replaces column type names by their index in a shared list of types.
+    The abbreviations and types are part of the result, so the model can expand them.
+    Columns without content, i.e. excluded columns, are dropped.
+    """
+    
+    types: dict[str, int] = {}
+    used_keys: dict[str, str] = {}
+    
+    def compact(value: Any, parent_key: str | None = None) -> Any:
+        
+        if isinstance(value, dict):
+            
+            compacted = {}
+            
+            for key, item in value.items():
+                
+                if key == "type" and parent_key == "columns" and isinstance(item, str):
+                    item = types.setdefault(item, len(types))
+                    
+                else:
+                    item = compact(item, key)
+                    
+                compact_key = COMPACT_PROMPT_KEYS.get(key, key)
+                used_keys[compact_key] = key
+                compacted[compact_key] = item
+                
+            return compacted
+        
+        if isinstance(value, list):
+            return [compact(item, parent_key) for item in value if item != {}]
+        
+        return value
+    
+    compacted = compact(prompt_dict)
+    
+    return {
+        "keys": {compact_key: key for compact_key, key in used_keys.items() if compact_key != key},
+        "types": list(types),
+        **compacted
+    }
+
+
+def render_prompt(prompt_dict: dict, compact: bool = False) -> str:
+    
+    if compact:
+        return json.dumps(compact_prompt_dict(prompt_dict), separators=(",", ":"), default=str)
+    
+    return json.dumps(prompt_dict, indent=4)
+
+
+class SQLPromptCache:
+    """
+    Process-wide LRU cache of rendered schema prompts.
+    
+    Keys contain the dependency key and its schema version, so a changed schema is rendered again
+    and entries of outdated versions age out of the cache.
+    """
+    
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._prompts: OrderedDict[Hashable, str] = OrderedDict()
+        self._lock = Lock()
+        
+    def get_or_render(self, key: Hashable, render: Callable[[], str]) -> str:
+        
+        with self._lock:
+            
+            prompt = self._prompts.get(key)
+            
+            if prompt is not None:
+                self._prompts.move_to_end(key)
+                return prompt
+            
+        prompt = render()
+        
+        with self._lock:
+            
+            self._prompts[key] = prompt
+            self._prompts.move_to_end(key)
+            
+            while len(self._prompts) > self.max_entries:
+                self._prompts.popitem(last=False)
+                
+        return prompt
+    
+    def clear(self) -> None:
+        
+        with self._lock:
+            self._prompts.clear()
+    
+    
+sql_prompt_cache = SQLPromptCache(max_entries=settings.SQL_PROMPT_CACHE_MAX_ENTRIES)
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import json
+import re
+import time
+
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+from typing import Any
+
+from pandas import DataFrame
+
+from deps.sql_rewrite import SQLGLOT_DIALECTS
+from settings import settings
+from utils import import_dependency
+
+
+# String literals, quoted identifiers and comments are kept verbatim when normalizing a query
+SQL_VERBATIM_PATTERN = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|\[[^\]]*\]|`[^`]*`|--[^\n]*\n?|/\*.*?\*/)""", flags=re.DOTALL)
+
+SQL_QUERY_CACHE_KEY_PREFIX = "sql-query-cache:"
+
+
+def normalize_query(query: str, sql_type: str) -> str:
+    """
+    Normalizes whitespace, keyword case and literal formatting of a query, so trivially different queries share a cache key.
+    Uses sqlglot if it is installed. Without it, only whitespace outside of literals, quoted identifiers and comments is normalized,
+    as telling keywords from identifiers of the same name requires parsing the query.
+    """
+    
+    sqlglot = import_dependency("sqlglot", errors="ignore")
+    
+    if sqlglot is not None and sql_type in SQLGLOT_DIALECTS:
+        
+        try:
+            return ";".join(
+                sqlglot.transpile(query, read=SQLGLOT_DIALECTS[sql_type], write=SQLGLOT_DIALECTS[sql_type])
+            )
+            
+        except sqlglot.errors.SqlglotError:
+            pass
+        
+    parts = SQL_VERBATIM_PATTERN.split(query.strip().rstrip(";"))
+    
+    for idx in range(0, len(parts), 2):
+        parts[idx] = re.sub(r"\s+", " ", parts[idx])
+        
+    return "".join(parts).strip()
+
+
+def get_query_cache_key(dependency_key: str, normalized_query: str, parameters: dict[str, Any] | None = None, **options: Any) -> str:
+    
+    key_payload = json.dumps(
+        {
+            "dependency": dependency_key,
+            "query": normalized_query,
+            "parameters": parameters or {},
+            "options": options
+        },
+        sort_keys=True,
+        default=str
+    )
+    
+    return sha256(key_payload.encode()).hexdigest()
+
+
+def serialize_dataframe(df: DataFrame, cached_at: float | None = None) -> bytes:
+    """
+    Serializes a DataFrame into a zstd compressed Arrow IPC stream.
+    `cached_at` is the UNIX time the result was fetched, kept in the schema metadata.
+    """
+    
+    pa = import_dependency("pyarrow", extra="pyarrow is required for the shared query cache, install the arrow extra.")
+    
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"truncated": b"1" if df.attrs.get("truncated", False) else b"0",
+        b"cached_at": str(cached_at if cached_at is not None else time.time()).encode()
+    })
+    
+    sink = pa.BufferOutputStream()
+    
+    with pa.ipc.new_stream(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression="zstd")) as writer:
+        writer.write_table(table)
+        
+    return sink.getvalue().to_pybytes()
+
+
+def deserialize_dataframe(payload: bytes) -> tuple[DataFrame, float | None]:
+    """
+    Returns the DataFrame of a payload and the UNIX time it was cached at, None for payloads stored without it.
+    """
+    
+    pa = import_dependency("pyarrow", extra="pyarrow is required for the shared query cache, install the arrow extra.")
+    
+    table = pa.ipc.open_stream(payload).read_all()
+    metadata = table.schema.metadata or {}
+    
+    df = table.to_pandas()
+    df.attrs["truncated"] = metadata.get(b"truncated") == b"1"
+    
+    cached_at = metadata.get(b"cached_at")
+    
+    return df, float(cached_at) if cached_at is not None else None
+
+
+class SQLQueryCache:
+    """
+    In-process LRU cache of query results with a TTL and a memory bound,
+    optionally backed by a shared Redis tier holding compressed Arrow payloads.
+    
+    Readers can pass a `max_age` in seconds to only accept results fetched more recently than the TTL requires.
+    """
+    
+    def __init__(self, ttl: int, max_bytes: int, redis_enabled: bool = False) -> None:
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.redis_enabled = redis_enabled and import_dependency("pyarrow", errors="ignore") is not None
+        # Key -> (monotonic time cached at, bytes, frame)
+        self._entries: OrderedDict[str, tuple[float, int, DataFrame]] = OrderedDict()
+        self._byte_count: int = 0
+        self._lock = Lock()
+        self._redis = None
+        self._async_redis = None
+        
+    def get(self, key: str, max_age: float | None = None) -> DataFrame | None:
+        
+        df = self._get_local(key, max_age)
+        
+        if df is not None or not self.redis_enabled:
+            return df
+        
+        payload = self._get_redis().get(SQL_QUERY_CACHE_KEY_PREFIX + key)
+        
+        return self._load_payload(key, payload, max_age)
+    
+    async def get_async(self, key: str, max_age: float | None = None) -> DataFrame | None:
+        
+        df = self._get_local(key, max_age)
+        
+        if df is not None or not self.redis_enabled:
+            return df
+        
+        payload = await self._get_async_redis().get(SQL_QUERY_CACHE_KEY_PREFIX + key)
+        
+        return self._load_payload(key, payload, max_age)
+    
+    def set(self, key: str, df: DataFrame) -> None:
+        
+        self._set_local(key, df)
+        
+        if self.redis_enabled:
+            self._get_redis().set(SQL_QUERY_CACHE_KEY_PREFIX + key, serialize_dataframe(df), ex=self.ttl)
+            
+    async def set_async(self, key: str, df: DataFrame) -> None:
+        
+        self._set_local(key, df)
+        
+        if self.redis_enabled:
+            await self._get_async_redis().set(SQL_QUERY_CACHE_KEY_PREFIX + key, serialize_dataframe(df), ex=self.ttl)
+            
+    def clear(self) -> None:
+        
+        with self._lock:
+            self._entries.clear()
+            self._byte_count = 0
+    
+    def _get_local(self, key: str, max_age: float | None = None) -> DataFrame | None:
+        
+        with self._lock:
+            
+            entry = self._entries.get(key)
+            
+            if entry is None:
+                return None
+            
+            cached_at, nbytes, df = entry
+            age = time.monotonic() - cached_at
+            
+            if age > self.ttl:
+                del self._entries[key]
+                self._byte_count -= nbytes
+                return None
+            
+            # Too old for this reader, but still valid for others
+            if max_age is not None and age > max_age:
+                return None
+            
+            self._entries.move_to_end(key)
+            
+        return self._copy(df)
+    
+    def _set_local(self, key: str, df: DataFrame, age: float = 0) -> None:
+        
+        nbytes = int(df.memory_usage(deep=True).sum())
+        
+        if nbytes > self.max_bytes:
+            return
+        
+        with self._lock:
+            
+            if key in self._entries:
+                self._byte_count -= self._entries.pop(key)[1]
+                
+            self._entries[key] = (time.monotonic() - age, nbytes, self._copy(df))
+            self._byte_count += nbytes
+            
+            while self._byte_count > self.max_bytes:
+                _, (_, evicted_nbytes, _) = self._entries.popitem(last=False)
+                self._byte_count -= evicted_nbytes
+                
+    def _load_payload(self, key: str, payload: bytes | None, max_age: float | None = None) -> DataFrame | None:
+        
+        if payload is None:
+            return None
+        
+        df, cached_at = deserialize_dataframe(payload)
+        
+        # Payloads without their time are kept by Redis for at most the TTL
+        age = max(time.time() - cached_at, 0) if cached_at is not None else self.ttl
+        
+        if max_age is not None and age > max_age:
+            return None
+        
+        self._set_local(key, df, age=age)
+        
+        return df
+                
+    @staticmethod
+    def _copy(df: DataFrame) -> DataFrame:
+        """
+        Shallow copy so callers can't add or drop columns of the cached frame.
+        """
+        
+        df_copy = df.copy(deep=False)
+        df_copy.attrs = dict(df.attrs)
+        
+        return df_copy
+    
+    def _get_redis(self):
+        
+        if self._redis is None:
+            redis = import_dependency("redis")
+            self._redis = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+            
+        return self._redis
+    
+    def _get_async_redis(self):
+        
+        if self._async_redis is None:
+            redis_asyncio = import_dependency("redis.asyncio")
+            self._async_redis = redis_asyncio.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+            
+        return self._async_redis
+
+
+sql_query_cache = SQLQueryCache(
+    ttl=settings.SQL_QUERY_CACHE_TTL,
+    max_bytes=settings.SQL_QUERY_CACHE_MAX_BYTES,
+    redis_enabled=settings.SQL_QUERY_CACHE_REDIS
+)
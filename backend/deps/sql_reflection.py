@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+
+from fnmatch import fnmatch
+from functools import partial
+
+from pydantic import BaseModel
+
+from sqlalchemy import Engine, MetaData, inspect
+from sqlalchemy.schema import Table
+
+from deps.sql_executor import get_sql_executor, SQL_REFLECTION_EXECUTOR
+from settings import settings
+
+
+class SQLReflectionFilter(BaseModel):
+    """
+    Include and exclude patterns (fnmatch syntax) for the schemas and tables to reflect.
+    Without included schemas, the default schema of the connection is reflected.
+    """
+    
+    include_schemas: list[str] | None = None
+    exclude_schemas: list[str] | None = None
+    include_tables: list[str] | None = None
+    exclude_tables: list[str] | None = None
+    
+    def matches_schema(self, schema: str) -> bool:
+        return self._matches(schema, self.include_schemas, self.exclude_schemas)
+    
+    def matches_table(self, table_name: str) -> bool:
+        return self._matches(table_name, self.include_tables, self.exclude_tables)
+    
+    @staticmethod
+    def _matches(name: str, include: list[str] | None, exclude: list[str] | None) -> bool:
+        
+        if include is not None and not any(fnmatch(name, pattern) for pattern in include):
+            return False
+        
+        if exclude is not None and any(fnmatch(name, pattern) for pattern in exclude):
+            return False
+        
+        return True
+
+
+def get_reflection_batches(engine: Engine, reflection_filter: SQLReflectionFilter, batch_size: int) -> list[tuple[str | None, list[str]]]:
+    """
+    Lists the tables to reflect and splits them into batches of (schema, table names).
+    """
+    
+    inspector = inspect(engine)
+    
+    if reflection_filter.include_schemas is None:
+        schemas: list[str | None] = [None]
+        
+    else:
+        schemas = [schema for schema in inspector.get_schema_names() if reflection_filter.matches_schema(schema)]
+    
+    batches: list[tuple[str | None, list[str]]] = []
+    
+    for schema in schemas:
+        
+        table_names = [
+            table_name for table_name in inspector.get_table_names(schema=schema)
+            if reflection_filter.matches_table(table_name)
+        ]
+        
+        for idx in range(0, len(table_names), batch_size):
+            batches.append((schema, table_names[idx:idx + batch_size]))
+            
+    return batches
+
+
+def reflect_batch(engine: Engine, schema: str | None, table_names: list[str]) -> MetaData:
+    
+    metadata = MetaData()
+    
+    with engine.connect() as connection:
+        metadata.reflect(bind=connection, schema=schema, only=table_names, resolve_fks=False)
+        
+    return metadata
+
+
+def merge_metadata(metadatas: list[MetaData]) -> MetaData:
+    """
+    Copies the tables of all batches into one MetaData, so foreign keys resolve across batches.
+    """
+    
+    merged_metadata = MetaData()
+    
+    for metadata in metadatas:
+        
+        for table in metadata.tables.values():
+            
+            if table.key not in merged_metadata.tables:
+                table.to_metadata(merged_metadata)
+                
+    return merged_metadata
+
+
+async def reflect_metadata_async(engine: Engine, reflection_filter: SQLReflectionFilter | None = None) -> MetaData:
+    """
+    Reflects the filtered tables of a database without blocking the event loop.
+    The tables are reflected in batches in parallel, each batch on its own pooled connection.
+    """
+    
+    batches = await asyncio.get_running_loop().run_in_executor(
+        get_sql_executor(SQL_REFLECTION_EXECUTOR),
+        partial(get_reflection_batches, engine, reflection_filter or SQLReflectionFilter(), settings.SQL_REFLECTION_BATCH_SIZE)
+    )
+    
+    return await reflect_batches_async(engine, batches)
+
+
+async def reflect_tables_async(engine: Engine, tables: list[tuple[str | None, list[str]]]) -> MetaData:
+    """
+    Reflects the given (schema, table names) only, e.g. the tables that changed since the last schema snapshot.
+    """
+    
+    batch_size = settings.SQL_REFLECTION_BATCH_SIZE
+    
+    return await reflect_batches_async(engine, [
+        (schema, table_names[idx:idx + batch_size])
+        for schema, table_names in tables
+        for idx in range(0, len(table_names), batch_size)
+    ])
+
+
+async def reflect_batches_async(engine: Engine, batches: list[tuple[str | None, list[str]]]) -> MetaData:
+    
+    loop = asyncio.get_running_loop()
+    executor = get_sql_executor(SQL_REFLECTION_EXECUTOR)
+    
+    metadatas = await asyncio.gather(*[
+        loop.run_in_executor(executor, partial(reflect_batch, engine, schema, table_names))
+        for schema, table_names in batches
+    ])
+    
+    # Copying thousands of tables takes long enough to stall the event loop
+    return await loop.run_in_executor(executor, merge_metadata, metadatas)
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from typing import Callable
+
+from utils import import_dependency
+
+
+SQLGLOT_DIALECTS: dict[str, str] = {
+    "mssql": "tsql",
+    "mysql": "mysql",
+    "postgres": "postgres",
+    "sqlite": "sqlite",
+}
+
+
+def limit_query(query: str, sql_type: str, n: int) -> str | None:
+    """
+    Rewrites a query so the database returns at most n rows,
+    e.g. by injecting `LIMIT n`, `TOP n` or `FETCH FIRST n ROWS ONLY` depending on the dialect.
+    
+    Returns None if sqlglot is not installed or the query can not be rewritten safely,
+    e.g. if it is not a single SELECT statement or already has a non-literal limit.
+    """
+    
+    sqlglot = import_dependency("sqlglot", errors="ignore")
+    
+    if sqlglot is None or sql_type not in SQLGLOT_DIALECTS:
+        return None
+    
+    dialect = SQLGLOT_DIALECTS[sql_type]
+    
+    try:
+        expressions = sqlglot.parse(query, read=dialect)
+        
+    except sqlglot.errors.SqlglotError:
+        return None
+    
+    if len(expressions) != 1 or not isinstance(expressions[0], sqlglot.exp.Query):
+        return None
+    
+    expression = expressions[0]
+    
+    if isinstance(expression, sqlglot.exp.Select) and expression.args.get("into") is not None:
+        return None
+    
+    existing_limit = expression.args.get("limit")
+    
+    if existing_limit is not None:
+        
+        existing_limit_value = existing_limit.args.get("expression")
+        
+        if not isinstance(existing_limit_value, sqlglot.exp.Literal) or not existing_limit_value.is_int:
+            return None
+        
+        if int(existing_limit_value.this) <= n:
+            return query
+    
+    try:
+        return expression.limit(n).sql(dialect=dialect)
+    
+    except sqlglot.errors.SqlglotError:
+        return None
+
+
+def exclude_columns_from_query(query: str, sql_type: str, excluded_column_names: frozenset[str], get_table_column_names: Callable[[str, str | None], list[str] | None]) -> str | None:
+    """
+    Removes excluded columns from the projection of a simple SELECT so they are never fetched from the database.
+    Stars are expanded to the known columns of their table through `get_table_column_names`, which is called with
+    the table name and schema as written in the query and returns None for tables it can not resolve unambiguously.
+    
+    Only single-table SELECTs without DISTINCT, GROUP BY, set operations or positional ORDER BY are rewritten.
+    Returns None if sqlglot is not installed, nothing has to be removed or the query can not be rewritten safely.
+    """
+    
+    if not excluded_column_names:
+        return None
+    
+    sqlglot = import_dependency("sqlglot", errors="ignore")
+    
+    if sqlglot is None or sql_type not in SQLGLOT_DIALECTS:
+        return None
+    
+    exp = sqlglot.exp
+    dialect = SQLGLOT_DIALECTS[sql_type]
+    
+    try:
+        expressions = sqlglot.parse(query, read=dialect)
+        
+    except sqlglot.errors.SqlglotError:
+        return None
+    
+    if len(expressions) != 1 or not isinstance(expressions[0], exp.Select):
+        return None
+    
+    expression: exp.Select = expressions[0]
+    
+    # sqlglot 30 stores the FROM clause as "from_"
+    from_ = expression.args.get("from") or expression.args.get("from_")
+    
+    if (
+        from_ is None
+        or not isinstance(from_.this, exp.Table)
+        or expression.args.get("joins")
+        or expression.args.get("distinct")
+        or expression.args.get("group")
+        or expression.args.get("into")
+    ):
+        return None
+    
+    table = from_.this
+    table_alias = table.alias_or_name
+    order = expression.args.get("order")
+    
+    if order is not None and any(isinstance(ordered.this, exp.Literal) for ordered in order.expressions):
+        return None
+    
+    projections = []
+    removed_aliases = set()
+    
+    for projection in expression.expressions:
+        
+        if isinstance(projection, exp.Star) or (isinstance(projection, exp.Column) and isinstance(projection.this, exp.Star)):
+            
+            if isinstance(projection, exp.Column) and projection.table != table_alias:
+                return None
+            
+            if table.catalog:
+                return None
+            
+            column_names = get_table_column_names(table.name, table.db or None)
+            
+            if column_names is None:
+                return None
+            
+            if not excluded_column_names.intersection(column_names):
+                projections.append(projection)
+                continue
+            
+            projections.extend(
+                exp.column(column_name, table=table_alias if isinstance(projection, exp.Column) else None, quoted=True)
+                for column_name in column_names if column_name not in excluded_column_names
+            )
+            
+        elif projection.alias_or_name in excluded_column_names:
+            
+            if isinstance(projection, exp.Alias):
+                removed_aliases.add(projection.alias)
+                
+        else:
+            projections.append(projection)
+            
+    if not projections:
+        return None
+    
+    if len(projections) == len(expression.expressions) and all(new is old for new, old in zip(projections, expression.expressions)):
+        return None
+    
+    # ORDER BY may reference the alias of a removed projection
+    if order is not None and removed_aliases and any(
+        column.name in removed_aliases and not column.table for column in order.find_all(exp.Column)
+    ):
+        return None
+    
+    try:
+        return expression.select(*projections, append=False).sql(dialect=dialect)
+    
+    except sqlglot.errors.SqlglotError:
+        return None
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import math
+import re
+
+from collections import Counter, OrderedDict, defaultdict
+from threading import Lock
+from typing import Generic, Hashable, Protocol, Sequence, TypeVar
+
+
+WORD_PATTERN = re.compile(r"[A-Za-z0-9]+")
+SUBWORD_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+# Table names describe a table best, so their tokens count more than those of columns and comments
+TABLE_NAME_WEIGHT = 3
+
+SCHEMA_INDEX_CACHE_MAX_ENTRIES = 32
+
+
+class IndexableColumn(Protocol):
+    name: str
+    comment: str | None
+
+
+class IndexableTable(Protocol):
+    table_name: str
+    description: str | None
+    comment: str | None
+    columns: Sequence[IndexableColumn]
+
+
+TableT = TypeVar("TableT", bound=IndexableTable)
+
+
+def _normalize_token(token: str) -> str:
+    
+    token = token.lower()
+    
+    # Crude plural stemming, so "orders" matches "order"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        token = token[:-1]
+    
+    return token
+
+
+def tokenize(text: str | None) -> list[str]:
+    """
+    Splits identifiers and free text into lower case tokens.
+    snake_case and camelCase identifiers yield their parts as well as the whole identifier.
+    """
+    
+    if not text:
+        return []
+    
+    tokens: list[str] = []
+    
+    for word in WORD_PATTERN.findall(text):
+        
+        subwords = SUBWORD_PATTERN.findall(word)
+        tokens.extend(_normalize_token(subword) for subword in subwords)
+        
+        if len(subwords) > 1:
+            tokens.append(_normalize_token(word))
+    
+    return tokens
+
+
+class SQLSchemaIndex(Generic[TableT]):
+    """
+    BM25 index over the names, columns and comments of tables.
+    """
+    
+    def __init__(self, tables: Sequence[TableT], k1: float = 1.5, b: float = 0.75) -> None:
+        
+        self.tables = list(tables)
+        self.k1 = k1
+        self.b = b
+        
+        self._postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        self._document_lengths: list[int] = []
+        
+        for table_idx, table in enumerate(self.tables):
+            
+            tokens = tokenize(table.table_name) * TABLE_NAME_WEIGHT
+            tokens += tokenize(table.description) + tokenize(table.comment)
+            
+            for column in table.columns:
+                tokens += tokenize(column.name) + tokenize(column.comment)
+            
+            for token, frequency in Counter(tokens).items():
+                self._postings[token].append((table_idx, frequency))
+            
+            self._document_lengths.append(len(tokens))
+        
+        self._average_document_length = max(sum(self._document_lengths) / len(self._document_lengths), 1) if self._document_lengths else 1
+    
+    def _get_idf(self, token: str) -> float:
+        
+        document_frequency = len(self._postings.get(token, ()))
+        
+        return math.log(1 + (len(self.tables) - document_frequency + 0.5) / (document_frequency + 0.5))
+    
+    def search(self, query: str, k: int) -> list[TableT]:
+        """
+        Returns up to k tables matching the query, the most relevant first. Tables without any matching token are left out.
+        """
+        
+        scores: dict[int, float] = defaultdict(float)
+        
+        for token in set(tokenize(query)):
+            
+            postings = self._postings.get(token)
+            
+            if not postings:
+                continue
+            
+            idf = self._get_idf(token)
+            
+            for table_idx, frequency in postings:
+                
+                length_norm = 1 - self.b + self.b * self._document_lengths[table_idx] / self._average_document_length
+                scores[table_idx] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+        
+        ranked_table_idxs = sorted(scores, key=lambda table_idx: (-scores[table_idx], table_idx))[:k]
+        
+        return [self.tables[table_idx] for table_idx in ranked_table_idxs]
+    
+    def get_relevant_tables(self, query: str, k: int) -> list[TableT]:
+        """
+        Returns the k most relevant tables, padded with the remaining tables in their original order
+        if fewer than k tables match, e.g. at the start of a conversation.
+        """
+        
+        tables = self.search(query, k)
+        
+        if len(tables) < k:
+            
+            matched_table_ids = {id(table) for table in tables}
+            
+            tables += [table for table in self.tables if id(table) not in matched_table_ids][:k - len(tables)]
+        
+        return tables
+
+
+_schema_indexes: OrderedDict[Hashable, SQLSchemaIndex] = OrderedDict()
+_schema_indexes_lock = Lock()
+
+
+def get_cached_schema_index(key: Hashable) -> SQLSchemaIndex | None:
+    
+    with _schema_indexes_lock:
+        
+        schema_index = _schema_indexes.get(key)
+        
+        if schema_index is not None:
+            _schema_indexes.move_to_end(key)
+            
+        return schema_index
+
+
+def get_schema_index(key: Hashable, tables: Sequence[TableT]) -> SQLSchemaIndex[TableT]:
+    """
+    Returns the cached index for the key, or builds it from the tables.
+    The key has to change whenever the tables do, e.g. by containing the schema version of the dependency.
+    """
+    
+    with _schema_indexes_lock:
+        
+        schema_index = _schema_indexes.get(key)
+        
+        if schema_index is not None:
+            _schema_indexes.move_to_end(key)
+            return schema_index
+    
+    schema_index = SQLSchemaIndex(tables)
+    
+    with _schema_indexes_lock:
+        
+        _schema_indexes[key] = schema_index
+        
+        while len(_schema_indexes) > SCHEMA_INDEX_CACHE_MAX_ENTRIES:
+            _schema_indexes.popitem(last=False)
+    
+    return schema_index
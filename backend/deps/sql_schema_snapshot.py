@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import datetime, timezone
+from hashlib import sha256
+
+from pydantic import BaseModel, Field
+
+from sqlalchemy import Engine, inspect, text
+from sqlalchemy.engine import Connection
+
+from deps.sql_reflection import SQLReflectionFilter
+
+
+# Standard information_schema views, available on PostgreSQL, MySQL and SQL Server
+INFORMATION_SCHEMA_COLUMNS_QUERY = """
+SELECT table_name, column_name, data_type, is_nullable, character_maximum_length, numeric_precision, numeric_scale, ordinal_position
+FROM information_schema.columns
+WHERE table_schema = :schema
+"""
+
+INFORMATION_SCHEMA_FOREIGN_KEYS_QUERY = """
+SELECT table_name, constraint_name
+FROM information_schema.table_constraints
+WHERE table_schema = :schema AND constraint_type = 'FOREIGN KEY'
+"""
+
+# PostgreSQL does not record DDL times in its catalog, its fingerprints rely on the checksum alone
+LAST_DDL_TIME_QUERIES: dict[str, str] = {
+    "mysql": """
+SELECT TABLE_NAME, COALESCE(CREATE_TIME, UPDATE_TIME)
+FROM information_schema.TABLES
+WHERE TABLE_SCHEMA = :schema
+""",
+    "mssql": """
+SELECT o.name, o.modify_date
+FROM sys.objects o
+JOIN sys.schemas s ON o.schema_id = s.schema_id
+WHERE s.name = :schema AND o.type IN ('U', 'V')
+""",
+}
+
+
+class SQLTableFingerprint(BaseModel):
+    """
+    Cheap fingerprint of the structure of a table. A changed fingerprint means the table has to be reflected again.
+    """
+    
+    schema_name: str | None = None
+    table_name: str
+    last_ddl_time: datetime | None = None
+    column_count: int
+    checksum: str
+    
+    @property
+    def key(self) -> str:
+        return f"{self.schema_name}.{self.table_name}" if self.schema_name else self.table_name
+
+
+class SQLSchemaDiff(BaseModel):
+    added: list[SQLTableFingerprint] = []
+    changed: list[SQLTableFingerprint] = []
+    removed: list[SQLTableFingerprint] = []
+    
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+    
+    def get_tables_to_reflect(self) -> list[tuple[str | None, list[str]]]:
+        """
+        Groups the added and changed tables by schema, in the (schema, table names) shape of reflection batches.
+        """
+        
+        tables_by_schema: dict[str | None, list[str]] = defaultdict(list)
+        
+        for fingerprint in self.added + self.changed:
+            tables_by_schema[fingerprint.schema_name].append(fingerprint.table_name)
+        
+        return list(tables_by_schema.items())
+
+
+class SQLSchemaSnapshot(BaseModel):
+    fingerprints: dict[str, SQLTableFingerprint] = {}
+    taken_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    
+    def diff(self, snapshot: SQLSchemaSnapshot) -> SQLSchemaDiff:
+        """
+        Compares a newer snapshot against this one.
+        """
+        
+        schema_diff = SQLSchemaDiff()
+        
+        for key, fingerprint in snapshot.fingerprints.items():
+            
+            previous_fingerprint = self.fingerprints.get(key)
+            
+            if previous_fingerprint is None:
+                schema_diff.added.append(fingerprint)
+            
+            elif (
+                previous_fingerprint.checksum != fingerprint.checksum
+                or previous_fingerprint.column_count != fingerprint.column_count
+                or previous_fingerprint.last_ddl_time != fingerprint.last_ddl_time
+            ):
+                schema_diff.changed.append(fingerprint)
+        
+        for key, fingerprint in self.fingerprints.items():
+            
+            if key not in snapshot.fingerprints:
+                schema_diff.removed.append(fingerprint)
+        
+        return schema_diff
+
+
+def _get_checksum(parts: list[str]) -> str:
+    return sha256("\n".join(parts).encode()).hexdigest()
+
+
+def _get_information_schema_fingerprints(connection: Connection, schema: str, table_names: set[str], dialect_name: str) -> list[SQLTableFingerprint]:
+    
+    columns: dict[str, list[tuple[int, str]]] = defaultdict(list)
+    
+    for table_name, column_name, data_type, is_nullable, max_length, precision, scale, ordinal_position in connection.execute(text(INFORMATION_SCHEMA_COLUMNS_QUERY), {"schema": schema}):
+        
+        if table_name in table_names:
+            columns[table_name].append((ordinal_position, f"{column_name}:{data_type}:{is_nullable}:{max_length}:{precision}:{scale}"))
+    
+    foreign_keys: dict[str, list[str]] = defaultdict(list)
+    
+    for table_name, constraint_name in connection.execute(text(INFORMATION_SCHEMA_FOREIGN_KEYS_QUERY), {"schema": schema}):
+        foreign_keys[table_name].append(f"fk:{constraint_name}")
+    
+    last_ddl_times: dict[str, datetime] = {}
+    
+    if dialect_name in LAST_DDL_TIME_QUERIES:
+        last_ddl_times = dict(connection.execute(text(LAST_DDL_TIME_QUERIES[dialect_name]), {"schema": schema}).tuples().all())
+    
+    return [
+        SQLTableFingerprint(
+            schema_name=schema,
+            table_name=table_name,
+            last_ddl_time=last_ddl_times.get(table_name),
+            column_count=len(columns[table_name]),
+            checksum=_get_checksum([column for _, column in sorted(columns[table_name])] + sorted(foreign_keys[table_name]))
+        )
+        for table_name in table_names
+    ]
+
+
+def _get_inspector_fingerprints(engine: Engine, schema: str | None, table_names: set[str]) -> list[SQLTableFingerprint]:
+    """
+    Fallback for dialects without information_schema, e.g. SQLite. Slower, as every table is inspected on its own.
+    """
+    
+    inspector = inspect(engine)
+    fingerprints: list[SQLTableFingerprint] = []
+    
+    for table_name in table_names:
+        
+        columns = inspector.get_columns(table_name, schema=schema)
+        foreign_keys = inspector.get_foreign_keys(table_name, schema=schema)
+        
+        fingerprints.append(
+            SQLTableFingerprint(
+                schema_name=schema,
+                table_name=table_name,
+                column_count=len(columns),
+                checksum=_get_checksum(
+                    [f"{column['name']}:{column['type']}:{column['nullable']}" for column in columns]
+                    + sorted(f"fk:{foreign_key['name']}:{foreign_key['referred_table']}:{foreign_key['referred_columns']}" for foreign_key in foreign_keys)
+                )
+            )
+        )
+    
+    return fingerprints
+
+
+def take_schema_snapshot(engine: Engine, reflection_filter: SQLReflectionFilter | None = None) -> SQLSchemaSnapshot:
+    """
+    Fingerprints every table matching the filter with a few catalog queries per schema.
+    """
+    
+    reflection_filter = reflection_filter or SQLReflectionFilter()
+    inspector = inspect(engine)
+    dialect_name = engine.dialect.name
+    
+    if reflection_filter.include_schemas is None:
+        schemas: list[str | None] = [None]
+    
+    else:
+        schemas = [schema for schema in inspector.get_schema_names() if reflection_filter.matches_schema(schema)]
+    
+    snapshot = SQLSchemaSnapshot()
+    
+    for schema in schemas:
+        
+        table_names = {
+            table_name for table_name in inspector.get_table_names(schema=schema)
+            if reflection_filter.matches_table(table_name)
+        }
+        
+        if dialect_name in ("postgresql", "mysql", "mssql"):
+            
+            with engine.connect() as connection:
+                fingerprints = _get_information_schema_fingerprints(connection, schema or inspector.default_schema_name, table_names, dialect_name)
+            
+            # Tables of the default schema are reflected without schema
+            for fingerprint in fingerprints:
+                fingerprint.schema_name = schema
+        
+        else:
+            fingerprints = _get_inspector_fingerprints(engine, schema, table_names)
+        
+        for fingerprint in fingerprints:
+            snapshot.fingerprints[fingerprint.key] = fingerprint
+    
+    return snapshot
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from contextlib import closing, aclosing
+
+from typing import AsyncIterator, Iterator
+
+from pydantic import BaseModel, Field
+
+from pandas import DataFrame, concat
+
+from settings import settings
+
+
+class SQLFetchBudget(BaseModel):
+    """
+    Upper bounds for a fetched result. Fetching stops early once one of them is reached.
+    """
+    
+    max_rows: int | None = Field(default_factory=lambda: settings.SQL_MAX_RESULT_ROWS)
+    max_bytes: int | None = Field(default_factory=lambda: settings.SQL_MAX_RESULT_BYTES)
+
+
+class SQLFetchAccumulator:
+    
+    def __init__(self, budget: SQLFetchBudget) -> None:
+        self.budget = budget
+        self.chunks: list[DataFrame] = []
+        self.row_count: int = 0
+        self.byte_count: int = 0
+        self.truncated: bool = False
+        
+    def add(self, chunk: DataFrame) -> bool:
+        """
+        Adds a chunk and returns False once the budget is exhausted.
+        """
+        
+        if self.budget.max_rows is not None and self.row_count + len(chunk) > self.budget.max_rows:
+            chunk = chunk.iloc[:self.budget.max_rows - self.row_count]
+            self.truncated = True
+        
+        chunk_bytes = int(chunk.memory_usage(deep=True).sum()) if len(chunk) else 0
+        
+        if self.budget.max_bytes is not None and self.byte_count + chunk_bytes > self.budget.max_bytes:
+            remaining_bytes = self.budget.max_bytes - self.byte_count
+            chunk = chunk.iloc[:max(0, int(remaining_bytes / (chunk_bytes / len(chunk))))]
+            chunk_bytes = int(chunk.memory_usage(deep=True).sum()) if len(chunk) else 0
+            self.truncated = True
+            
+        self.chunks.append(chunk)
+        self.row_count += len(chunk)
+        self.byte_count += chunk_bytes
+        
+        return not self.truncated
+    
+    def get_dataframe(self) -> DataFrame:
+        
+        df = concat(self.chunks, ignore_index=True) if len(self.chunks) > 1 else self.chunks[0]
+        df.attrs["truncated"] = self.truncated
+        
+        return df
+
+
+def collect_dataframe_chunks(chunks: Iterator[DataFrame], budget: SQLFetchBudget | None = None) -> DataFrame:
+    """
+    Concatenates streamed chunks until the budget is exhausted.
+    The returned DataFrame reports an early stop in `df.attrs["truncated"]`.
+    """
+    
+    accumulator = SQLFetchAccumulator(budget or SQLFetchBudget())
+    
+    with closing(chunks):
+        
+        for chunk in chunks:
+            
+            if not accumulator.add(chunk):
+                break
+            
+    return accumulator.get_dataframe()
+
+
+async def collect_dataframe_chunks_async(chunks: AsyncIterator[DataFrame], budget: SQLFetchBudget | None = None) -> DataFrame:
+    
+    accumulator = SQLFetchAccumulator(budget or SQLFetchBudget())
+    
+    async with aclosing(chunks):
+        
+        async for chunk in chunks:
+            
+            if not accumulator.add(chunk):
+                break
+            
+    return accumulator.get_dataframe()
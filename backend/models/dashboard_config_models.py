@@ -1,11 +1,12 @@
-from typing import Literal, List
-
-from datetime import datetime, date, time
+from typing import Any, Literal, List
 
 from pydantic import field_validator, BaseModel
 
+from sqlalchemy.sql.elements import TextClause
+
 from aredis_om import EmbeddedJsonModel, JsonModel
 
+from deps.sql_parameters import compile_parametrized_query, coerce_parameter_value
 from models.sql_dependency_model import SQLBaseDependencyModel
 from results.dashboard_config_results import DashboardSQLQueryResult
 from results.plotly_chart_config_results import BarChartConfig, LineChartConfig, PieChartConfig, ScatterChartConfig, HistogramChartConfig, BoxChartConfig
@@ -17,36 +18,28 @@ class DashboardSQLQueryModel(DashboardSQLQueryResult):
     sql_dependency_id: str
     
     async def get_sql_dependency(self) -> SQLBaseDependencyModel:
-        return await SQLBaseDependencyModel.get(self.sql_dependency_id)
+        return await SQLBaseDependencyModel.get_cached(self.sql_dependency_id)
 
 
-    def evaluate_query(self, parameter_values: List[DashboardSQLQueryParameterValue]) -> str:
-        evaluated_query = self.parametrized_query
+    def evaluate_query(self, parameter_values: List[DashboardSQLQueryParameterValue]) -> tuple[TextClause, dict[str, Any]]:
+        
+        statement = compile_parametrized_query(
+            self.parametrized_query,
+            tuple((param.parameter.name, param.parameter.type) for param in parameter_values)
+        )
         
-        for param in parameter_values:
-            placeholder = "{" + param.name + "}"
-            
-            if placeholder not in evaluated_query:
-                raise ValueError(f"Parameter '{param.name}' not found in query")
-            
-            if isinstance(param.value, str):
-                value_str = f"'{param.value}'"
-            elif isinstance(param.value, bool):
-                value_str = 'TRUE' if param.value else 'FALSE'
-            elif isinstance(param.value, (datetime, date, time)):
-                value_str = f"'{param.value.isoformat()}'"
-            else:
-                value_str = str(param.value)
-            
-            evaluated_query = evaluated_query.replace(placeholder, value_str)
+        parameters = {
+            param.parameter.name: coerce_parameter_value(param.value, param.parameter.type)
+            for param in parameter_values
+        }
         
-        return evaluated_query
+        return statement, parameters
     
     
     async def execute_query(self, parameter_values: List[DashboardSQLQueryParameterValue]) -> PandasDataFrame:
         sql_dependency = await self.get_sql_dependency()
-        query = self.evaluate_query(parameter_values)
-        return PandasDataFrame.from_dataframe(sql_dependency.get_dataframe_from_query(query))
+        statement, parameters = self.evaluate_query(parameter_values)
+        return PandasDataFrame.from_dataframe(await sql_dependency.get_dataframe_from_query_async(statement, parameters=parameters))
 
 
 class DashboardConfigModel(JsonModel):
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from typing import Any, TypeVar
+
+from aredis_om import JsonModel
+
+
+JsonModelT = TypeVar("JsonModelT", bound=JsonModel)
+
+SCAN_COUNT = 1000
+
+
+def _get_key_prefix(model: type[JsonModel]) -> str:
+    return model.make_primary_key("")
+
+
+async def scan_pks(model: type[JsonModel], cursor: int = 0, limit: int | None = None) -> tuple[list[str], int | None]:
+    """
+    Scans the primary keys of a model, starting at a SCAN cursor.
+    
+    Returns the primary keys and the cursor to continue from, or None once the scan is complete.
+    Without a limit, all primary keys are returned. With a limit, at least `limit` keys are returned unless the scan completes,
+    and possibly a few more, as SCAN returns keys in batches.
+    """
+    
+    db = model.db()
+    key_prefix = _get_key_prefix(model)
+    pks: list[str] = []
+    
+    while True:
+        
+        cursor, keys = await db.scan(cursor=cursor, match=f"{key_prefix}*", count=SCAN_COUNT if limit is None else min(limit, SCAN_COUNT))
+        pks.extend(key[len(key_prefix):] for key in keys)
+        
+        if cursor == 0:
+            return pks, None
+        
+        if limit is not None and len(pks) >= limit:
+            return pks, cursor
+
+
+async def get_many(model: type[JsonModelT], pks: list[str]) -> list[JsonModelT]:
+    """
+    Loads the documents of many primary keys with a single JSON.MGET. Keys deleted in the meantime are skipped.
+    """
+    
+    if not pks:
+        return []
+    
+    documents = await model.db().json().mget([model.make_primary_key(pk) for pk in pks], "$")
+    
+    return [model.model_validate(document[0]) for document in documents if document]
+
+
+async def get_many_projections(model: type[JsonModel], pks: list[str], paths: dict[str, str], array_lengths: dict[str, str] | None = None) -> list[dict[str, Any]]:
+    """
+    Loads only the given JSONPaths (and lengths of arrays) of many documents in one pipelined round trip,
+    e.g. to list documents without their large nested fields.
+    
+    `paths` and `array_lengths` map field names of the projection to JSONPaths. Keys deleted in the meantime are skipped.
+    """
+    
+    if not pks:
+        return []
+    
+    array_lengths = array_lengths or {}
+    
+    pipeline = model.db().pipeline(transaction=False)
+    
+    for pk in pks:
+        
+        key = model.make_primary_key(pk)
+        pipeline.json().get(key, *paths.values())
+        
+        for path in array_lengths.values():
+            pipeline.json().arrlen(key, path)
+            
+    # JSON.ARRLEN fails for keys deleted in the meantime, which must not fail the whole listing
+    results = await pipeline.execute(raise_on_error=False)
+    step = 1 + len(array_lengths)
+    projections: list[dict[str, Any]] = []
+    
+    for idx, pk in enumerate(pks):
+        
+        values, *lengths = results[idx * step:(idx + 1) * step]
+        
+        if values is None or isinstance(values, Exception):
+            continue
+        
+        # JSON.GET returns the values of a single path directly and a mapping of path to values for several paths
+        if len(paths) == 1:
+            values = {next(iter(paths.values())): values}
+        
+        projection: dict[str, Any] = {"pk": pk}
+        
+        for field_name, path in paths.items():
+            matches = values.get(path) or []
+            projection[field_name] = matches[0] if matches else None
+            
+        for field_name, length in zip(array_lengths, lengths):
+            projection[field_name] = length[0] if isinstance(length, list) and length else None
+            
+        projections.append(projection)
+        
+    return projections
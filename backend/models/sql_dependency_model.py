@@ -1,9 +1,320 @@
 from __future__ import annotations
 
-from aredis_om import JsonModel
+import asyncio
+import json
 
-from deps.sql_dependency import SQLBaseDependency
+from collections import OrderedDict
+from time import monotonic
+from uuid import UUID
+
+from pydantic import Field, PrivateAttr, model_validator
+
+from aredis_om import JsonModel, NotFoundError
+
+from redis.commands.json.path import Path
+
+import logfire
+
+from deps.sql_dependency import SQLBaseDependency, SQLDatabaseTable
+from deps.sql_engine_registry import sql_engine_registry
+from models.json_model_batch import get_many
+from models.sql_table_model import SQLTableModel
+from settings import settings
+
+
+SQL_DEPENDENCY_INVALIDATION_CHANNEL = "sql-dependency:invalidate"
 
 
 class SQLBaseDependencyModel(SQLBaseDependency, JsonModel):
-    pass
\ No newline at end of file
+    """
+    SQL dependency stored as a header document with table summaries, while every table is a separate `SQLTableModel`.
+    
+    Loading a dependency therefore only reads the header. `tables` stays None until `load_tables` is awaited,
+    and single tables are read on demand with `get_table_async`.
+    """
+    
+    tables: list[SQLDatabaseTable] | None = Field(default=None, exclude=True)
+    table_subset: list[SQLDatabaseTable] | None = Field(default=None, exclude=True)
+    
+    _stored_table_ids: set[UUID] = PrivateAttr(default_factory=set)
+    # Column names of tables read for query rewrites while `tables` is not loaded, by lowercased qualified name
+    _table_column_names: dict[str, list[str]] = PrivateAttr(default_factory=dict)
+    
+    @model_validator(mode="after")
+    def set_stored_table_ids(self) -> SQLBaseDependencyModel:
+        self._stored_table_ids = {table_summary.id for table_summary in self.table_summaries}
+        return self
+    
+    @property
+    def engine_key(self) -> str:
+        return self.pk
+    
+    async def save(self, pipeline=None) -> SQLBaseDependencyModel:
+        
+        if self.connection_params is not None:
+            sql_engine_registry.dispose(self.engine_key, fingerprint=self.connection_params.fingerprint)
+            
+        if self.tables is not None:
+            await self.save_tables()
+        
+        saved = await super().save(pipeline=pipeline)
+        
+        await sql_dependency_cache.publish_invalidation(self.pk)
+        
+        return saved
+    
+    def get_table_documents(self) -> list[tuple[str, dict]]:
+        """
+        Returns the key and JSON document of the record of every loaded table, as written by `SQLTableModel.save`.
+        """
+        
+        table_documents = []
+        
+        for table in self.tables:
+            
+            table_model = SQLTableModel(
+                pk=str(table.id),
+                dependency_pk=self.pk,
+                **table.model_dump(include=set(SQLDatabaseTable.model_fields))
+            )
+            table_model.check()
+            
+            table_documents.append((table_model.key(), json.loads(table_model.json())))
+            
+        return table_documents
+    
+    async def save_tables(self) -> None:
+        """
+        Writes the loaded tables to their own records in one pipeline and deletes the records of removed tables.
+        The tables are serialized in a thread, as validating and dumping thousands of columns would block the event loop.
+        """
+        
+        table_documents = await asyncio.to_thread(self.get_table_documents)
+        
+        pipeline = self.db().pipeline(transaction=False)
+        
+        for key, document in table_documents:
+            await pipeline.json().set(key, Path.root_path(), document)
+            
+        table_ids = {table.id for table in self.tables}
+            
+        for table_id in self._stored_table_ids - table_ids:
+            await SQLTableModel.delete(str(table_id), pipeline=pipeline)
+            
+        await pipeline.execute()
+        
+        self._stored_table_ids = table_ids
+    
+    async def load_tables(self) -> list[SQLDatabaseTable]:
+        
+        if self.tables is None:
+            self.set_loaded_tables(await get_many(SQLTableModel, [str(table_summary.id) for table_summary in self.table_summaries]))
+            
+        return self.tables
+    
+    def mark_tables_changed(self) -> None:
+        
+        super().mark_tables_changed()
+        
+        self._table_column_names = {}
+    
+    async def load_table_columns(self, table_names: list[tuple[str, str | None]]) -> None:
+        """
+        Reads the records of the given tables if `tables` is not loaded, so stars of queries are expanded
+        without loading the whole schema. Tables unknown to the dependency are skipped.
+        """
+        
+        if self.tables is not None:
+            return
+        
+        keys = {f"{schema_name}.{table_name}".lower() if schema_name else table_name.lower() for table_name, schema_name in table_names}
+        keys -= self._table_column_names.keys()
+        
+        table_ids = [str(table_summary.id) for table_summary in self.table_summaries if table_summary.qualified_name.lower() in keys]
+        
+        for table in await get_many(SQLTableModel, table_ids):
+            self._table_column_names[table.qualified_name.lower()] = [column.name for column in table.columns]
+    
+    def get_table_column_names(self, table_name: str, schema_name: str | None = None) -> list[str] | None:
+        
+        if self.tables is not None:
+            return super().get_table_column_names(table_name, schema_name)
+        
+        return self._table_column_names.get(f"{schema_name}.{table_name}".lower() if schema_name else table_name.lower())
+    
+    async def get_table_async(self, table_id: UUID | str) -> SQLDatabaseTable:
+        """
+        Returns a single table, reading only its record if the tables are not loaded.
+        """
+        
+        if self.tables is not None:
+            return self.get_table_by_id(table_id)
+        
+        if isinstance(table_id, str):
+            table_id = UUID(table_id)
+            
+        if table_id not in self._stored_table_ids:
+            raise ValueError(f"Table with id {table_id} not found")
+        
+        table = await SQLTableModel.get(str(table_id))
+        excluded_column_names = self.get_excluded_column_names()
+        
+        for column in table.columns:
+            if column.name in excluded_column_names:
+                column.exclude = True
+                
+        return table
+    
+    @classmethod
+    async def delete(cls, pk: str, pipeline=None) -> int:
+        
+        sql_engine_registry.dispose(pk)
+        
+        try:
+            table_ids = (await cls.get(pk))._stored_table_ids
+        except NotFoundError:
+            table_ids = set()
+        
+        for table_id in table_ids:
+            await SQLTableModel.delete(str(table_id), pipeline=pipeline)
+        
+        deleted = await super().delete(pk, pipeline=pipeline)
+        
+        await sql_dependency_cache.publish_invalidation(pk)
+        
+        return deleted
+    
+    @classmethod
+    async def get_cached(cls, pk: str) -> SQLBaseDependencyModel:
+        """
+        Returns the dependency from the in-process cache, see `SQLDependencyCache`.
+        The returned instance is shared, use `get` for a copy to modify.
+        """
+        
+        return await sql_dependency_cache.get(pk)
+
+
+class SQLDependencyCache:
+    """
+    Per-process LRU cache of deserialized SQL dependencies.
+    
+    Saving or deleting a dependency publishes its pk on a Redis channel, and every process evicts it on receipt.
+    The cache is only used while the listener is subscribed: after a reconnect it starts empty,
+    as invalidations may have been missed in between. Entries also expire after a TTL as a safety net.
+    """
+    
+    def __init__(self, ttl: float, max_entries: int) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, SQLBaseDependencyModel]] = OrderedDict()
+        self._generation = 0
+        self._listening = False
+        self._listener_task: asyncio.Task | None = None
+        
+    async def get(self, pk: str) -> SQLBaseDependencyModel:
+        
+        if not (settings.SQL_DEPENDENCY_CACHE_ENABLED and self._listening):
+            return await SQLBaseDependencyModel.get(pk)
+        
+        entry = self._entries.get(pk)
+        
+        if entry is not None:
+            
+            cached_at, sql_dependency = entry
+            
+            if monotonic() - cached_at < self.ttl:
+                self._entries.move_to_end(pk)
+                return sql_dependency
+            
+            self._entries.pop(pk, None)
+            
+        # An invalidation while loading means the loaded document may already be outdated
+        generation = self._generation
+        
+        sql_dependency = await SQLBaseDependencyModel.get(pk)
+        
+        if generation == self._generation and self._listening:
+            
+            self._entries[pk] = (monotonic(), sql_dependency)
+            
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                
+        return sql_dependency
+    
+    def invalidate(self, pk: str | None = None) -> None:
+        
+        self._generation += 1
+        
+        if pk is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(pk, None)
+            
+    async def publish_invalidation(self, pk: str) -> None:
+        
+        self.invalidate(pk)
+        
+        try:
+            await SQLBaseDependencyModel.db().publish(SQL_DEPENDENCY_INVALIDATION_CHANNEL, pk)
+        except Exception as exc:
+            logfire.warn("Failed to publish invalidation of SQL dependency {pk}: {error}", pk=pk, error=str(exc))
+            
+    def start_listener(self) -> None:
+        
+        if self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen())
+            
+    async def stop_listener(self) -> None:
+        
+        if self._listener_task is None:
+            return
+        
+        self._listener_task.cancel()
+        
+        try:
+            await self._listener_task
+        except asyncio.CancelledError:
+            pass
+        
+        self._listener_task = None
+            
+    async def _listen(self) -> None:
+        
+        while True:
+            
+            pubsub = None
+            
+            try:
+                pubsub = SQLBaseDependencyModel.db().pubsub()
+                await pubsub.subscribe(SQL_DEPENDENCY_INVALIDATION_CHANNEL)
+                
+                async for message in pubsub.listen():
+                    
+                    if message["type"] == "subscribe":
+                        self.invalidate()
+                        self._listening = True
+                        
+                    elif message["type"] == "message":
+                        self.invalidate(message["data"])
+                        
+            except asyncio.CancelledError:
+                raise
+            
+            except Exception as exc:
+                logfire.warn("SQL dependency invalidation listener disconnected: {error}", error=str(exc))
+                
+            finally:
+                self._listening = False
+                self.invalidate()
+                
+                if pubsub is not None:
+                    await asyncio.shield(pubsub.reset())
+                    
+            await asyncio.sleep(1)
+            
+            
+sql_dependency_cache = SQLDependencyCache(
+    ttl=settings.SQL_DEPENDENCY_CACHE_TTL,
+    max_entries=settings.SQL_DEPENDENCY_CACHE_MAX_ENTRIES
+)
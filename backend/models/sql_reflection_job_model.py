@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from typing import Literal
+
+from aredis_om import JsonModel
+
+from settings import settings
+
+
+SQLReflectionJobStatus = Literal["pending", "running", "completed", "failed"]
+
+SQL_REFLECTION_LOCK_KEY_PREFIX = "sql-reflection-lock:"
+
+
+class SQLReflectionJobModel(JsonModel):
+    """
+    Status of the schema reflection of a SQL dependency. Stored under the pk of the dependency.
+    
+    Only one reflection runs per dependency, claimed through a lock key next to the job. The running job renews
+    the lock with its heartbeat, so the lock of a job lost with its process expires and no longer blocks refreshes.
+    """
+    
+    status: SQLReflectionJobStatus = "pending"
+    incremental: bool = False
+    table_count: int | None = None
+    refreshed_table_count: int | None = None
+    error: str | None = None
+    started_at: datetime | None = None
+    heartbeat_at: datetime | None = None
+    finished_at: datetime | None = None
+    
+    @classmethod
+    def get_lock_key(cls, pk: str) -> str:
+        return SQL_REFLECTION_LOCK_KEY_PREFIX + pk
+    
+    @classmethod
+    async def acquire_lock(cls, pk: str) -> bool:
+        """
+        Atomically claims the reflection of a dependency with SET NX. Returns False if a reflection already holds it.
+        """
+        
+        return bool(await cls.db().set(cls.get_lock_key(pk), "1", nx=True, ex=settings.SQL_REFLECTION_JOB_STALE_AFTER))
+    
+    @classmethod
+    async def renew_lock(cls, pk: str) -> None:
+        await cls.db().expire(cls.get_lock_key(pk), settings.SQL_REFLECTION_JOB_STALE_AFTER)
+    
+    @classmethod
+    async def release_lock(cls, pk: str) -> None:
+        await cls.db().delete(cls.get_lock_key(pk))
+    
+    @classmethod
+    async def is_locked(cls, pk: str) -> bool:
+        return bool(await cls.db().exists(cls.get_lock_key(pk)))
@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+from aredis_om import JsonModel
+
+from deps.sql_schema_snapshot import SQLSchemaSnapshot
+
+
+class SQLSchemaSnapshotModel(SQLSchemaSnapshot, JsonModel):
+    """
+    Table fingerprints of a SQL dependency at its last reflection. Stored under the pk of the dependency.
+    """
@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+from aredis_om import JsonModel
+
+from deps.sql_dependency import SQLDatabaseTable
+
+
+class SQLTableModel(SQLDatabaseTable, JsonModel):
+    """
+    Table of a SQL dependency with its columns, stored apart from the dependency under the table id.
+    """
+    
+    dependency_pk: str
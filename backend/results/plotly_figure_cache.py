@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+from typing import Callable, Sequence
+
+from results.plotly_chart_config_results import PlotlyChartConfigBase
+from results.tool_results import PandasDataFrame, PlotlyFigure
+from settings import settings
+
+
+class PlotlyFigureCache:
+    """
+    Process-wide LRU cache of rendered figures.
+    
+    Keys contain the type and a hash of the chart config along with the fingerprint of the dataframe,
+    so only figures whose config or data changed are rendered again.
+    
+    The cache is bounded by the size of the serialized figures, as the traces of a figure hold its data
+    and one scatter plot of a large result can outweigh hundreds of bar charts.
+    """
+    
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        # Key -> (bytes, figure)
+        self._figures: OrderedDict[tuple[str, str, str], tuple[int, PlotlyFigure]] = OrderedDict()
+        self._byte_count: int = 0
+        self._lock = Lock()
+    
+    @staticmethod
+    def get_key(figure_config: PlotlyChartConfigBase, dataframe_fingerprint: str) -> tuple[str, str, str]:
+        return (
+            type(figure_config).__name__,
+            sha256(figure_config.model_dump_json().encode()).hexdigest(),
+            dataframe_fingerprint
+        )
+    
+    def get(self, figure_config: PlotlyChartConfigBase, dataframe_fingerprint: str) -> PlotlyFigure | None:
+        
+        key = self.get_key(figure_config, dataframe_fingerprint)
+        
+        with self._lock:
+            
+            entry = self._figures.get(key)
+            
+            if entry is None:
+                return None
+            
+            self._figures.move_to_end(key)
+        
+        return entry[1].model_copy()
+    
+    def set(self, figure_config: PlotlyChartConfigBase, dataframe_fingerprint: str, figure: PlotlyFigure) -> None:
+        
+        key = self.get_key(figure_config, dataframe_fingerprint)
+        nbytes = len(figure.model_dump_json())
+        
+        if nbytes > self.max_bytes:
+            return
+        
+        with self._lock:
+            
+            if key in self._figures:
+                self._byte_count -= self._figures.pop(key)[0]
+            
+            self._figures[key] = (nbytes, figure)
+            self._byte_count += nbytes
+            
+            while self._byte_count > self.max_bytes:
+                _, (evicted_nbytes, _) = self._figures.popitem(last=False)
+                self._byte_count -= evicted_nbytes
+    
+    def get_or_render(self, figure_config: PlotlyChartConfigBase, dataframe_fingerprint: str, render: Callable[[], PlotlyFigure]) -> PlotlyFigure:
+        
+        figure = self.get(figure_config, dataframe_fingerprint)
+        
+        if figure is not None:
+            return figure
+        
+        figure = render()
+        self.set(figure_config, dataframe_fingerprint, figure)
+        
+        return figure.model_copy()
+    
+    def clear(self) -> None:
+        
+        with self._lock:
+            self._figures.clear()
+            self._byte_count = 0
+
+
+plotly_figure_cache = PlotlyFigureCache(max_bytes=settings.FIGURE_RENDER_CACHE_MAX_BYTES)
+
+
+def render_figures(figure_configs: Sequence[PlotlyChartConfigBase], dataframe: PandasDataFrame) -> list[PlotlyFigure]:
+    """
+    Renders the figures of the configs, reusing the cached figures of configs unchanged since their last render.
+    """
+    
+    dataframe_fingerprint = dataframe.get_fingerprint()
+    
+    return [
+        plotly_figure_cache.get_or_render(
+            figure_config,
+            dataframe_fingerprint,
+            lambda figure_config=figure_config: figure_config.get_figure(dataframe=dataframe.to_dataframe())
+        )
+        for figure_config in figure_configs
+    ]
@@ -0,0 +1,399 @@
+from __future__ import annotations
+
+import asyncio
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from multiprocessing import get_context
+from multiprocessing.process import BaseProcess
+from multiprocessing.shared_memory import SharedMemory
+from threading import Lock, Timer
+from typing import AsyncIterator, NamedTuple, Sequence
+from weakref import WeakKeyDictionary
+
+from pandas import DataFrame
+from pydantic import BaseModel
+
+from results.plotly_chart_config_results import PlotlyChartConfigBase
+from results.plotly_figure_cache import plotly_figure_cache
+from results.tool_results import PandasDataFrame, PlotlyFigure, import_pyarrow
+from settings import settings
+
+
+# Workers are spawned rather than forked, as the app process runs an event loop and thread pools
+FIGURE_RENDER_START_METHOD = "spawn"
+
+# Frames decoded by a worker, so figures of the same evaluation landing on the same worker decode it once
+WORKER_DATAFRAME_CACHE_MAX_ENTRIES = 2
+
+
+class SharedDataFrame(NamedTuple):
+    """
+    Arrow IPC stream of a DataFrame in a shared memory block, passed to workers instead of the pickled frame.
+    """
+    
+    name: str
+    size: int
+
+
+class DashboardFigureError(BaseModel):
+    index: int
+    message: str
+
+
+_worker_dataframes: OrderedDict[str, DataFrame] = OrderedDict()
+
+
+def _load_shared_dataframe(shared_dataframe: SharedDataFrame) -> DataFrame:
+    
+    df = _worker_dataframes.get(shared_dataframe.name)
+    
+    if df is not None:
+        _worker_dataframes.move_to_end(shared_dataframe.name)
+        return df
+    
+    pa = import_pyarrow()
+    
+    shared_memory = SharedMemory(name=shared_dataframe.name)
+    
+    try:
+        payload = bytes(shared_memory.buf[:shared_dataframe.size])
+    
+    finally:
+        shared_memory.close()
+    
+    df = pa.ipc.open_stream(payload).read_pandas()
+    
+    _worker_dataframes[shared_dataframe.name] = df
+    
+    while len(_worker_dataframes) > WORKER_DATAFRAME_CACHE_MAX_ENTRIES:
+        _worker_dataframes.popitem(last=False)
+    
+    return df
+
+
+def _render_figure(figure_config: PlotlyChartConfigBase, dataframe: SharedDataFrame | DataFrame) -> PlotlyFigure:
+    """
+    Runs in a worker process.
+    """
+    
+    if isinstance(dataframe, SharedDataFrame):
+        dataframe = _load_shared_dataframe(dataframe)
+    
+    return figure_config.get_figure(dataframe=dataframe)
+
+
+def _create_shared_dataframe(df: DataFrame) -> tuple[SharedMemory | None, SharedDataFrame | DataFrame]:
+    """
+    Writes the frame as an Arrow IPC stream into a new shared memory block.
+    Without pyarrow, or for frames Arrow cannot hold, the frame itself is returned and pickled for every figure.
+    """
+    
+    pa = import_pyarrow(errors="ignore")
+    
+    if pa is None:
+        return None, df
+    
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=None)
+    
+    except (pa.ArrowException, ValueError, TypeError):
+        return None, df
+    
+    sink = pa.BufferOutputStream()
+    
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    
+    payload = sink.getvalue()
+    
+    shared_memory = SharedMemory(create=True, size=max(payload.size, 1))
+    
+    try:
+        shared_memory.buf[:payload.size] = memoryview(payload).cast("B")
+    
+    except BaseException:
+        shared_memory.close()
+        shared_memory.unlink()
+        raise
+    
+    return shared_memory, SharedDataFrame(name=shared_memory.name, size=payload.size)
+
+
+@asynccontextmanager
+async def share_dataframe(df: DataFrame) -> AsyncIterator[SharedDataFrame | DataFrame]:
+    """
+    Shares the frame with the workers for the duration of the block.
+    The frame is encoded in a thread, as encoding large frames would block the event loop.
+    """
+    
+    shared_memory, shared_dataframe = await asyncio.to_thread(_create_shared_dataframe, df)
+    
+    try:
+        yield shared_dataframe
+    
+    finally:
+        
+        if shared_memory is not None:
+            shared_memory.close()
+            shared_memory.unlink()
+
+
+_figure_render_pool: ProcessPoolExecutor | None = None
+_figure_render_pool_lock = Lock()
+
+# Only used from the event loop of the app
+_figure_render_slots: WeakKeyDictionary[ProcessPoolExecutor, asyncio.Semaphore] = WeakKeyDictionary()
+
+
+def _start_worker() -> None:
+    """
+    Runs in a worker process. Unpickling it imports this module and with it pandas and plotly,
+    decoding a small table initializes the pandas conversion of pyarrow.
+    """
+    
+    pa = import_pyarrow(errors="ignore")
+    
+    if pa is not None:
+        pa.table({"column": [0]}).to_pandas()
+
+
+def start_figure_render_pool() -> None:
+    """
+    Creates the process pool rendering figures. Called from the lifespan of the FastAPI app.
+    Workers are started right away, so spawning them and importing plotly doesn't count against the timeout of the first renders.
+    """
+    
+    _prewarm_figure_render_pool(get_figure_render_pool())
+
+
+def _prewarm_figure_render_pool(pool: ProcessPoolExecutor) -> None:
+    
+    for _ in range(settings.FIGURE_RENDER_MAX_WORKERS):
+        pool.submit(_start_worker)
+
+
+def get_figure_render_pool() -> ProcessPoolExecutor:
+    """
+    Returns the shared process pool, created on first use if it was not started with the app.
+    """
+    
+    global _figure_render_pool
+    
+    with _figure_render_pool_lock:
+        
+        if _figure_render_pool is None:
+            _figure_render_pool = ProcessPoolExecutor(
+                max_workers=settings.FIGURE_RENDER_MAX_WORKERS,
+                mp_context=get_context(FIGURE_RENDER_START_METHOD)
+            )
+        
+        return _figure_render_pool
+
+
+def _get_figure_render_slots(pool: ProcessPoolExecutor) -> asyncio.Semaphore:
+    """
+    Limits the renders submitted to a pool to its number of workers. A submitted render therefore starts right away,
+    and its timeout covers the render itself rather than the time spent queued behind other renders.
+    """
+    
+    slots = _figure_render_slots.get(pool)
+    
+    if slots is None:
+        slots = _figure_render_slots[pool] = asyncio.Semaphore(settings.FIGURE_RENDER_MAX_WORKERS)
+    
+    return slots
+
+
+def _terminate_workers(processes: list[BaseProcess]) -> None:
+    
+    for process in processes:
+        
+        if process.is_alive():
+            process.terminate()
+
+
+def _discard_figure_render_pool(pool: ProcessPoolExecutor) -> None:
+    """
+    Replaces a pool broken by a crashed worker or stuck on a timed out render with a new, prewarmed one.
+    
+    Renders submitted to the old pool started right away, see `_get_figure_render_slots`, so once the render timeout
+    has passed again, every worker still running is stuck and its process is terminated.
+    """
+    
+    global _figure_render_pool
+    
+    with _figure_render_pool_lock:
+        
+        is_current = _figure_render_pool is pool
+        
+        if is_current:
+            _figure_render_pool = None
+        
+        # Read before the shutdown, which drops the processes of the pool
+        processes = list((pool._processes or {}).values())
+    
+    pool.shutdown(wait=False, cancel_futures=True)
+    
+    terminate_timer = Timer(settings.FIGURE_RENDER_TIMEOUT, _terminate_workers, args=(processes,))
+    terminate_timer.daemon = True
+    terminate_timer.start()
+    
+    if is_current:
+        _prewarm_figure_render_pool(get_figure_render_pool())
+
+
+def shutdown_figure_render_pool() -> None:
+    
+    global _figure_render_pool
+    
+    with _figure_render_pool_lock:
+        pool, _figure_render_pool = _figure_render_pool, None
+    
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _render_figure_async(figure_config: PlotlyChartConfigBase, dataframe: SharedDataFrame | DataFrame, timeout: float) -> PlotlyFigure:
+    
+    while True:
+        
+        pool = get_figure_render_pool()
+        
+        async with _get_figure_render_slots(pool):
+            
+            # The pool was replaced while waiting for a slot
+            if pool is not _figure_render_pool:
+                continue
+            
+            try:
+                future = pool.submit(_render_figure, figure_config, dataframe)
+            
+            except BrokenProcessPool:
+                _discard_figure_render_pool(pool)
+                raise
+            
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+            
+            except BrokenProcessPool:
+                _discard_figure_render_pool(pool)
+                raise
+            
+            # The worker can't be interrupted and keeps rendering, so its result is dropped
+            # and later renders go to a new pool instead of waiting for the worker
+            except asyncio.TimeoutError:
+                _discard_figure_render_pool(pool)
+                raise
+
+
+def _get_error_message(exc: BaseException, timeout: float) -> str:
+    
+    if isinstance(exc, asyncio.TimeoutError):
+        return f"Rendering the figure timed out after {timeout} seconds"
+    
+    if isinstance(exc, BrokenProcessPool):
+        return "The process rendering the figure terminated unexpectedly"
+    
+    return f"{type(exc).__name__}: {exc}"
+
+
+async def _render_indexed_figure_async(
+    idx: int,
+    figure_config: PlotlyChartConfigBase,
+    dataframe: SharedDataFrame | DataFrame,
+    timeout: float
+) -> tuple[int, PlotlyFigure | Exception]:
+    
+    try:
+        return idx, await _render_figure_async(figure_config, dataframe, timeout)
+    
+    except Exception as exc:
+        return idx, exc
+
+
+async def iter_rendered_figures_async(
+    figure_configs: Sequence[PlotlyChartConfigBase],
+    dataframe: PandasDataFrame,
+    timeout: float | None = None
+) -> AsyncIterator[tuple[int, PlotlyFigure | DashboardFigureError]]:
+    """
+    Yields the index and figure of each config as soon as it is rendered, or its error if it failed or timed out.
+    Cached figures come first, the others are rendered concurrently on the process pool and yielded as they complete.
+    """
+    
+    timeout = timeout if timeout is not None else settings.FIGURE_RENDER_TIMEOUT
+    
+    # Hashes the whole frame
+    dataframe_fingerprint = await asyncio.to_thread(dataframe.get_fingerprint)
+    
+    missing_idxs: list[int] = []
+    
+    for idx, figure_config in enumerate(figure_configs):
+        
+        figure = plotly_figure_cache.get(figure_config, dataframe_fingerprint)
+        
+        if figure is None:
+            missing_idxs.append(idx)
+        
+        else:
+            yield idx, figure
+    
+    if not missing_idxs:
+        return
+    
+    async with share_dataframe(dataframe.to_dataframe()) as shared_dataframe:
+        
+        tasks = [
+            asyncio.ensure_future(_render_indexed_figure_async(idx, figure_configs[idx], shared_dataframe, timeout))
+            for idx in missing_idxs
+        ]
+        
+        try:
+            
+            for task in asyncio.as_completed(tasks):
+                
+                idx, result = await task
+                
+                if isinstance(result, Exception):
+                    yield idx, DashboardFigureError(index=idx, message=_get_error_message(result, timeout))
+                    continue
+                
+                plotly_figure_cache.set(figure_configs[idx], dataframe_fingerprint, result)
+                
+                yield idx, result.model_copy()
+        
+        # Stops the remaining renders if the consumer gave up, e.g. a client disconnected from a stream
+        finally:
+            
+            for task in tasks:
+                task.cancel()
+
+
+async def render_figures_async(
+    figure_configs: Sequence[PlotlyChartConfigBase],
+    dataframe: PandasDataFrame,
+    timeout: float | None = None
+) -> tuple[list[PlotlyFigure | None], list[DashboardFigureError]]:
+    """
+    Renders the figures of the configs concurrently on the process pool, reusing cached figures.
+    Figures are returned in the order of their configs, a figure that failed or timed out is None
+    and its error is reported with its index.
+    """
+    
+    figures: list[PlotlyFigure | None] = [None] * len(figure_configs)
+    figure_errors: list[DashboardFigureError] = []
+    
+    async for idx, result in iter_rendered_figures_async(figure_configs, dataframe, timeout):
+        
+        if isinstance(result, DashboardFigureError):
+            figure_errors.append(result)
+        
+        else:
+            figures[idx] = result
+    
+    figure_errors.sort(key=lambda figure_error: figure_error.index)
+    
+    return figures, figure_errors
@@ -1,39 +1,223 @@
 from __future__ import annotations
 
+import base64
 import json
 
-from typing import List, Any, Dict
+from hashlib import sha256
 
-from pydantic import BaseModel
+from typing import List, Any, Dict, Literal
 
-from pandas import DataFrame
+from pydantic import BaseModel, PrivateAttr
+
+from pandas import DataFrame, RangeIndex
+from pandas.util import hash_pandas_object
 from plotly.graph_objects import Figure
 
+# "split" holds the cells row by row, "columnar" one array per column with its dtype
+# and "arrow" a base64 encoded Arrow IPC stream, the cheapest to build and to decode for large results
+DataFrameFormat = Literal["split", "columnar", "arrow"]
+# Formats the frontend can display, which has no Arrow reader
+JSONDataFrameFormat = Literal["split", "columnar"]
+
+
+def import_pyarrow(errors: str = "raise"):
+    
+    # utils imports the agent state, which imports this module
+    from utils import import_dependency
+    
+    return import_dependency("pyarrow", extra="pyarrow is required for the arrow DataFrame format, install the arrow extra.", errors=errors)
+
+
+def _get_column_names(df: DataFrame) -> List[str]:
+    return [str(column) for column in df.columns]
+
+
+def _copy_dataframe(df: DataFrame) -> DataFrame:
+    """
+    Shallow copy so callers can't add or drop columns of a cached frame.
+    """
+    
+    df_copy = df.copy(deep=False)
+    df_copy.attrs = dict(df.attrs)
+    
+    return df_copy
+
+
+def _is_default_index(df: DataFrame) -> bool:
+    return isinstance(df.index, RangeIndex) and df.index.start == 0 and df.index.step == 1
+
+
 class SQLQueryResult(BaseModel):
     query: str
     result: PandasDataFrame
 
 class PandasDataFrame(BaseModel):
-    data: List[List[Any]]
+    data: List[List[Any]] = []
     columns: List[str]
     index: List[Any] | None = None
+    truncated: bool = False
+    format: DataFrameFormat = "split"
+    column_data: List[List[Any]] | None = None
+    dtypes: List[str] | None = None
+    arrow: str | None = None
+    
+    # Built on first use, or seeded by from_dataframe, and dropped whenever a field is assigned
+    _dataframe: DataFrame | None = PrivateAttr(default=None)
+    _fingerprint: str | None = PrivateAttr(default=None)
+    
+    def __setattr__(self, name: str, value: Any) -> None:
+        
+        super().__setattr__(name, value)
+        
+        if name in type(self).model_fields:
+            self._dataframe = None
+            self._fingerprint = None
+    
+    def get_fingerprint(self) -> str:
+        """
+        Hash of the columns, dtypes, index and values, the same for equal frames whichever format they were sent in.
+        """
+        
+        if self._fingerprint is None:
+            
+            if self._dataframe is None:
+                self._dataframe = self._build_dataframe()
+            
+            digest = sha256(json.dumps([self.columns, [str(dtype) for dtype in self._dataframe.dtypes]]).encode())
+            
+            try:
+                digest.update(hash_pandas_object(self._dataframe, index=True).values.tobytes())
+            
+            # Cells holding lists or dicts can't be hashed by pandas
+            except TypeError:
+                digest.update(self._dataframe.to_json(orient="split", default_handler=str).encode())
+            
+            self._fingerprint = digest.hexdigest()
+        
+        return self._fingerprint
     
     @classmethod
-    def from_dataframe(cls, df: DataFrame) -> PandasDataFrame:
-        return cls(
-            data=df.values.tolist(),
-            columns=df.columns.tolist(),
-            index=df.index.tolist() if df.index is not None else None
-        )
+    def from_dataframe(cls, df: DataFrame, format: DataFrameFormat = "split") -> PandasDataFrame:
+        """
+        The cells come straight from the DataFrame, so they are not validated again.
+        Falls back to the columnar format if arrow is requested without pyarrow installed,
+        or for frames Arrow cannot hold, e.g. with duplicate column names or mixed types in a column.
+        """
+        
+        pandas_dataframe: PandasDataFrame | None = None
+        pa = import_pyarrow(errors="ignore") if format == "arrow" else None
+        
+        if pa is not None:
+            
+            try:
+                table = pa.Table.from_pandas(df.set_axis(_get_column_names(df), axis=1), preserve_index=None)
+            
+            except (pa.ArrowException, ValueError, TypeError):
+                table = None
+            
+            if table is not None:
+                
+                sink = pa.BufferOutputStream()
+                
+                # Left uncompressed, as the Arrow JS reader does not bundle compression codecs
+                with pa.ipc.new_stream(sink, table.schema) as writer:
+                    writer.write_table(table)
+                
+                pandas_dataframe = cls.model_construct(
+                    columns=_get_column_names(df),
+                    truncated=df.attrs.get("truncated", False),
+                    format="arrow",
+                    arrow=base64.b64encode(sink.getvalue().to_pybytes()).decode()
+                )
+        
+        if pandas_dataframe is None and format != "split":
+            pandas_dataframe = cls.model_construct(
+                columns=_get_column_names(df),
+                index=None if _is_default_index(df) else df.index.tolist(),
+                truncated=df.attrs.get("truncated", False),
+                format="columnar",
+                column_data=[df.iloc[:, column_idx].tolist() for column_idx in range(df.shape[1])],
+                dtypes=[str(dtype) for dtype in df.dtypes]
+            )
+        
+        if pandas_dataframe is None:
+            pandas_dataframe = cls.model_construct(
+                data=df.values.tolist(),
+                columns=_get_column_names(df),
+                index=df.index.tolist() if df.index is not None else None,
+                truncated=df.attrs.get("truncated", False)
+            )
+        
+        pandas_dataframe._dataframe = _copy_dataframe(df)
         
+        return pandas_dataframe
+    
     def to_dataframe(self) -> DataFrame:
-        return DataFrame(**self.model_dump())
+        """
+        Returns a shallow copy of the cached frame. Columns can be added, replaced or dropped,
+        but values must not be modified in place, as they are shared with the cache.
+        """
+        
+        if self._dataframe is None:
+            self._dataframe = self._build_dataframe()
+        
+        return _copy_dataframe(self._dataframe)
     
-    def head(self, n: int = 5) -> PandasDataFrame:
-        df = self.to_dataframe().head(n)
-        return PandasDataFrame.from_dataframe(df)
+    def _build_dataframe(self) -> DataFrame:
+        
+        if self.format == "arrow":
+            
+            if self.arrow is None:
+                raise ValueError("Arrow payload is not set")
+            
+            pa = import_pyarrow()
+            
+            df = pa.ipc.open_stream(base64.b64decode(self.arrow)).read_pandas()
+        
+        elif self.format == "columnar":
+            
+            df = DataFrame(dict(enumerate(self.column_data or [])), index=self.index)
+            df.columns = self.columns
+            
+            # Values decoded from JSON, e.g. timestamps as ISO strings, are cast back to the dtypes they were sent with
+            for column_idx, dtype in enumerate(self.dtypes or []):
+                
+                if str(df.dtypes.iloc[column_idx]) == dtype:
+                    continue
+                
+                try:
+                    df.isetitem(column_idx, df.iloc[:, column_idx].astype(dtype))
+                
+                except (TypeError, ValueError):
+                    pass
+        
+        else:
+            df = DataFrame(data=self.data, columns=self.columns, index=self.index)
+        
+        df.attrs["truncated"] = self.truncated
+        
+        return df
     
+    def to_format(self, format: DataFrameFormat) -> PandasDataFrame:
+        
+        if format == self.format:
+            return self
+        
+        return PandasDataFrame.from_dataframe(self.to_dataframe(), format=format)
     
+    def head(self, n: int = 5, format: DataFrameFormat = "split") -> PandasDataFrame:
+        """
+        Returns the first n rows, by default in the split format whatever the format of this frame,
+        as heads are returned to the model, which can not read columnar arrays or Arrow payloads.
+        """
+        
+        if self._dataframe is None:
+            self._dataframe = self._build_dataframe()
+        
+        # head is a view of the cached frame, only the first n rows are converted
+        return PandasDataFrame.from_dataframe(self._dataframe.head(n), format=format)
+
+
 class PlotlyFigure(BaseModel):
     data: List[Dict]
     layout: Dict[str, Any] | None = None
@@ -44,6 +228,6 @@ class PlotlyFigure(BaseModel):
         return cls(
             **json.loads(fig.to_json())
         )
-        
+    
     def to_figure(self) -> Figure:
         return Figure(**self.model_dump())
\ No newline at end of file
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+
+class DashboardConfigSummary(BaseModel):
+    """
+    List view of a dashboard configuration without its chart config and parameter definitions.
+    """
+    
+    pk: str
+    sql_dependency_id: str | None = None
+    parametrized_query: str | None = None
+    parameter_count: int | None = None
+    title: str | None = None
@@ -1,79 +1,177 @@
 from __future__ import annotations
 
-import asyncio
-
 from datetime import datetime, date, time
 
-from typing import List
+from typing import Any, AsyncIterator, List, Literal
 
 from pydantic import BaseModel
 
+from pandas import DataFrame
+
+from sqlalchemy.sql.elements import TextClause
 
+
+from deps.sql_admission import SQLQueryPriority
+from deps.sql_parameters import compile_parametrized_query, coerce_parameter_value
 from models.sql_dependency_model import SQLBaseDependencyModel
 from results.dashboard_config_results import DashboardSQLQueryResult, DashboardSQLQueryParameter
 from results.plotly_chart_config_results import BoxChartConfig, ScatterChartConfig, PieChartConfig, LineChartConfig, HistogramChartConfig, BarChartConfig
-from results.tool_results import PandasDataFrame, PlotlyFigure
+from results.plotly_figure_renderer import DashboardFigureError, iter_rendered_figures_async, render_figures_async
+from results.tool_results import DataFrameFormat, PandasDataFrame, PlotlyFigure
 
 class DashboardSQLQueryParameterValue(BaseModel):
     parameter: DashboardSQLQueryParameter
     value: str | int | float | bool | datetime | date | time
-    
+
 class DashboardEvaluationSQLQuery(BaseModel):
     sql_dependency_id: str
     parametrized_query: str
     dashboard_sql_query_parameter_values: List[DashboardSQLQueryParameterValue]
     
-    async def evaluate(self, timeout: int = 180) -> PandasDataFrame:
+    def get_statement(self) -> tuple[TextClause, dict[str, Any]]:
+        """
+        Returns the compiled statement with typed bind parameters and the values to bind.
+        """
         
-        sql_dependency = await SQLBaseDependencyModel.get(pk=self.sql_dependency_id)
+        statement = compile_parametrized_query(
+            self.parametrized_query,
+            tuple(
+                (param_value.parameter.name, param_value.parameter.type)
+                for param_value in self.dashboard_sql_query_parameter_values
+            )
+        )
         
-        evaluated_query = self.parametrized_query
+        parameters = {
+            param_value.parameter.name: coerce_parameter_value(param_value.value, param_value.parameter.type)
+            for param_value in self.dashboard_sql_query_parameter_values
+        }
         
-        for param_value in self.dashboard_sql_query_parameter_values:
-            placeholder = "{" + param_value.parameter.name + "}"
-            
-            if placeholder not in evaluated_query:
-                raise ValueError(f"Parameter '{param_value.parameter.name}' not found in query")
-            
-            if isinstance(param_value.value, str):
-                value_str = f"'{param_value.value}'"
-            elif isinstance(param_value.value, bool):
-                value_str = 'TRUE' if param_value.value else 'FALSE'
-            elif isinstance(param_value.value, (datetime, date, time)):
-                value_str = f"'{param_value.value.isoformat()}'"
-            else:
-                value_str = str(param_value.value)
-            
-            evaluated_query = evaluated_query.replace(placeholder, value_str)
-
-        df = await asyncio.wait_for(
-            fut=asyncio.to_thread(sql_dependency.get_dataframe_from_query, evaluated_query),
-            timeout=timeout
-        )
-
-        return PandasDataFrame.from_dataframe(df)
+        return statement, parameters
+    
+    async def evaluate_dataframe(self, timeout: int = 180, priority: SQLQueryPriority = SQLQueryPriority.INTERACTIVE, use_cache: bool = True, max_cache_age: float | None = None) -> DataFrame:
+        
+        sql_dependency = await SQLBaseDependencyModel.get_cached(self.sql_dependency_id)
+        
+        statement, parameters = self.get_statement()
+        
+        return await sql_dependency.get_dataframe_from_query_async(statement, parameters=parameters, timeout=timeout, use_cache=use_cache, max_cache_age=max_cache_age, priority=priority)
+    
+    async def evaluate(self, timeout: int = 180, priority: SQLQueryPriority = SQLQueryPriority.INTERACTIVE, format: DataFrameFormat = "split", use_cache: bool = True, max_cache_age: float | None = None) -> PandasDataFrame:
+        
+        df = await self.evaluate_dataframe(timeout=timeout, priority=priority, use_cache=use_cache, max_cache_age=max_cache_age)
+        
+        return PandasDataFrame.from_dataframe(df, format=format)
 
 
 class DashboardEvaluationRequest(BaseModel):
     dashboard_evaluation_sql_query: DashboardEvaluationSQLQuery
     figure_configs: List[BoxChartConfig | ScatterChartConfig | PieChartConfig | LineChartConfig | HistogramChartConfig | BarChartConfig]
+    data_frame_format: DataFrameFormat = "split"
     
-    async def evaluate(self) -> DashboardEvaluationResponse:
-
+    async def evaluate(self, use_cache: bool = True, max_cache_age: float | None = None) -> DashboardEvaluationResponse:
+        
         if not self.figure_configs:
             raise ValueError("Figure configuration is not set")
         
-        df = await self.dashboard_evaluation_sql_query.evaluate()
+        df = await self.dashboard_evaluation_sql_query.evaluate_dataframe(use_cache=use_cache, max_cache_age=max_cache_age)
+        
+        data_frame = PandasDataFrame.from_dataframe(df, format=self.data_frame_format)
         
-        figures = [fig.get_figure(dataframe=df.to_dataframe()) for fig in self.figure_configs]
+        figures, figure_errors = await render_figures_async(self.figure_configs, data_frame)
         
         return DashboardEvaluationResponse(
             dashboard_evaluation_request=self,
-            data_frame=df,
-            figures=figures
+            data_frame=data_frame,
+            figures=figures,
+            figure_errors=figure_errors
         )
+    
+    async def evaluate_stream(self, use_cache: bool = True, max_cache_age: float | None = None) -> AsyncIterator[DashboardEvaluationEvent]:
+        """
+        Runs the query and yields its schema first, then every figure as soon as it is rendered,
+        then the data frame itself. The request and the data frame are not repeated with every figure.
+        """
+        
+        if not self.figure_configs:
+            raise ValueError("Figure configuration is not set")
+        
+        df = await self.dashboard_evaluation_sql_query.evaluate_dataframe(use_cache=use_cache, max_cache_age=max_cache_age)
+        
+        data_frame = PandasDataFrame.from_dataframe(df, format=self.data_frame_format)
+        
+        yield DashboardEvaluationSchemaEvent(
+            columns=[
+                DashboardEvaluationColumn(name=str(column), dtype=str(dtype))
+                for column, dtype in df.dtypes.items()
+            ],
+            row_count=len(df),
+            truncated=df.attrs.get("truncated", False),
+            figure_count=len(self.figure_configs)
+        )
+        
+        async for idx, result in iter_rendered_figures_async(self.figure_configs, data_frame):
+            
+            if isinstance(result, DashboardFigureError):
+                yield DashboardEvaluationFigureErrorEvent(index=idx, message=result.message)
+            
+            else:
+                yield DashboardEvaluationFigureEvent(index=idx, figure=result)
+        
+        yield DashboardEvaluationDataFrameEvent(data_frame=data_frame)
+        yield DashboardEvaluationDoneEvent()
 
 class DashboardEvaluationResponse(BaseModel):
     dashboard_evaluation_request: DashboardEvaluationRequest
     data_frame: PandasDataFrame
-    figures: List[PlotlyFigure]
\ No newline at end of file
+    # In the order of the figure configs, None for a figure listed in figure_errors
+    figures: List[PlotlyFigure | None]
+    figure_errors: List[DashboardFigureError] = []
+
+
+class DashboardEvaluationColumn(BaseModel):
+    name: str
+    dtype: str
+
+
+class DashboardEvaluationSchemaEvent(BaseModel):
+    type: Literal["schema"] = "schema"
+    columns: List[DashboardEvaluationColumn]
+    row_count: int
+    truncated: bool = False
+    figure_count: int
+
+
+class DashboardEvaluationFigureEvent(BaseModel):
+    type: Literal["figure"] = "figure"
+    index: int
+    figure: PlotlyFigure
+
+
+class DashboardEvaluationFigureErrorEvent(BaseModel):
+    type: Literal["figure_error"] = "figure_error"
+    index: int
+    message: str
+
+
+class DashboardEvaluationDataFrameEvent(BaseModel):
+    type: Literal["data_frame"] = "data_frame"
+    data_frame: PandasDataFrame
+
+
+class DashboardEvaluationDoneEvent(BaseModel):
+    type: Literal["done"] = "done"
+
+
+class DashboardEvaluationErrorEvent(BaseModel):
+    type: Literal["error"] = "error"
+    message: str
+
+
+DashboardEvaluationEvent = (
+    DashboardEvaluationSchemaEvent
+    | DashboardEvaluationFigureEvent
+    | DashboardEvaluationFigureErrorEvent
+    | DashboardEvaluationDataFrameEvent
+    | DashboardEvaluationDoneEvent
+    | DashboardEvaluationErrorEvent
+)
@@ -0,0 +1,15 @@
+from typing import Generic, TypeVar
+
+from pydantic import BaseModel
+
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    """
+    A page of a listing. Pass `next_cursor` as `cursor` to get the next page, it is None on the last page.
+    """
+    
+    items: list[T]
+    next_cursor: str | None = None
@@ -4,6 +4,7 @@ from pydantic import BaseModel, computed_field
 
 from cryptography.fernet import Fernet
 
+from deps.sql_reflection import SQLReflectionFilter
 from settings import settings
 
 SQLDependencyType = Literal["sqlite", "postgres", "mysql", "mssql"]
@@ -17,9 +18,24 @@ class SQLBaseDependencyCreateRequest(BaseModel):
     database: str
     username: str
     password: str
+    reflection_filter: SQLReflectionFilter | None = None
     
     @computed_field
     @property
     def encrypted_password(self) -> str:
         return Fernet(settings.DB_PASSWORD_KEY).encrypt(self.password.encode()).decode()
-    
\ No newline at end of file
+    
+
+
+class SQLDependencySummary(BaseModel):
+    """
+    List view of a SQL dependency without its tables.
+    """
+    
+    pk: str
+    name: str
+    type: SQLDependencyType | None = None
+    host: str | None = None
+    database: str | None = None
+    table_count: int | None = None
+    schema_version: int | None = None
@@ -13,6 +13,45 @@ class DashboardAgentSettings(BaseSettings):
     CORS_ORIGINS: list[str] = ["http://localhost:3000"]
 
     DB_PASSWORD_KEY: str
+
+    SQL_POOL_SIZE: int = 5
+    SQL_MAX_OVERFLOW: int = 10
+    SQL_POOL_TIMEOUT: int = 30
+    SQL_POOL_RECYCLE: int = 1800
+    SQL_POOL_PRE_PING: bool = True
+
+    SQL_EXECUTOR_MAX_WORKERS: int = 8
+    LEGACY_AGENT_SQL_EXECUTOR_MAX_WORKERS: int = 4
+    SQL_REFLECTION_MAX_WORKERS: int = 4
+    SQL_REFLECTION_BATCH_SIZE: int = 50
+    SQL_REFLECTION_JOB_STALE_AFTER: int = 300
+    SQL_REFLECTION_HEARTBEAT_INTERVAL: int = 30
+    SQL_STATEMENT_TIMEOUT: int = 180
+
+    SQL_FETCH_CHUNK_SIZE: int = 10_000
+    SQL_MAX_RESULT_ROWS: int | None = 1_000_000
+    SQL_MAX_RESULT_BYTES: int | None = 512 * 1024 * 1024
+
+    SQL_QUERY_CACHE_ENABLED: bool = True
+    SQL_QUERY_CACHE_TTL: int = 300
+    SQL_QUERY_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    SQL_QUERY_CACHE_REDIS: bool = False
+
+    SQL_MAX_IN_FLIGHT_QUERIES: int = 4
+    SQL_MAX_QUEUED_QUERIES: int = 64
+    SQL_ADMISSION_TIMEOUT: int = 60
+
+    SQL_COMPACT_PROMPTS: bool = False
+    SQL_PROMPT_CACHE_MAX_ENTRIES: int = 256
+    SQL_SCHEMA_SUBSET_TOP_K: int = 20
+
+    SQL_DEPENDENCY_CACHE_ENABLED: bool = True
+    SQL_DEPENDENCY_CACHE_TTL: int = 300
+    SQL_DEPENDENCY_CACHE_MAX_ENTRIES: int = 64
+
+    FIGURE_RENDER_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    FIGURE_RENDER_MAX_WORKERS: int = 4
+    FIGURE_RENDER_TIMEOUT: int = 30
     
     model_config = SettingsConfigDict(
         env_file='.env',
@@ -16,7 +16,7 @@ class DashboardSQLQueryState(DashboardSQLQueryResult):
     sql_dependency_id: str
     
     async def get_sql_dependency(self) -> SQLBaseDependencyModel:
-        return await SQLBaseDependencyModel.get(self.sql_dependency_id)
+        return await SQLBaseDependencyModel.get_cached(self.sql_dependency_id)
 
 
 class DashboardConfigState(BaseModel):
@@ -1,21 +1,64 @@
 from __future__ import annotations
-from typing import List
 
-from pydantic import BaseModel, computed_field
+import json
+
+from typing import Any, List
+
+from pydantic import BaseModel, PrivateAttr, computed_field
+
+from ag_ui.core import BaseEvent, EventType, StateDeltaEvent, StateSnapshotEvent
 
 from aredis_om import NotFoundError
 
+from deps.sql_admission import SQLQueryPriority
 from models.sql_dependency_model import SQLBaseDependencyModel
 from states.dashboard_config_state import DashboardConfigState
-from results.tool_results import PandasDataFrame, PlotlyFigure
+from results.plotly_figure_cache import render_figures
+from results.tool_results import JSONDataFrameFormat, PandasDataFrame, PlotlyFigure
 from schemas.dashboard_evaluation import DashboardSQLQueryParameterValue, DashboardEvaluationSQLQuery
+from states.json_patch import get_json_patch
 
 class DashboardState(BaseModel):
     dashboard_config: DashboardConfigState = DashboardConfigState()
     default_dataframe: PandasDataFrame | None = None
     default_figures: List[PlotlyFigure] = []
     selected_sql_dependency_id: str | None = None
-
+    # Format of default_dataframe in state snapshots, chosen by the frontend
+    default_dataframe_format: JSONDataFrameFormat = "split"
+    
+    # State last sent to the frontend during the current run, the base of the next delta
+    _emitted_state: dict[str, Any] | None = PrivateAttr(default=None)
+    
+    def get_state_events(self) -> List[BaseEvent]:
+        """
+        Returns the events bringing the frontend up to date: a full snapshot on the first call of a run,
+        then JSON Patch deltas against the state sent last, or no event at all if nothing changed.
+        A delta which would not be smaller than the state itself, e.g. after a new dataframe replaced most of it,
+        is sent as a snapshot instead, which also brings a frontend that missed a delta back in sync.
+        """
+        
+        state = self.model_dump(mode="json")
+        
+        if self._emitted_state is None:
+            events: List[BaseEvent] = [StateSnapshotEvent(type=EventType.STATE_SNAPSHOT, snapshot=state)]
+        
+        else:
+            
+            delta = get_json_patch(self._emitted_state, state)
+            
+            if not delta:
+                events = []
+            
+            elif len(json.dumps(delta)) >= len(json.dumps(state)):
+                events = [StateSnapshotEvent(type=EventType.STATE_SNAPSHOT, snapshot=state)]
+            
+            else:
+                events = [StateDeltaEvent(type=EventType.STATE_DELTA, delta=delta)]
+        
+        self._emitted_state = state
+        
+        return events
+    
     async def evaluate_default_dataframe(self) -> None:
         if self.dashboard_config is None:
             raise ValueError("Dashboard configuration is not set")
@@ -35,26 +78,27 @@ class DashboardState(BaseModel):
             ]
         )
         
-        default_dataframe = await dashboard_evaluation_sql_query.evaluate()
+        default_dataframe = await dashboard_evaluation_sql_query.evaluate(priority=SQLQueryPriority.AGENT, format=self.default_dataframe_format)
         self.default_dataframe = default_dataframe
-        
-        
+    
+    
     def evaluate_default_figures(self) -> None:
         if self.default_dataframe is None:
             raise ValueError("Default dataframe is not set")
-
+        
         if not self.dashboard_config.figure_configs:
             raise ValueError("Figure configuration is not set")
-
-        self.default_figures = [fig.get_figure(dataframe=self.default_dataframe.to_dataframe()) for fig in self.dashboard_config.figure_configs]
-
+        
+        # Only figures whose config was added or edited since their last render are rendered again
+        self.default_figures = render_figures(self.dashboard_config.figure_configs, self.default_dataframe)
+    
     async def get_sql_dependency(self) -> SQLBaseDependencyModel:
-
+        
         if self.selected_sql_dependency_id is None:
             raise ValueError("No SQL dependency selected")
         
         try:
-            return await SQLBaseDependencyModel.get(self.selected_sql_dependency_id)
+            return await SQLBaseDependencyModel.get_cached(self.selected_sql_dependency_id)
         
         except NotFoundError:
             raise ValueError(f"SQL dependency with pk {self.selected_sql_dependency_id} not found")
\ No newline at end of file
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from typing import Any
+
+
+def escape_pointer_token(token: str | int) -> str:
+    """
+    Escapes a key for use in a JSON Pointer (RFC 6901).
+    """
+    
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def get_json_patch(old: Any, new: Any, path: str = "") -> list[dict[str, Any]]:
+    """
+    Returns the JSON Patch (RFC 6902) operations turning old into new, both JSON compatible values.
+    Objects are diffed key by key and lists of equal length item by item. Lists that grew are extended
+    with add operations if their previous items are unchanged, any other list is replaced as a whole.
+    """
+    
+    if old == new:
+        return []
+    
+    if isinstance(old, dict) and isinstance(new, dict):
+        
+        operations: list[dict[str, Any]] = []
+        
+        for key in old:
+            
+            if key not in new:
+                operations.append({"op": "remove", "path": f"{path}/{escape_pointer_token(key)}"})
+        
+        for key, value in new.items():
+            
+            if key not in old:
+                operations.append({"op": "add", "path": f"{path}/{escape_pointer_token(key)}", "value": value})
+            
+            else:
+                operations += get_json_patch(old[key], value, f"{path}/{escape_pointer_token(key)}")
+        
+        return operations
+    
+    if isinstance(old, list) and isinstance(new, list):
+        
+        if len(old) == len(new):
+            
+            operations = []
+            
+            for idx, (old_item, new_item) in enumerate(zip(old, new)):
+                operations += get_json_patch(old_item, new_item, f"{path}/{idx}")
+            
+            return operations
+        
+        if len(old) < len(new) and new[:len(old)] == old:
+            return [{"op": "add", "path": f"{path}/-", "value": item} for item in new[len(old):]]
+    
+    return [{"op": "replace", "path": path, "value": new}]
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import sqlite3
+import sys
+
+from pathlib import Path
+from typing import Any, Callable, Coroutine
+
+from cryptography.fernet import Fernet
+
+import pytest
+
+
+# Modules of the backend import each other from the backend directory, like the app does when it is started there
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("DB_PASSWORD_KEY", Fernet.generate_key().decode())
+
+# Tests never configure logfire, which the app does on startup
+os.environ.setdefault("LOGFIRE_IGNORE_NO_CONFIG", "1")
+
+
+from deps.sql_dependency import SQLBaseDependency, SQLConnectionParams, SQLType
+from deps.sql_engine_registry import sql_engine_registry
+from settings import settings
+
+
+SQLITE_DATABASE_SCRIPT = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, password TEXT);
+CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (id), total REAL);
+INSERT INTO users VALUES (1, 'Ada', 'secret'), (2, 'Grace', 'hidden');
+INSERT INTO orders VALUES (1, 1, 9.5), (2, 2, 3.0);
+"""
+
+
+def execute_script(path: Path, script: str) -> None:
+    
+    connection = sqlite3.connect(path)
+    connection.executescript(script)
+    connection.commit()
+    connection.close()
+
+
+@pytest.fixture
+def sqlite_path(tmp_path: Path) -> Path:
+    return tmp_path / "database.sqlite"
+
+
+@pytest.fixture
+def sqlite_connection_params(sqlite_path: Path) -> SQLConnectionParams:
+    return SQLConnectionParams(
+        type=SQLType.SQLITE,
+        host="",
+        port=0,
+        username="",
+        encrypted_password=Fernet(settings.DB_PASSWORD_KEY).encrypt(b""),
+        database=str(sqlite_path)
+    )
+
+
+@pytest.fixture
+def sql_dependency(sqlite_path: Path, sqlite_connection_params: SQLConnectionParams, monkeypatch: pytest.MonkeyPatch):
+    """
+    Dependency on a SQLite database with users and their orders, whose `password` column is excluded.
+    Query results are not cached, so every query reaches the database.
+    """
+    
+    monkeypatch.setattr(settings, "SQL_QUERY_CACHE_ENABLED", False)
+    
+    execute_script(sqlite_path, SQLITE_DATABASE_SCRIPT)
+    
+    # Engines are registered under the name of their dependency
+    sql_dependency = SQLBaseDependency(name=str(sqlite_path), connection_params=sqlite_connection_params, column_names_to_exclude=["password"])
+    sql_dependency.set_tables_from_metadata(sql_dependency.get_metadata())
+    
+    yield sql_dependency
+    
+    sql_dependency.dispose_engine()
+
+
+@pytest.fixture
+def run() -> Callable[[Coroutine[Any, Any, Any]], Any]:
+    """
+    Runs a coroutine on a new event loop and closes the async connections it opened,
+    as their aiosqlite threads would otherwise keep the interpreter alive.
+    """
+    
+    async def run_and_dispose(coroutine: Coroutine[Any, Any, Any]) -> Any:
+        
+        try:
+            return await coroutine
+        
+        finally:
+            await sql_engine_registry.dispose_all()
+    
+    return lambda coroutine: asyncio.run(run_and_dispose(coroutine))
@@ -0,0 +1,214 @@
+import asyncio
+import json
+
+from typing import Any
+
+import pytest
+
+from fastapi import HTTPException
+from pandas import DataFrame
+
+from api import dashboard_config as dashboard_config_api
+from deps.sql_admission import SQLAdmissionQueueFullError
+from models.dashboard_config_models import DashboardConfigModel, DashboardSQLQueryModel
+from results.dashboard_config_results import DashboardSQLQueryParameter
+from results.plotly_chart_config_results import BarChartConfig
+from results.plotly_figure_renderer import shutdown_figure_render_pool
+from schemas.dashboard_evaluation import DashboardEvaluationRequest, DashboardEvaluationSQLQuery
+
+
+class FakeJSONPipeline:
+    """
+    Answers the JSON.GET and JSON.ARRLEN commands of a pipeline from documents in memory,
+    for JSONPaths of plain object keys.
+    """
+    
+    def __init__(self, documents: dict[str, Any]) -> None:
+        self.documents = documents
+        self.commands: list[tuple] = []
+    
+    def pipeline(self, transaction: bool = True):
+        return self
+    
+    def json(self):
+        return self
+    
+    def get(self, key: str, *paths: str) -> None:
+        self.commands.append(("get", key, paths))
+    
+    def arrlen(self, key: str, path: str) -> None:
+        self.commands.append(("arrlen", key, path))
+    
+    def resolve(self, document: Any, path: str) -> list[Any]:
+        
+        for name in path.removeprefix("$.").split("."):
+            
+            if not isinstance(document, dict) or name not in document:
+                return []
+            
+            document = document[name]
+        
+        return [document]
+    
+    async def execute(self, raise_on_error: bool = True) -> list[Any]:
+        
+        results = []
+        
+        for command, key, paths in self.commands:
+            
+            document = self.documents.get(key)
+            
+            if command == "get":
+                
+                if document is None:
+                    results.append(None)
+                
+                else:
+                    results.append({path: self.resolve(document, path) for path in paths})
+            
+            elif document is None:
+                results.append(Exception("no such key"))
+            
+            else:
+                results.append([len(match) if isinstance(match, list) else None for match in self.resolve(document, paths)])
+        
+        return results
+
+
+def test_dashboards_are_listed_as_summaries(monkeypatch: pytest.MonkeyPatch):
+    
+    dashboard_configs = [
+        DashboardConfigModel(
+            pk="orders",
+            dashboard_sql_query=DashboardSQLQueryModel(
+                sql_dependency_id="shop",
+                parametrized_query="SELECT * FROM orders WHERE user_id = {user_id}",
+                dashboard_sql_query_parameters=[DashboardSQLQueryParameter(name="user_id", type="int", default_value=1)]
+            ),
+            chart_config=BarChartConfig(x="id", y="total", title="Orders")
+        ),
+        DashboardConfigModel(pk="empty")
+    ]
+    
+    fake_redis = FakeJSONPipeline({
+        DashboardConfigModel.make_primary_key(dashboard_config.pk): json.loads(dashboard_config.model_dump_json())
+        for dashboard_config in dashboard_configs
+    })
+    
+    async def scan_pks(model, cursor=0, limit=None):
+        return ["orders", "empty", "deleted"], None
+    
+    monkeypatch.setattr(DashboardConfigModel, "db", lambda: fake_redis)
+    monkeypatch.setattr(dashboard_config_api, "scan_pks", scan_pks)
+    
+    page = asyncio.run(dashboard_config_api.get_dashboards(cursor=None, limit=None))
+    
+    assert [summary.model_dump() for summary in page.items] == [
+        {
+            "pk": "orders",
+            "sql_dependency_id": "shop",
+            "parametrized_query": "SELECT * FROM orders WHERE user_id = {user_id}",
+            "parameter_count": 1,
+            "title": "Orders"
+        },
+        {
+            "pk": "empty",
+            "sql_dependency_id": None,
+            "parametrized_query": None,
+            "parameter_count": None,
+            "title": None
+        }
+    ]
+    assert page.next_cursor is None
+    
+    # Chart configs are never read
+    assert not any("$.chart_config" in paths for command, _, paths in fake_redis.commands if command == "get")
+
+
+@pytest.fixture
+def dashboard_evaluation_request(monkeypatch: pytest.MonkeyPatch):
+    """
+    Request for a bar chart of order totals and a chart of a column the result does not have.
+    The query result is served from memory, the figures are rendered on the process pool.
+    """
+    
+    async def evaluate_dataframe(self, **kwargs):
+        return DataFrame({"id": [1, 2], "total": [9.5, 3.0]})
+    
+    monkeypatch.setattr(DashboardEvaluationSQLQuery, "evaluate_dataframe", evaluate_dataframe)
+    
+    yield DashboardEvaluationRequest(
+        dashboard_evaluation_sql_query=DashboardEvaluationSQLQuery(
+            sql_dependency_id="shop",
+            parametrized_query="SELECT id, total FROM orders",
+            dashboard_sql_query_parameter_values=[]
+        ),
+        figure_configs=[BarChartConfig(x="id", y="total"), BarChartConfig(x="id", y="missing")],
+        data_frame_format="columnar"
+    )
+    
+    shutdown_figure_render_pool()
+
+
+def read_events(dashboard_evaluation_request: DashboardEvaluationRequest) -> list[dict[str, Any]]:
+    
+    async def stream():
+        
+        response = await dashboard_config_api.stream_dashboard_config_evaluation_from_state(dashboard_evaluation_request, use_cache=True, max_age=None)
+        
+        return response.media_type, [json.loads(line) async for line in response.body_iterator]
+    
+    media_type, events = asyncio.run(stream())
+    
+    assert media_type == "application/x-ndjson"
+    
+    return events
+
+
+def test_evaluation_streams_the_schema_then_figures_then_the_data_frame(dashboard_evaluation_request: DashboardEvaluationRequest):
+    
+    events = read_events(dashboard_evaluation_request)
+    
+    assert events[0] == {
+        "type": "schema",
+        "columns": [{"name": "id", "dtype": "int64"}, {"name": "total", "dtype": "float64"}],
+        "row_count": 2,
+        "truncated": False,
+        "figure_count": 2
+    }
+    
+    figure_events = sorted(events[1:3], key=lambda event: event["index"])
+    
+    assert [event["type"] for event in figure_events] == ["figure", "figure_error"]
+    assert figure_events[0]["figure"]["data"][0]["type"] == "bar"
+    
+    assert events[3]["type"] == "data_frame"
+    assert events[3]["data_frame"]["column_data"] == [[1, 2], [9.5, 3.0]]
+    assert events[4] == {"type": "done"}
+
+
+def test_failures_after_the_schema_end_the_stream_with_an_error_event(dashboard_evaluation_request: DashboardEvaluationRequest, monkeypatch: pytest.MonkeyPatch):
+    
+    async def iter_rendered_figures_async(figure_configs, dataframe, timeout=None):
+        raise RuntimeError("render pool unavailable")
+        yield
+    
+    monkeypatch.setattr("schemas.dashboard_evaluation.iter_rendered_figures_async", iter_rendered_figures_async)
+    
+    events = read_events(dashboard_evaluation_request)
+    
+    assert [event["type"] for event in events] == ["schema", "error"]
+    assert events[1]["message"] == "render pool unavailable"
+
+
+def test_rejected_queries_fail_before_the_stream_starts(dashboard_evaluation_request: DashboardEvaluationRequest, monkeypatch: pytest.MonkeyPatch):
+    
+    async def evaluate_dataframe(self, **kwargs):
+        raise SQLAdmissionQueueFullError("Too many queries waiting for SQL dependency shop")
+    
+    monkeypatch.setattr(DashboardEvaluationSQLQuery, "evaluate_dataframe", evaluate_dataframe)
+    
+    with pytest.raises(HTTPException) as exc_info:
+        read_events(dashboard_evaluation_request)
+    
+    assert exc_info.value.status_code == 503
@@ -0,0 +1,44 @@
+from pandas import DataFrame
+
+from ag_ui.core import EventType
+
+from results.tool_results import PandasDataFrame
+from states.dashboard_state import DashboardState
+
+
+def test_first_event_of_a_run_is_a_snapshot():
+    
+    state = DashboardState()
+    
+    events = state.get_state_events()
+    
+    assert [event.type for event in events] == [EventType.STATE_SNAPSHOT]
+    assert events[0].snapshot == state.model_dump(mode="json")
+
+
+def test_small_changes_are_sent_as_deltas():
+    
+    state = DashboardState(default_dataframe=PandasDataFrame.from_dataframe(DataFrame({"id": range(100)})))
+    state.get_state_events()
+    
+    assert state.get_state_events() == []
+    
+    state.selected_sql_dependency_id = "dependency"
+    events = state.get_state_events()
+    
+    assert [event.type for event in events] == [EventType.STATE_DELTA]
+    assert [operation.model_dump() for operation in events[0].delta] == [
+        {"op": "replace", "path": "/selected_sql_dependency_id", "value": "dependency"}
+    ]
+
+
+def test_deltas_larger_than_the_state_are_sent_as_snapshots():
+    
+    state = DashboardState(default_dataframe=PandasDataFrame.from_dataframe(DataFrame({"id": range(100)})))
+    state.get_state_events()
+    
+    state.default_dataframe = PandasDataFrame.from_dataframe(DataFrame({"value": range(100, 200)}))
+    events = state.get_state_events()
+    
+    assert [event.type for event in events] == [EventType.STATE_SNAPSHOT]
+    assert events[0].snapshot["default_dataframe"] == state.default_dataframe.model_dump(mode="json")
@@ -0,0 +1,37 @@
+from states.json_patch import escape_pointer_token, get_json_patch
+
+
+def test_escape_pointer_token():
+    assert escape_pointer_token("a/b~c") == "a~1b~0c"
+    assert escape_pointer_token(3) == "3"
+
+
+def test_equal_values_have_no_operations():
+    assert get_json_patch({"a": [1, {"b": 2}]}, {"a": [1, {"b": 2}]}) == []
+
+
+def test_objects_are_diffed_key_by_key():
+    old = {"kept": 1, "changed": {"value": 1}, "removed": True}
+    new = {"kept": 1, "changed": {"value": 2}, "added/key": "x"}
+    
+    assert get_json_patch(old, new) == [
+        {"op": "remove", "path": "/removed"},
+        {"op": "replace", "path": "/changed/value", "value": 2},
+        {"op": "add", "path": "/added~1key", "value": "x"},
+    ]
+
+
+def test_grown_lists_are_extended():
+    assert get_json_patch({"items": [1, 2]}, {"items": [1, 2, 3, 4]}) == [
+        {"op": "add", "path": "/items/-", "value": 3},
+        {"op": "add", "path": "/items/-", "value": 4},
+    ]
+
+
+def test_changed_lists_are_replaced():
+    assert get_json_patch({"items": [1, 2]}, {"items": [2]}) == [{"op": "replace", "path": "/items", "value": [2]}]
+    assert get_json_patch({"items": [1, 2]}, {"items": [0, 2, 3]}) == [{"op": "replace", "path": "/items", "value": [0, 2, 3]}]
+    
+    
+def test_root_is_replaced_for_different_types():
+    assert get_json_patch([1], {"a": 1}) == [{"op": "replace", "path": "", "value": {"a": 1}}]
@@ -0,0 +1,59 @@
+from results.plotly_chart_config_results import BarChartConfig
+from results.plotly_figure_cache import PlotlyFigureCache
+from results.tool_results import PlotlyFigure
+
+
+def get_figure(size: int) -> PlotlyFigure:
+    return PlotlyFigure(data=[{"type": "bar", "y": list(range(size))}])
+
+
+def test_cache_is_bounded_by_the_size_of_its_figures():
+    
+    small_figure = get_figure(10)
+    large_figure = get_figure(1000)
+    
+    cache = PlotlyFigureCache(max_bytes=len(large_figure.model_dump_json()) + len(small_figure.model_dump_json()))
+    
+    cache.set(BarChartConfig(title="first"), "fingerprint", small_figure)
+    cache.set(BarChartConfig(title="second"), "fingerprint", small_figure)
+    
+    # Used last, so the second figure is evicted first
+    assert cache.get(BarChartConfig(title="first"), "fingerprint") is not None
+    
+    cache.set(BarChartConfig(title="third"), "fingerprint", large_figure)
+    
+    assert cache.get(BarChartConfig(title="first"), "fingerprint") is not None
+    assert cache.get(BarChartConfig(title="second"), "fingerprint") is None
+    assert cache.get(BarChartConfig(title="third"), "fingerprint") == large_figure
+
+
+def test_figures_larger_than_the_cache_are_not_cached():
+    
+    cache = PlotlyFigureCache(max_bytes=100)
+    
+    cache.set(BarChartConfig(title="small"), "fingerprint", get_figure(1))
+    cache.set(BarChartConfig(title="large"), "fingerprint", get_figure(1000))
+    
+    assert cache.get(BarChartConfig(title="small"), "fingerprint") is not None
+    assert cache.get(BarChartConfig(title="large"), "fingerprint") is None
+
+
+def test_replaced_figures_are_not_counted_twice():
+    
+    figure = get_figure(100)
+    cache = PlotlyFigureCache(max_bytes=len(figure.model_dump_json()))
+    
+    for _ in range(3):
+        cache.set(BarChartConfig(), "fingerprint", figure)
+    
+    assert cache.get(BarChartConfig(), "fingerprint") == figure
+
+
+def test_cached_figures_are_copies():
+    
+    cache = PlotlyFigureCache(max_bytes=1024 * 1024)
+    cache.set(BarChartConfig(), "fingerprint", get_figure(3))
+    
+    cache.get(BarChartConfig(), "fingerprint").layout = {"title": "changed"}
+    
+    assert cache.get(BarChartConfig(), "fingerprint").layout is None
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+from results import plotly_figure_renderer
+from results.plotly_figure_renderer import _discard_figure_render_pool, get_figure_render_pool, shutdown_figure_render_pool
+from settings import settings
+
+
+@pytest.fixture
+def figure_render_pool(monkeypatch: pytest.MonkeyPatch):
+    
+    monkeypatch.setattr(settings, "FIGURE_RENDER_MAX_WORKERS", 1)
+    monkeypatch.setattr(settings, "FIGURE_RENDER_TIMEOUT", 0)
+    
+    yield get_figure_render_pool()
+    
+    shutdown_figure_render_pool()
+
+
+def test_discarded_pool_terminates_its_stuck_worker(figure_render_pool):
+    
+    # Stands in for a render which never finishes
+    figure_render_pool.submit(time.sleep, 60)
+    
+    deadline = time.monotonic() + 30
+    
+    while not figure_render_pool._processes and time.monotonic() < deadline:
+        time.sleep(0.05)
+    
+    (worker,) = figure_render_pool._processes.values()
+    
+    _discard_figure_render_pool(figure_render_pool)
+    
+    worker.join(timeout=10)
+    
+    assert not worker.is_alive()
+
+
+def test_discarded_pool_is_replaced_by_a_prewarmed_pool(figure_render_pool):
+    
+    _discard_figure_render_pool(figure_render_pool)
+    
+    replacement_pool = plotly_figure_renderer._figure_render_pool
+    
+    assert replacement_pool is not None
+    assert replacement_pool is not figure_render_pool
+    
+    # Prewarming started the worker before any render was submitted
+    assert len(replacement_pool._processes) == 1
+    
+    # A pool which was already replaced is not replaced again
+    _discard_figure_render_pool(figure_render_pool)
+    
+    assert plotly_figure_renderer._figure_render_pool is replacement_pool
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from deps.sql_admission import SQLAdmissionController, SQLAdmissionQueueFullError, SQLAdmissionTimeoutError, SQLQueryPriority
+
+
+def get_controller(max_in_flight: int = 1, max_queue: int = 8, timeout: float = 5) -> SQLAdmissionController:
+    return SQLAdmissionController(key="dependency", max_in_flight=max_in_flight, max_queue=max_queue, timeout=timeout)
+
+
+def test_interactive_queries_are_admitted_first_and_in_arrival_order():
+    
+    async def admit_queued():
+        
+        controller = get_controller()
+        admitted = []
+        
+        async def run_query(name: str, priority: SQLQueryPriority):
+            
+            async with controller.admit(priority=priority):
+                admitted.append(name)
+                await asyncio.sleep(0)
+        
+        await controller.acquire()
+        
+        tasks = [
+            asyncio.ensure_future(run_query("first agent", SQLQueryPriority.AGENT)),
+            asyncio.ensure_future(run_query("second agent", SQLQueryPriority.AGENT)),
+            asyncio.ensure_future(run_query("interactive", SQLQueryPriority.INTERACTIVE))
+        ]
+        
+        # Lets every query join the queue
+        await asyncio.sleep(0)
+        
+        assert controller.queue_depth == 3
+        
+        controller.release()
+        await asyncio.gather(*tasks)
+        
+        return admitted, controller.get_metrics()
+    
+    admitted, metrics = asyncio.run(admit_queued())
+    
+    assert admitted == ["interactive", "first agent", "second agent"]
+    assert metrics.in_flight == 0
+    assert metrics.admitted == 4
+
+
+def test_queries_beyond_the_queue_bound_are_rejected():
+    
+    async def admit_queued():
+        
+        controller = get_controller(max_queue=1)
+        
+        await controller.acquire()
+        waiter = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        
+        with pytest.raises(SQLAdmissionQueueFullError):
+            await controller.acquire()
+        
+        controller.release()
+        await waiter
+        
+        return controller.get_metrics()
+    
+    metrics = asyncio.run(admit_queued())
+    
+    assert metrics.rejected == 1
+    assert metrics.in_flight == 1
+
+
+def test_timed_out_and_cancelled_waiters_give_up_their_place():
+    
+    async def admit_queued():
+        
+        controller = get_controller()
+        
+        await controller.acquire()
+        
+        with pytest.raises(SQLAdmissionTimeoutError):
+            await controller.acquire(timeout=0.05)
+        
+        cancelled_waiter = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        cancelled_waiter.cancel()
+        
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled_waiter
+        
+        assert controller.queue_depth == 0
+        
+        # The slot is free again rather than handed to a waiter which gave up
+        controller.release()
+        
+        await asyncio.wait_for(controller.acquire(), timeout=1)
+        
+        return controller.get_metrics()
+    
+    metrics = asyncio.run(admit_queued())
+    
+    assert metrics.timed_out == 1
+    assert metrics.in_flight == 1
@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+from pathlib import Path
+
+import pytest
+
+from sqlalchemy import create_engine, event
+
+from deps import sql_cancellation
+from deps.sql_cancellation import SQLQueryHandle, prepare_connection, register_connection_events
+from deps.sql_dependency import SQLBaseDependency, SQLConnectionParams
+
+
+# Counts without end, so only a timeout or a cancellation stops it
+ENDLESS_QUERY = "WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM numbers) SELECT COUNT(*) FROM numbers"
+
+
+def test_async_query_timeout_interrupts_the_statement(sql_dependency: SQLBaseDependency, run):
+    
+    pytest.importorskip("aiosqlite")
+    
+    async def run_query():
+        
+        started_at = time.monotonic()
+        
+        with pytest.raises(asyncio.TimeoutError):
+            await sql_dependency.get_dataframe_from_query_async(ENDLESS_QUERY, timeout=0.5)
+        
+        # The pooled connection is usable again once the interrupted statement returned
+        df = await sql_dependency.get_dataframe_from_query_async("SELECT COUNT(*) AS count FROM users", timeout=5)
+        
+        return time.monotonic() - started_at, df
+    
+    elapsed, df = run(run_query())
+    
+    assert df["count"].tolist() == [2]
+    assert elapsed < 5
+
+
+def test_cancelled_async_query_interrupts_the_statement(sql_dependency: SQLBaseDependency, run):
+    
+    pytest.importorskip("aiosqlite")
+    
+    async def run_query():
+        
+        started_at = time.monotonic()
+        
+        task = asyncio.ensure_future(sql_dependency.get_dataframe_from_query_async(ENDLESS_QUERY, timeout=30))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        
+        return time.monotonic() - started_at
+    
+    assert run(run_query()) < 5
+
+
+def test_sync_fallback_query_timeout_interrupts_the_statement(sql_dependency: SQLBaseDependency, run, monkeypatch: pytest.MonkeyPatch):
+    
+    # Without an async driver, queries run on the SQL executor and are cancelled through the sync connection
+    monkeypatch.setattr(SQLConnectionParams, "get_async_url", lambda self: None)
+    
+    async def run_query():
+        
+        started_at = time.monotonic()
+        
+        with pytest.raises(asyncio.TimeoutError):
+            await sql_dependency.get_dataframe_from_query_async(ENDLESS_QUERY, timeout=0.5, max_rows=1)
+        
+        return time.monotonic() - started_at
+    
+    assert run(run_query()) < 5
+
+
+
+@pytest.fixture
+def engine(sqlite_path: Path):
+    
+    # A single pooled connection, so every query runs on the same DBAPI connection
+    engine = create_engine(f"sqlite:///{sqlite_path}", pool_size=1, max_overflow=0)
+    
+    yield engine
+    
+    engine.dispose()
+
+
+def test_backend_id_is_read_once_per_connection(engine, monkeypatch: pytest.MonkeyPatch):
+    
+    backend_id_calls = []
+    
+    @event.listens_for(engine, "connect")
+    def create_backend_id_function(dbapi_connection, connection_record):
+        dbapi_connection.create_function("backend_id", 0, lambda: backend_id_calls.append(1) or 42)
+    
+    monkeypatch.setitem(sql_cancellation.BACKEND_ID_QUERIES, "sqlite", "SELECT backend_id()")
+    register_connection_events(engine)
+    
+    query_handles = [SQLQueryHandle(), SQLQueryHandle()]
+    
+    for query_handle in query_handles:
+        
+        with engine.connect() as connection:
+            prepare_connection(connection, query_handle=query_handle)
+    
+    assert [query_handle.backend_id for query_handle in query_handles] == [42, 42]
+    assert len(backend_id_calls) == 1
+
+
+def test_statement_timeout_is_set_only_when_it_changes(engine, monkeypatch: pytest.MonkeyPatch):
+    
+    statements = []
+    
+    @event.listens_for(engine, "before_cursor_execute")
+    def record_statement(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    # SQLite has no statement timeout, its busy timeout stands in for it
+    monkeypatch.setattr(sql_cancellation, "get_statement_timeout_query", lambda dialect_name, timeout: f"PRAGMA busy_timeout = {round(timeout * 1000)}")
+    
+    for timeout in [5, 5, 10, None, None]:
+        
+        with engine.connect() as connection:
+            prepare_connection(connection, timeout=timeout)
+    
+    assert statements == ["PRAGMA busy_timeout = 5000", "PRAGMA busy_timeout = 10000", "PRAGMA busy_timeout = 0"]
+    
+    # The setting outlives the transaction of the query
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 0
@@ -0,0 +1,250 @@
+import sqlite3
+import threading
+
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+
+from sqlalchemy import Column, ForeignKey, ForeignKeyConstraint, Integer, MetaData, String, Table
+
+from deps import sql_dependency as sql_dependency_module, sql_schema_index
+from deps.sql_dependency import SQLBaseDependency, SQLConnectionParams, SQLDatabaseTable
+
+
+def get_table(sql_dependency: SQLBaseDependency, qualified_name: str) -> SQLDatabaseTable:
+    return next(table for table in sql_dependency.tables if table.qualified_name == qualified_name)
+
+
+def get_column(table: SQLDatabaseTable, column_name: str):
+    return next(column for column in table.columns if column.name == column_name)
+
+
+def test_tables_are_built_with_joins(sql_dependency: SQLBaseDependency):
+    
+    users = get_table(sql_dependency, "users")
+    orders = get_table(sql_dependency, "orders")
+    user_id = get_column(orders, "user_id")
+    
+    assert [column.name for column in users.columns] == ["id", "name", "password"]
+    assert get_column(users, "password").exclude
+    assert user_id.join is not None and user_id.join.table_id == users.id
+    assert user_id.join.column_id == get_column(users, "id").id
+    assert sorted(summary.table_name for summary in sql_dependency.table_summaries) == ["orders", "users"]
+
+
+def test_composite_and_multiple_foreign_keys_are_resolved(sqlite_connection_params: SQLConnectionParams):
+    
+    metadata = MetaData()
+    Table("regions", metadata, Column("country", String, primary_key=True), Column("code", String, primary_key=True))
+    Table("users", metadata, Column("id", Integer, primary_key=True))
+    Table(
+        "stores",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("country", String),
+        Column("region_code", String),
+        Column("owner_id", Integer, ForeignKey("users.id", name="stores_owner_fk")),
+        ForeignKeyConstraint(["country", "region_code"], ["regions.country", "regions.code"], name="stores_region_fk"),
+        # A second foreign key sharing a column of the composite one
+        ForeignKeyConstraint(["owner_id"], ["users.id"], name="stores_manager_fk")
+    )
+    
+    sql_dependency = SQLBaseDependency(name="composite", connection_params=sqlite_connection_params)
+    sql_dependency.set_tables_from_metadata(metadata)
+    
+    regions = get_table(sql_dependency, "regions")
+    stores = get_table(sql_dependency, "stores")
+    
+    country_join = get_column(stores, "country").join
+    region_code_join = get_column(stores, "region_code").join
+    
+    assert country_join.composite and region_code_join.composite
+    assert country_join.constraint == region_code_join.constraint == "stores_region_fk"
+    assert (country_join.table_id, country_join.column_id) == (regions.id, get_column(regions, "country").id)
+    assert (region_code_join.table_id, region_code_join.column_id) == (regions.id, get_column(regions, "code").id)
+    
+    owner_joins = get_column(stores, "owner_id").get_joins()
+    
+    assert sorted(join.constraint for join in owner_joins) == ["stores_manager_fk", "stores_owner_fk"]
+    assert not any(join.composite for join in owner_joins)
+    
+    # Composite joins are rendered with their constraint, so the model joins on all of its columns
+    column_dicts = {column["name"]: column for column in stores.get_dict()["columns"]}
+    
+    assert column_dicts["country"]["join"]["constraint"] == "stores_region_fk"
+    assert len(column_dicts["owner_id"]["joins"]) == 2
+
+
+def test_foreign_keys_to_unreflected_tables_are_skipped(sqlite_connection_params: SQLConnectionParams):
+    
+    metadata = MetaData()
+    Table("orders", metadata, Column("id", Integer, primary_key=True), Column("user_id", Integer, ForeignKey("users.id")))
+    
+    sql_dependency = SQLBaseDependency(name="unreflected", connection_params=sqlite_connection_params)
+    sql_dependency.set_tables_from_metadata(metadata)
+    
+    assert get_column(get_table(sql_dependency, "orders"), "user_id").join is None
+
+
+def test_ids_are_looked_up_through_indexes(sql_dependency: SQLBaseDependency):
+    
+    users = get_table(sql_dependency, "users")
+    password = get_column(users, "password")
+    
+    assert sql_dependency.get_table_by_id(users.id) is users
+    assert sql_dependency.get_table_by_id(str(users.id)) is users
+    assert sql_dependency.get_column_by_id(password.id) is password
+    assert sql_dependency.get_table_column_names("USERS") == ["id", "name", "password"]
+    
+    tables_by_id = sql_dependency._tables_by_id
+    
+    # Lookups reuse the indexes until the tables change
+    sql_dependency.get_table_by_id(users.id)
+    
+    assert sql_dependency._tables_by_id is tables_by_id
+    
+    with pytest.raises(ValueError):
+        sql_dependency.get_table_by_id(uuid4())
+
+
+def test_assigned_tables_rebuild_indexes(sql_dependency: SQLBaseDependency):
+    
+    users = get_table(sql_dependency, "users")
+    schema_version = sql_dependency.schema_version
+    
+    customers = SQLDatabaseTable(table_name="customers", description=None, comment=None)
+    sql_dependency.tables = [customers]
+    
+    assert sql_dependency.get_table_by_id(customers.id) is customers
+    assert sql_dependency.schema_version == schema_version + 1
+    assert [summary.table_name for summary in sql_dependency.table_summaries] == ["customers"]
+    
+    with pytest.raises(ValueError):
+        sql_dependency.get_table_by_id(users.id)
+
+
+def test_in_place_table_changes_are_marked(sql_dependency: SQLBaseDependency):
+    
+    users = get_table(sql_dependency, "users")
+    schema_version = sql_dependency.schema_version
+    
+    assert sql_dependency.get_table_by_id(users.id) is users
+    
+    customers = SQLDatabaseTable(table_name="customers", description=None, comment=None)
+    sql_dependency.tables[sql_dependency.tables.index(users)] = customers
+    sql_dependency.mark_tables_changed()
+    
+    assert sql_dependency.get_table_by_id(customers.id) is customers
+    assert sql_dependency.schema_version == schema_version + 1
+    assert [summary.table_name for summary in sql_dependency.table_summaries] == ["orders", "customers"]
+    
+    with pytest.raises(ValueError):
+        sql_dependency.get_table_by_id(users.id)
+
+
+def test_incremental_update_replaces_only_changed_tables(sql_dependency: SQLBaseDependency, sqlite_path: Path, run):
+    
+    users = get_table(sql_dependency, "users")
+    orders = get_table(sql_dependency, "orders")
+    users_column_ids = {column.name: column.id for column in users.columns}
+    schema_version = sql_dependency.schema_version
+    
+    with sqlite3.connect(sqlite_path) as connection:
+        connection.execute("ALTER TABLE users ADD COLUMN email TEXT")
+    
+    metadata = run(sql_dependency.get_metadata_async(tables=[(None, ["users"])]))
+    sql_dependency.update_tables_from_metadata(metadata)
+    
+    refreshed_users = get_table(sql_dependency, "users")
+    
+    assert refreshed_users is not users
+    assert refreshed_users.id == users.id
+    assert [column.name for column in refreshed_users.columns] == ["id", "name", "password", "email"]
+    assert all(users_column_ids[column.name] == column.id for column in refreshed_users.columns if column.name in users_column_ids)
+    assert get_column(refreshed_users, "password").exclude
+    
+    # Unchanged tables and their joins into the refreshed table are kept
+    assert get_table(sql_dependency, "orders") is orders
+    assert get_column(orders, "user_id").join.table_id == users.id
+    assert sql_dependency.schema_version == schema_version + 1
+    
+    sql_dependency.update_tables_from_metadata(MetaData(), removed_table_keys={"orders"})
+    
+    assert [table.table_name for table in sql_dependency.tables] == ["users"]
+    assert sql_dependency.get_table_column_names("orders") is None
+
+
+def test_incremental_update_keeps_tables_of_other_schemas(sqlite_connection_params: SQLConnectionParams):
+    
+    sql_dependency = SQLBaseDependency(name="schemas", connection_params=sqlite_connection_params)
+    
+    metadata = MetaData()
+    Table("users", metadata, Column("id", Integer, primary_key=True))
+    Table("users", metadata, Column("id", Integer, primary_key=True), Column("note", String), schema="archive")
+    Table("orders", metadata, Column("id", Integer, primary_key=True), Column("user_id", Integer, ForeignKey("archive.users.id")), schema="archive")
+    
+    sql_dependency.set_tables_from_metadata(metadata)
+    
+    assert sorted(table.qualified_name for table in sql_dependency.tables) == ["archive.orders", "archive.users", "users"]
+    
+    refreshed_metadata = MetaData()
+    Table("users", refreshed_metadata, Column("id", Integer, primary_key=True), Column("note", String), Column("deleted", Integer), schema="archive")
+    
+    sql_dependency.update_tables_from_metadata(refreshed_metadata)
+    
+    assert sql_dependency.get_table_column_names("users") == ["id"]
+    assert sql_dependency.get_table_column_names("users", "archive") == ["id", "note", "deleted"]
+    
+    archive_orders = get_table(sql_dependency, "archive.orders")
+    
+    assert get_column(archive_orders, "user_id").join.table == "archive.users"
+    
+    sql_dependency.update_tables_from_metadata(MetaData(), removed_table_keys={"archive.users"})
+    
+    assert sorted(table.qualified_name for table in sql_dependency.tables) == ["archive.orders", "users"]
+    assert get_column(archive_orders, "user_id").join is None
+
+
+def test_changed_exclusions_are_applied_to_columns_and_prompts(sql_dependency: SQLBaseDependency):
+    
+    users = get_table(sql_dependency, "users")
+    
+    assert get_column(users, "password").exclude
+    assert "password" not in sql_dependency.get_prompt()
+    
+    sql_dependency.column_names_to_exclude = ["name"]
+    
+    assert not get_column(users, "password").exclude
+    assert get_column(users, "name").exclude
+    
+    prompt = sql_dependency.get_prompt()
+    
+    assert "password" in prompt
+    assert '"name": "name"' not in prompt
+    assert list(sql_dependency.get_dataframe_from_query("SELECT * FROM users").columns) == ["id", "password"]
+
+
+def test_schema_index_is_built_off_the_event_loop_once_per_schema_version(sql_dependency: SQLBaseDependency, run, monkeypatch: pytest.MonkeyPatch):
+    
+    build_threads = []
+    
+    def get_schema_index(key, tables):
+        build_threads.append(threading.current_thread())
+        return sql_schema_index.get_schema_index(key, tables)
+    
+    monkeypatch.setattr(sql_dependency_module, "get_schema_index", get_schema_index)
+    
+    async def get_schema_indexes():
+        return [await sql_dependency.get_schema_index_async() for _ in range(2)]
+    
+    first_index, second_index = run(get_schema_indexes())
+    
+    assert first_index is second_index
+    assert build_threads and threading.main_thread() not in build_threads
+    assert [table.table_name for table in run(sql_dependency.search_tables_async("order totals", k=1))] == ["orders"]
+    
+    # A new schema version gets a new index
+    sql_dependency.mark_tables_changed()
+    
+    assert run(sql_dependency.get_schema_index_async()) is not first_index
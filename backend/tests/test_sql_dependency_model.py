@@ -0,0 +1,192 @@
+import asyncio
+
+from types import SimpleNamespace
+
+import pytest
+
+from models import sql_dependency_model as sql_dependency_model_module
+from models.sql_dependency_model import SQLBaseDependencyModel, SQLDependencyCache
+from models.sql_table_model import SQLTableModel
+from settings import settings
+
+
+@pytest.fixture
+def loaded_table_ids() -> list[str]:
+    return []
+
+
+@pytest.fixture
+def lazy_sql_dependency(sql_dependency, loaded_table_ids: list[str], monkeypatch: pytest.MonkeyPatch):
+    """
+    Stored counterpart of `sql_dependency` as it is read from Redis, with table summaries but without tables.
+    The table records are served from memory, the ids of every read are collected in `loaded_table_ids`.
+    """
+    
+    table_records = {
+        str(table.id): SQLTableModel(**table.model_dump(), dependency_pk=str(sql_dependency.name))
+        for table in sql_dependency.tables
+    }
+    
+    lazy_sql_dependency = SQLBaseDependencyModel(
+        pk=sql_dependency.name,
+        name=sql_dependency.name,
+        connection_params=sql_dependency.connection_params,
+        column_names_to_exclude=sql_dependency.column_names_to_exclude,
+        table_summaries=sql_dependency.table_summaries
+    )
+    
+    async def get_many(model, pks):
+        loaded_table_ids.extend(pks)
+        return [table_records[pk] for pk in pks if pk in table_records]
+    
+    monkeypatch.setattr(sql_dependency_model_module, "get_many", get_many)
+    
+    return lazy_sql_dependency
+
+
+def test_lazy_dependency_expands_stars_from_table_records(lazy_sql_dependency, sql_dependency, loaded_table_ids, run):
+    
+    pytest.importorskip("sqlglot")
+    
+    assert lazy_sql_dependency.tables is None
+    
+    projected_query = run(lazy_sql_dependency.exclude_columns_from_query_async("SELECT * FROM users"))
+    
+    assert "password" not in projected_query
+    assert lazy_sql_dependency.tables is None
+    
+    # Only the record of the starred table is read
+    users_table = next(table for table in sql_dependency.tables if table.table_name == "users")
+    assert loaded_table_ids == [str(users_table.id)]
+
+
+def test_lazy_dependency_reads_table_records_once(lazy_sql_dependency, loaded_table_ids, run):
+    
+    pytest.importorskip("sqlglot")
+    
+    run(lazy_sql_dependency.exclude_columns_from_query_async("SELECT * FROM users"))
+    run(lazy_sql_dependency.exclude_columns_from_query_async("SELECT * FROM users WHERE id = 1"))
+    
+    assert len(loaded_table_ids) == 1
+
+
+def test_lazy_dependency_queries_drop_excluded_columns(lazy_sql_dependency, run):
+    
+    df = run(lazy_sql_dependency.get_dataframe_from_query_async("SELECT * FROM users ORDER BY id"))
+    
+    assert list(df.columns) == ["id", "name"]
+    assert df["name"].tolist() == ["Ada", "Grace"]
+
+
+def test_unknown_tables_are_not_loaded(lazy_sql_dependency, loaded_table_ids, run):
+    
+    pytest.importorskip("sqlglot")
+    
+    assert run(lazy_sql_dependency.exclude_columns_from_query_async("SELECT * FROM missing")) == "SELECT * FROM missing"
+    assert loaded_table_ids == []
+
+
+class FakePubSub:
+    """
+    Delivers the messages put on `messages` after confirming the subscription, like a Redis pubsub.
+    """
+    
+    def __init__(self) -> None:
+        self.messages: asyncio.Queue = asyncio.Queue()
+    
+    async def subscribe(self, channel: str) -> None:
+        await self.messages.put({"type": "subscribe", "data": 1})
+    
+    async def listen(self):
+        while True:
+            yield await self.messages.get()
+    
+    async def reset(self) -> None:
+        pass
+
+
+@pytest.fixture
+def loaded_pks(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """
+    Collects the pks of dependencies read from Redis, every read returns a new instance.
+    """
+    
+    loaded_pks = []
+    
+    async def get(pk):
+        loaded_pks.append(pk)
+        return object()
+    
+    monkeypatch.setattr(SQLBaseDependencyModel, "get", get)
+    monkeypatch.setattr(settings, "SQL_DEPENDENCY_CACHE_ENABLED", True)
+    
+    return loaded_pks
+
+
+def test_dependencies_are_only_cached_while_invalidations_are_received(loaded_pks: list[str], monkeypatch: pytest.MonkeyPatch):
+    
+    pubsub = FakePubSub()
+    monkeypatch.setattr(SQLBaseDependencyModel, "db", lambda: SimpleNamespace(pubsub=lambda: pubsub))
+    
+    async def get_dependencies():
+        
+        cache = SQLDependencyCache(ttl=60, max_entries=8)
+        
+        # Without the listener, invalidations could be missed
+        first = await cache.get("a")
+        assert await cache.get("a") is not first
+        
+        cache.start_listener()
+        await asyncio.sleep(0.01)
+        
+        cached = await cache.get("a")
+        assert await cache.get("a") is cached
+        
+        # A dependency saved by another process
+        await pubsub.messages.put({"type": "message", "data": "a"})
+        await asyncio.sleep(0.01)
+        
+        assert await cache.get("a") is not cached
+        
+        await cache.stop_listener()
+    
+    asyncio.run(get_dependencies())
+    
+    assert loaded_pks == ["a", "a", "a", "a"]
+
+
+def test_cached_dependencies_expire_and_are_evicted(loaded_pks: list[str], monkeypatch: pytest.MonkeyPatch):
+    
+    now = 0.0
+    monkeypatch.setattr(sql_dependency_model_module, "monotonic", lambda: now)
+    
+    cache = SQLDependencyCache(ttl=60, max_entries=2)
+    cache._listening = True
+    
+    for pk in ["a", "b", "a", "c"]:
+        asyncio.run(cache.get(pk))
+    
+    # "b" was used least recently when "c" was added
+    assert list(cache._entries) == ["a", "c"]
+    
+    now += 61
+    asyncio.run(cache.get("a"))
+    
+    assert loaded_pks == ["a", "b", "c", "a"]
+
+
+def test_dependencies_invalidated_while_loading_are_not_cached(monkeypatch: pytest.MonkeyPatch):
+    
+    cache = SQLDependencyCache(ttl=60, max_entries=8)
+    cache._listening = True
+    
+    async def get(pk):
+        cache.invalidate(pk)
+        return object()
+    
+    monkeypatch.setattr(SQLBaseDependencyModel, "get", get)
+    monkeypatch.setattr(settings, "SQL_DEPENDENCY_CACHE_ENABLED", True)
+    
+    asyncio.run(cache.get("a"))
+    
+    assert not cache._entries
@@ -0,0 +1,49 @@
+from sqlalchemy import text
+from sqlalchemy.engine import URL
+
+from deps.sql_dependency import SQLBaseDependency
+from deps.sql_engine_registry import SQLEngineRegistry
+
+
+def test_engines_are_reused_per_key_and_fingerprint(tmp_path):
+    
+    registry = SQLEngineRegistry()
+    url = URL.create(drivername="sqlite", database=str(tmp_path / "database.sqlite"))
+    
+    engine = registry.get_engine("dependency", "fingerprint", url)
+    
+    assert registry.get_engine("dependency", "fingerprint", url) is engine
+    assert registry.get_engine("other-dependency", "fingerprint", url) is not engine
+    
+    # Changed connection parameters get a new pool instead of the stale one
+    assert registry.get_engine("dependency", "changed-fingerprint", url) is not engine
+
+
+def test_dispose_keeps_engines_of_unchanged_connections(tmp_path):
+    
+    registry = SQLEngineRegistry()
+    url = URL.create(drivername="sqlite", database=str(tmp_path / "database.sqlite"))
+    
+    engine = registry.get_engine("dependency", "fingerprint", url)
+    
+    registry.dispose("dependency", fingerprint="fingerprint")
+    
+    assert registry.get_engine("dependency", "fingerprint", url) is engine
+    
+    registry.dispose("dependency")
+    
+    assert registry.get_engine("dependency", "fingerprint", url) is not engine
+
+
+def test_queries_of_a_dependency_share_its_pool(sql_dependency: SQLBaseDependency):
+    
+    engine = sql_dependency.get_engine()
+    
+    sql_dependency.get_dataframe_from_query("SELECT id FROM users")
+    sql_dependency.get_dataframe_from_query("SELECT id FROM orders")
+    
+    assert sql_dependency.get_engine() is engine
+    assert engine.pool.checkedin() == 1
+    
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM users")).scalar() == 2
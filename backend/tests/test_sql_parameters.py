@@ -0,0 +1,72 @@
+from datetime import date
+
+import pytest
+
+from deps.sql_dependency import SQLBaseDependency
+from deps.sql_parameters import compile_parametrized_query, coerce_parameter_value
+from results.dashboard_config_results import DashboardSQLQueryParameter
+from schemas.dashboard_evaluation import DashboardEvaluationSQLQuery, DashboardSQLQueryParameterValue
+
+
+def get_evaluation_sql_query(parametrized_query: str, **parameter_values: tuple[str, object]) -> DashboardEvaluationSQLQuery:
+    return DashboardEvaluationSQLQuery(
+        sql_dependency_id="dependency",
+        parametrized_query=parametrized_query,
+        dashboard_sql_query_parameter_values=[
+            DashboardSQLQueryParameterValue(
+                parameter=DashboardSQLQueryParameter(name=name, type=parameter_type, default_value=value),
+                value=value
+            )
+            for name, (parameter_type, value) in parameter_values.items()
+        ]
+    )
+
+
+def test_statements_are_compiled_once_per_template_and_types():
+    
+    query = "SELECT * FROM users WHERE id = {id}"
+    
+    statement = compile_parametrized_query(query, (("id", "int"),))
+    
+    assert str(statement) == "SELECT * FROM users WHERE id = :id"
+    assert compile_parametrized_query(query, (("id", "int"),)) is statement
+    assert compile_parametrized_query(query, (("id", "str"),)) is not statement
+
+
+def test_invalid_parameters_are_rejected():
+    
+    with pytest.raises(ValueError, match="not found"):
+        compile_parametrized_query("SELECT * FROM users", (("id", "int"),))
+    
+    with pytest.raises(ValueError, match="Unsupported"):
+        compile_parametrized_query("SELECT * FROM users WHERE id = {id}", (("id", "uuid"),))
+
+
+def test_values_are_coerced_to_their_parameter_type():
+    
+    assert coerce_parameter_value("2024-02-01", "date") == date(2024, 2, 1)
+    assert coerce_parameter_value("3", "int") == 3
+    assert coerce_parameter_value(3, "str") == "3"
+
+
+def test_different_values_share_the_statement(sql_dependency: SQLBaseDependency):
+    
+    results = {}
+    
+    for user_id in [1, 2]:
+        
+        statement, parameters = get_evaluation_sql_query("SELECT name FROM users WHERE id = {user_id}", user_id=("int", user_id)).get_statement()
+        
+        results[user_id] = (statement, sql_dependency.get_dataframe_from_query(statement, parameters=parameters)["name"].tolist())
+    
+    assert results[1][0] is results[2][0]
+    assert results[1][1] == ["Ada"]
+    assert results[2][1] == ["Grace"]
+
+
+def test_values_are_bound_rather_than_inlined(sql_dependency: SQLBaseDependency):
+    
+    statement, parameters = get_evaluation_sql_query("SELECT name FROM users WHERE name = {name}", name=("str", "x' OR '1' = '1")).get_statement()
+    
+    assert "OR" not in str(statement)
+    assert sql_dependency.get_dataframe_from_query(statement, parameters=parameters).empty
@@ -0,0 +1,83 @@
+import sqlite3
+import time
+
+from pandas import DataFrame
+
+import pytest
+
+from deps import sql_query_cache as sql_query_cache_module
+from deps.sql_query_cache import SQLQueryCache, normalize_query, serialize_dataframe, deserialize_dataframe
+from settings import settings
+
+
+def test_normalize_query_without_sqlglot_dialect_keeps_case_and_literals():
+    
+    # Dialects unknown to sqlglot fall back to normalizing whitespace only
+    query = "select  Name,\n\t'a  b' AS \"Quoted  Alias\"\nFROM   users -- the  users\nWHERE id = 1;"
+    
+    assert normalize_query(query, "oracle") == "select Name, 'a  b' AS \"Quoted  Alias\" FROM users -- the  users\nWHERE id = 1"
+
+
+def test_normalize_query_with_sqlglot_ignores_formatting():
+    
+    pytest.importorskip("sqlglot")
+    
+    assert normalize_query("select id\nfrom   users", "sqlite") == normalize_query("SELECT id FROM users", "sqlite")
+
+
+def test_cached_results_respect_max_age(monkeypatch: pytest.MonkeyPatch):
+    
+    now = time.monotonic()
+    monkeypatch.setattr(sql_query_cache_module.time, "monotonic", lambda: now)
+    
+    cache = SQLQueryCache(ttl=60, max_bytes=1024 * 1024)
+    cache.set("key", DataFrame({"id": [1, 2]}))
+    
+    now += 10
+    
+    assert cache.get("key", max_age=5) is None
+    assert cache.get("key", max_age=30)["id"].tolist() == [1, 2]
+    
+    # Results older than the TTL are dropped for every reader
+    now += 60
+    
+    assert cache.get("key") is None
+
+
+def test_cached_results_are_copies():
+    
+    cache = SQLQueryCache(ttl=60, max_bytes=1024 * 1024)
+    cache.set("key", DataFrame({"id": [1, 2]}))
+    
+    df = cache.get("key")
+    df["name"] = ["Ada", "Grace"]
+    
+    assert list(cache.get("key").columns) == ["id"]
+
+
+def test_serialized_results_keep_their_time_and_truncation():
+    
+    pytest.importorskip("pyarrow")
+    
+    df = DataFrame({"id": [1, 2], "name": ["Ada", "Grace"]})
+    df.attrs["truncated"] = True
+    
+    restored_df, cached_at = deserialize_dataframe(serialize_dataframe(df, cached_at=1234.5))
+    
+    assert restored_df.equals(df)
+    assert restored_df.attrs["truncated"]
+    assert cached_at == 1234.5
+
+
+def test_dependency_queries_are_served_from_the_cache(sql_dependency, sqlite_path, monkeypatch: pytest.MonkeyPatch):
+    
+    monkeypatch.setattr(settings, "SQL_QUERY_CACHE_ENABLED", True)
+    
+    df = sql_dependency.get_dataframe_from_query("SELECT id FROM users ORDER BY id")
+    
+    with sqlite3.connect(sqlite_path) as connection:
+        connection.execute("DELETE FROM users")
+    
+    # Differently formatted queries share the cache entry
+    assert sql_dependency.get_dataframe_from_query("select id\nfrom users order by id").equals(df)
+    assert sql_dependency.get_dataframe_from_query("SELECT id FROM users ORDER BY id", use_cache=False).empty
@@ -0,0 +1,135 @@
+import sqlite3
+
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("sqlglot")
+
+from deps.sql_dependency import SQLBaseDependency
+from deps.sql_rewrite import exclude_columns_from_query, limit_query
+
+
+TABLE_COLUMN_NAMES = {
+    "users": ["id", "name", "password"],
+    "audit.users": ["id", "password"],
+}
+
+EXCLUDED_COLUMN_NAMES = frozenset({"password"})
+
+
+def get_table_column_names(table_name: str, schema_name: str | None) -> list[str] | None:
+    return TABLE_COLUMN_NAMES.get(f"{schema_name}.{table_name}" if schema_name else table_name)
+
+
+def exclude_columns(query: str, sql_type: str = "sqlite") -> str | None:
+    return exclude_columns_from_query(query, sql_type, EXCLUDED_COLUMN_NAMES, get_table_column_names)
+
+
+def test_limit_is_injected():
+    assert limit_query("SELECT id FROM users", "sqlite", 10) == "SELECT id FROM users LIMIT 10"
+    assert limit_query("SELECT id FROM users", "mssql", 10) == "SELECT TOP 10 id FROM users"
+
+
+def test_smaller_limit_is_kept():
+    assert limit_query("SELECT id FROM users LIMIT 5", "sqlite", 10) == "SELECT id FROM users LIMIT 5"
+
+
+def test_non_literal_limit_is_not_rewritten():
+    assert limit_query("SELECT id FROM users LIMIT :n", "sqlite", 10) is None
+
+
+@pytest.mark.parametrize("query", [
+    "DELETE FROM users",
+    "SELECT 1; SELECT 2",
+    "SELECT id INTO copies FROM users",
+])
+def test_non_select_queries_are_not_limited(query: str):
+    assert limit_query(query, "postgres", 10) is None
+
+
+def test_max_rows_are_pushed_into_the_query(sql_dependency: SQLBaseDependency):
+    
+    df = sql_dependency.get_dataframe_from_query("SELECT id FROM users ORDER BY id", max_rows=1)
+    
+    assert df["id"].tolist() == [1]
+
+
+def test_star_is_expanded_without_excluded_columns():
+    assert exclude_columns("SELECT * FROM users") == 'SELECT "id", "name" FROM users'
+
+
+def test_qualified_star_keeps_its_table():
+    assert exclude_columns("SELECT u.* FROM users AS u WHERE u.id = 1") == 'SELECT "u"."id", "u"."name" FROM users AS u WHERE u.id = 1'
+
+
+def test_star_is_resolved_by_schema_qualified_name():
+    assert exclude_columns("SELECT * FROM audit.users", "postgres") == 'SELECT "id" FROM audit.users'
+
+
+def test_star_of_unknown_table_is_not_rewritten():
+    assert exclude_columns("SELECT * FROM archive.users", "postgres") is None
+    assert exclude_columns("SELECT * FROM orders") is None
+
+
+def test_excluded_columns_are_removed_from_projection():
+    assert exclude_columns("SELECT id, password FROM users") == "SELECT id FROM users"
+
+
+def test_queries_without_excluded_columns_are_not_rewritten():
+    assert exclude_columns("SELECT id, name FROM users") is None
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM users JOIN orders ON orders.user_id = users.id",
+    "SELECT DISTINCT password FROM users",
+    "SELECT password, COUNT(*) FROM users GROUP BY password",
+    "SELECT password AS secret, id FROM users ORDER BY secret",
+    "SELECT id, password FROM users ORDER BY 2",
+    "SELECT id FROM users UNION SELECT password FROM users",
+    "SELECT password FROM users",
+])
+def test_unsafe_queries_are_not_rewritten(query: str):
+    assert exclude_columns(query) is None
+
+
+def test_unsupported_dialect_is_not_rewritten():
+    assert exclude_columns_from_query("SELECT * FROM users", "oracle", EXCLUDED_COLUMN_NAMES, get_table_column_names) is None
+
+
+def test_star_query_is_rewritten_without_excluded_columns(sql_dependency: SQLBaseDependency):
+    
+    assert sql_dependency.exclude_columns_from_query("SELECT * FROM users") == 'SELECT "id", "name" FROM users'
+    
+    df = sql_dependency.get_dataframe_from_query("SELECT * FROM users ORDER BY id")
+    
+    assert list(df.columns) == ["id", "name"]
+    assert df["name"].tolist() == ["Ada", "Grace"]
+
+
+def test_async_star_query_is_rewritten(sql_dependency: SQLBaseDependency, run):
+    
+    df = run(sql_dependency.get_dataframe_from_query_async("SELECT * FROM users ORDER BY id", max_rows=1))
+    
+    assert list(df.columns) == ["id", "name"]
+    assert len(df) == 1
+
+
+def test_stale_reflection_falls_back_to_query_as_written(sql_dependency: SQLBaseDependency, sqlite_path: Path):
+    
+    with sqlite3.connect(sqlite_path) as connection:
+        connection.execute("ALTER TABLE users DROP COLUMN name")
+    
+    # The reflected "name" column no longer exists, so the expanded query fails. The star is qualified,
+    # as SQLite reads an unknown unqualified identifier in double quotes as a string literal
+    df = sql_dependency.get_dataframe_from_query("SELECT u.* FROM users AS u ORDER BY id")
+    
+    assert list(df.columns) == ["id"]
+
+
+def test_excluded_columns_are_dropped_from_results_without_rewrite(sql_dependency: SQLBaseDependency):
+    
+    df = sql_dependency.get_dataframe_from_query("SELECT users.*, orders.total FROM users JOIN orders ON orders.user_id = users.id")
+    
+    assert "password" not in df.columns
+    assert len(df) == 2
@@ -0,0 +1,72 @@
+import sqlite3
+
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import create_engine
+
+from deps.sql_reflection import SQLReflectionFilter
+from deps.sql_schema_snapshot import take_schema_snapshot
+
+
+def execute(path: Path, script: str) -> None:
+    
+    connection = sqlite3.connect(path)
+    connection.executescript(script)
+    connection.commit()
+    connection.close()
+
+
+@pytest.fixture
+def engine(sqlite_path: Path):
+    
+    execute(
+        sqlite_path,
+        """
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (id));
+        CREATE TABLE logs (id INTEGER PRIMARY KEY);
+        """
+    )
+    
+    engine = create_engine(f"sqlite:///{sqlite_path}")
+    
+    yield engine
+    
+    engine.dispose()
+
+
+def test_unchanged_schema_has_empty_diff(engine):
+    assert take_schema_snapshot(engine).diff(take_schema_snapshot(engine)).is_empty
+
+
+def test_diff_finds_added_changed_and_removed_tables(engine, sqlite_path: Path):
+    
+    snapshot = take_schema_snapshot(engine)
+    
+    execute(
+        sqlite_path,
+        """
+        CREATE TABLE products (id INTEGER PRIMARY KEY);
+        ALTER TABLE users ADD COLUMN email TEXT;
+        DROP TABLE logs;
+        """
+    )
+    
+    schema_diff = snapshot.diff(take_schema_snapshot(engine))
+    
+    assert [fingerprint.key for fingerprint in schema_diff.added] == ["products"]
+    assert [fingerprint.key for fingerprint in schema_diff.changed] == ["users"]
+    assert [fingerprint.key for fingerprint in schema_diff.removed] == ["logs"]
+    assert sorted(schema_diff.get_tables_to_reflect()[0][1]) == ["products", "users"]
+    assert schema_diff.get_tables_to_reflect()[0][0] is None
+
+
+def test_snapshot_respects_reflection_filter(engine):
+    
+    snapshot = take_schema_snapshot(engine, SQLReflectionFilter(exclude_tables=["logs"]))
+    
+    assert sorted(snapshot.fingerprints) == ["orders", "users"]
@@ -0,0 +1,121 @@
+from pandas import DataFrame, Timestamp
+
+import pytest
+
+from pydantic import ValidationError
+
+from results.tool_results import PandasDataFrame
+from states.dashboard_state import DashboardState
+
+
+@pytest.fixture
+def df() -> DataFrame:
+    
+    df = DataFrame({
+        "id": [1, 2, 3],
+        "name": ["Ada", "Grace", None],
+        "total": [9.5, 3.0, 1.25],
+        "created_at": [Timestamp("2024-01-01"), Timestamp("2024-02-01"), Timestamp("2024-03-01")]
+    })
+    df.attrs["truncated"] = True
+    
+    return df
+
+
+@pytest.mark.parametrize("format", ["split", "columnar", "arrow"])
+def test_formats_round_trip_through_json(df: DataFrame, format: str):
+    
+    if format == "arrow":
+        pytest.importorskip("pyarrow")
+    
+    pandas_dataframe = PandasDataFrame.from_dataframe(df, format=format)
+    restored = PandasDataFrame.model_validate_json(pandas_dataframe.model_dump_json())
+    
+    assert restored.format == format
+    assert restored.truncated
+    
+    restored_df = restored.to_dataframe()
+    
+    assert restored_df[["id", "name", "total"]].equals(df[["id", "name", "total"]])
+    
+    # The split format carries no dtypes, its timestamps come back as strings
+    if format != "split":
+        assert restored_df.dtypes.equals(df.dtypes)
+        assert restored_df.equals(df)
+
+
+def test_equal_frames_have_the_same_fingerprint_in_every_format(df: DataFrame):
+    
+    pytest.importorskip("pyarrow")
+    
+    columnar = PandasDataFrame.from_dataframe(df, format="columnar")
+    arrow = PandasDataFrame.model_validate_json(PandasDataFrame.from_dataframe(df, format="arrow").model_dump_json())
+    
+    assert columnar.get_fingerprint() == arrow.get_fingerprint()
+    assert columnar.to_format("split").format == "split"
+
+
+def test_arrow_falls_back_to_columnar_for_duplicate_columns():
+    
+    pytest.importorskip("pyarrow")
+    
+    df = DataFrame([[1, 2]], columns=["id", "id"])
+    
+    assert PandasDataFrame.from_dataframe(df, format="arrow").format == "columnar"
+
+
+@pytest.mark.parametrize("format", ["columnar", "arrow"])
+def test_head_is_split_for_the_model(df: DataFrame, format: str):
+    
+    if format == "arrow":
+        pytest.importorskip("pyarrow")
+    
+    head = PandasDataFrame.from_dataframe(df, format=format).head(2)
+    
+    assert head.format == "split"
+    assert head.data[0][:3] == [1, "Ada", 9.5]
+    assert len(head.data) == 2
+
+
+def test_state_snapshots_are_not_sent_as_arrow():
+    
+    with pytest.raises(ValidationError):
+        DashboardState(default_dataframe_format="arrow")
+
+
+def test_frame_is_built_once_and_shared(df: DataFrame, monkeypatch: pytest.MonkeyPatch):
+    
+    pandas_dataframe = PandasDataFrame.model_validate_json(PandasDataFrame.from_dataframe(df, format="columnar").model_dump_json())
+    
+    build_count = 0
+    build_dataframe = PandasDataFrame._build_dataframe
+    
+    def count_builds(self):
+        nonlocal build_count
+        build_count += 1
+        return build_dataframe(self)
+    
+    monkeypatch.setattr(PandasDataFrame, "_build_dataframe", count_builds)
+    
+    frames = [pandas_dataframe.to_dataframe() for _ in range(10)]
+    pandas_dataframe.head()
+    pandas_dataframe.get_fingerprint()
+    
+    assert build_count == 1
+    
+    # Copies share the values, but columns added to one are not seen by the others
+    frames[0]["doubled"] = frames[0]["total"] * 2
+    
+    assert "doubled" not in pandas_dataframe.to_dataframe().columns
+
+
+def test_assigned_fields_replace_the_cached_frame(df: DataFrame):
+    
+    pandas_dataframe = PandasDataFrame.from_dataframe(df)
+    fingerprint = pandas_dataframe.get_fingerprint()
+    
+    pandas_dataframe.data = [[4, "Linus", 2.0, "2024-04-01"]]
+    pandas_dataframe.index = [0]
+    
+    assert pandas_dataframe.to_dataframe()["name"].tolist() == ["Linus"]
+    assert pandas_dataframe.get_fingerprint() != fingerprint
@@ -4,8 +4,6 @@ from pydantic_ai import RunContext
 
 from state import State
 
-from pandas import DataFrame
-
 
 INSTALL_MAPPING = {}
 
@@ -64,6 +62,24 @@ def import_dependency(
     return module
 
 
+def get_recent_message_text(ctx: RunContext, n: int = 6) -> str:
+    """
+    Returns the text of the user prompts and model responses of the last n messages,
+    e.g. to find the tables relevant to the conversation.
+    """
+    
+    texts = []
+    
+    for message in ctx.messages[-n:]:
+        
+        for part in message.parts:
+            
+            if part.part_kind in ("user-prompt", "text") and isinstance(part.content, str):
+                texts.append(part.content)
+                
+    return "\n".join(texts)
+
+
 def get_plotly_environment(ctx: RunContext[State]) -> dict:
     """
     Returns the environment for the code to be executed.
@@ -74,7 +90,7 @@ def get_plotly_environment(ctx: RunContext[State]) -> dict:
     env = {
         "pd": import_dependency("pandas"),
         "px": import_dependency("plotly.express"),
-        "dfs": [DataFrame(**df.result.model_dump()) for df in ctx.deps.sql_query_results],
+        "dfs": [df.result.to_dataframe() for df in ctx.deps.sql_query_results],
     }
 
     return env
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""
+Times SQLBaseDependency.set_tables_from_metadata on a synthetic schema.
+
+Usage: python utils/benchmark_set_tables_from_metadata.py [n_tables] [n_columns_per_table]
+Defaults to 5,000 tables with 20 columns each (100,000 columns), every table referencing its predecessor.
+"""
+
+import os
+import sys
+import time
+
+from cryptography.fernet import Fernet
+from sqlalchemy import MetaData, Table, Column, Integer, String, ForeignKey
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_PASSWORD_KEY", Fernet.generate_key().decode())
+
+from deps.sql_dependency import SQLBaseDependency
+
+
+def build_metadata(n_tables: int, n_columns: int) -> MetaData:
+
+    metadata = MetaData()
+
+    for table_idx in range(n_tables):
+
+        columns = [Column("id", Integer, primary_key=True)]
+
+        if table_idx > 0:
+            columns.append(Column("parent_id", Integer, ForeignKey(f"table_{table_idx - 1}.id")))
+
+        columns.extend(
+            Column(f"column_{column_idx}", String(255)) for column_idx in range(n_columns - len(columns))
+        )
+
+        Table(f"table_{table_idx}", metadata, *columns)
+
+    return metadata
+
+
+if __name__ == "__main__":
+
+    n_tables = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    n_columns = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    metadata = build_metadata(n_tables, n_columns)
+    dependency = SQLBaseDependency(name="benchmark")
+
+    start = time.perf_counter()
+    dependency.set_tables_from_metadata(metadata)
+    elapsed = time.perf_counter() - start
+
+    n_joins = sum(len(column.get_joins()) for table in dependency.tables for column in table.columns)
+
+    print(f"{n_tables} tables, {n_tables * n_columns} columns, {n_joins} joins: {elapsed:.2f}s")
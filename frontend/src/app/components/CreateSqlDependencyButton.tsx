@@ -6,7 +6,7 @@ import type { ChangeEvent, FormEvent } from "react";
 import {
   accesifyClient,
   type SqlDependencyCreateRequest,
-  type SqlDependencyModel,
+  type SqlDependencySummary,
 } from "@/sdk";
 
 const typeOptions: SqlDependencyCreateRequest["type"][] = [
@@ -26,11 +26,14 @@ const createDefaultForm = (): SqlDependencyCreateRequest => ({
   password: "",
 });
 
-const getDependencyKey = (dependency: SqlDependencyModel): string =>
+const getDependencyKey = (dependency: {
+  pk?: string | null;
+  name: string;
+}): string =>
   dependency.pk ?? dependency.name;
 
 interface CreateSqlDependencyButtonProps {
-  onSelect?: (dependency: SqlDependencyModel | null) => void;
+  onSelect?: (dependency: SqlDependencySummary | null) => void;
 }
 
 export default function CreateSqlDependencyButton({
@@ -49,7 +52,7 @@ export default function CreateSqlDependencyButton({
   const [submitError, setSubmitError] = useState<string | null>(null);
   const [successMessage, setSuccessMessage] = useState<string | null>(null);
 
-  const [dependencies, setDependencies] = useState<SqlDependencyModel[]>([]);
+  const [dependencies, setDependencies] = useState<SqlDependencySummary[]>([]);
   const [selectedKey, setSelectedKey] = useState<string>("");
   const [isLoadingDependencies, setIsLoadingDependencies] = useState(false);
   const [dependenciesError, setDependenciesError] = useState<string | null>(
@@ -111,7 +114,7 @@ export default function CreateSqlDependencyButton({
   };
 
   const updateSelection = useCallback(
-    (list: SqlDependencyModel[], preferredKey?: string | null) => {
+    (list: SqlDependencySummary[], preferredKey?: string | null) => {
       if (!list.length) {
         setSelectedKey("");
         onSelectRef.current?.(null);
@@ -9,15 +9,25 @@ import CreateSqlDependencyButton from "./CreateSqlDependencyButton";
 
 import {
     accesifyClient,
+    getDataFrameRows,
     type DashboardEvaluationRequest,
-    type DashboardEvaluationResponse,
-    type SqlDependencyModel,
+    type DashboardFigureError,
+    type SqlDependencySummary,
 } from "@/sdk";
 import type { components } from "../types/accesify";
 
 type AgentState = components["schemas"]["DashboardState"];
 type DashboardParameter = components["schemas"]["DashboardSQLQueryParameter"];
 type DashboardParameterValue = components["schemas"]["DashboardSQLQueryParameterValue"];
+type DataFrameModel = components["schemas"]["PandasDataFrame"];
+type FigureModel = components["schemas"]["PlotlyFigure"];
+
+/** Evaluation result filled in as the events of the evaluation stream arrive. */
+type DashboardEvaluationView = {
+    data_frame: DataFrameModel | null;
+    figures: (FigureModel | null)[];
+    figure_errors: DashboardFigureError[];
+};
 
 function defaultParameterValue(param: DashboardParameter): string {
     const { default_value } = param;
@@ -88,10 +98,12 @@ function parseParameterValue(
 export default function DashboardState() {
     const { state, setState } = useCoAgent<AgentState>({
         name: "dashboard_agent",
+        // Same format as the evaluation requests, see getDataFrameRows
+        initialState: { default_dataframe_format: "columnar" } as AgentState,
     });
 
     const handleDependencySelect = useCallback(
-        (dependency: SqlDependencyModel | null) => {
+        (dependency: SqlDependencySummary | null) => {
             setState((previous) => {
                 const prior = previous ?? ({} as AgentState);
                 return {
@@ -110,7 +122,7 @@ export default function DashboardState() {
     );
     const [parameterValues, setParameterValues] = useState<Record<string, string>>({});
     const [evaluationResult, setEvaluationResult] =
-        useState<DashboardEvaluationResponse | null>(null);
+        useState<DashboardEvaluationView | null>(null);
     const [isEvaluating, setIsEvaluating] = useState(false);
     const [errorMessage, setErrorMessage] = useState<string | null>(null);
     const [selectedFigureIndex, setSelectedFigureIndex] = useState(0);
@@ -140,8 +152,13 @@ export default function DashboardState() {
         });
     }, [parameters]);
 
-    const displayedDataFrame = evaluationResult?.data_frame ?? state.default_dataframe;
-    const displayedFigures = evaluationResult?.figures ?? state.default_figures;
+    const displayedDataFrame = evaluationResult
+        ? evaluationResult.data_frame
+        : state.default_dataframe;
+    const displayedFigures = evaluationResult ? evaluationResult.figures : state.default_figures;
+    const selectedFigureError = evaluationResult?.figure_errors?.find(
+        (figureError) => figureError.index === selectedFigureIndex
+    );
 
     const handleInputChange = (name: string, value: string) => {
         setParameterValues((previous) => ({ ...previous, [name]: value }));
@@ -195,19 +212,53 @@ export default function DashboardState() {
                     dashboard_sql_query_parameter_values: parameterValuesPayload,
                 },
                 figure_configs: figureConfigs,
+                data_frame_format: "columnar",
             };
 
-            const result = await accesifyClient.evaluateDashboard(evaluationPayload);
-            setEvaluationResult(result);
-            if (result.figures && result.figures.length > 0) {
-                setActiveTab("figure");
-            } else if (result.data_frame) {
-                setActiveTab("dataframe");
-            } else if (dashboardConfig.dashboard_sql_query?.parametrized_query) {
-                setActiveTab("query");
-            } else {
-                setActiveTab("dataframe");
-            }
+            // Figures are painted one by one as the backend finishes rendering them
+            await accesifyClient.evaluateDashboardStream(evaluationPayload, (evaluationEvent) => {
+                switch (evaluationEvent.type) {
+                    case "schema":
+                        setEvaluationResult({
+                            data_frame: null,
+                            figures: Array(evaluationEvent.figure_count).fill(null),
+                            figure_errors: [],
+                        });
+                        setSelectedFigureIndex(0);
+                        setActiveTab(evaluationEvent.figure_count > 0 ? "figure" : "dataframe");
+                        break;
+                    case "figure":
+                        setEvaluationResult((previous) =>
+                            previous && {
+                                ...previous,
+                                figures: previous.figures.map((figure, index) =>
+                                    index === evaluationEvent.index ? evaluationEvent.figure : figure
+                                ),
+                            }
+                        );
+                        break;
+                    case "figure_error":
+                        setEvaluationResult((previous) =>
+                            previous && {
+                                ...previous,
+                                figure_errors: [
+                                    ...previous.figure_errors,
+                                    { index: evaluationEvent.index, message: evaluationEvent.message },
+                                ],
+                            }
+                        );
+                        break;
+                    case "data_frame":
+                        setEvaluationResult((previous) =>
+                            previous && { ...previous, data_frame: evaluationEvent.data_frame }
+                        );
+                        break;
+                    case "error":
+                        throw new Error(evaluationEvent.message);
+                    case "done":
+                        break;
+                }
+            });
         } catch (error) {
             setErrorMessage(
                 error instanceof Error ? error.message : "Failed to evaluate dashboard."
@@ -358,7 +409,7 @@ export default function DashboardState() {
                     <div className="mt-4">
                         {activeTab === "dataframe" && displayedDataFrame && (
                             <PandasDataFrame
-                                data={displayedDataFrame.data || []}
+                                data={getDataFrameRows(displayedDataFrame)}
                                 columns={displayedDataFrame.columns || []}
                                 index={displayedDataFrame.index || []}
                             />
@@ -385,11 +436,19 @@ export default function DashboardState() {
                                         </select>
                                     </div>
                                 )}
-                                <PlotlyFigure
-                                    data={displayedFigures[selectedFigureIndex]?.data}
-                                    layout={displayedFigures[selectedFigureIndex]?.layout}
-                                    config={displayedFigures[selectedFigureIndex]?.config}
-                                />
+                                {selectedFigureError ? (
+                                    <p className="rounded-md border border-red-200 bg-red-50 p-3 text-sm text-red-700">
+                                        {selectedFigureError.message}
+                                    </p>
+                                ) : displayedFigures[selectedFigureIndex] ? (
+                                    <PlotlyFigure
+                                        data={displayedFigures[selectedFigureIndex]?.data}
+                                        layout={displayedFigures[selectedFigureIndex]?.layout}
+                                        config={displayedFigures[selectedFigureIndex]?.config}
+                                    />
+                                ) : (
+                                    <p className="text-sm text-gray-500">Rendering figure...</p>
+                                )}
                             </div>
                         )}
 
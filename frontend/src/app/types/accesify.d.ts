@@ -533,24 +533,64 @@ export interface components {
              */
             figure_configs: (components["schemas"]["BoxChartConfig"] | components["schemas"]["ScatterChartConfig"] | components["schemas"]["PieChartConfig"] | components["schemas"]["LineChartConfig"] | components["schemas"]["HistogramChartConfig"] | components["schemas"]["BarChartConfig"])[];
         };
+        /**
+         * DashboardConfigSummary
+         * @description List view of a dashboard configuration without its chart config and parameter definitions.
+         */
+        DashboardConfigSummary: {
+            /** Pk */
+            pk: string;
+            /** Sql Dependency Id */
+            sql_dependency_id?: string | null;
+            /** Parametrized Query */
+            parametrized_query?: string | null;
+            /** Parameter Count */
+            parameter_count?: number | null;
+            /** Title */
+            title?: string | null;
+        };
         /** DashboardEvaluationRequest */
         "DashboardEvaluationRequest-Input": {
             dashboard_evaluation_sql_query: components["schemas"]["DashboardEvaluationSQLQuery-Input"];
             /** Figure Configs */
             figure_configs: (components["schemas"]["BoxChartConfig"] | components["schemas"]["ScatterChartConfig"] | components["schemas"]["PieChartConfig"] | components["schemas"]["LineChartConfig"] | components["schemas"]["HistogramChartConfig"] | components["schemas"]["BarChartConfig"])[];
+            /**
+             * Data Frame Format
+             * @default split
+             * @enum {string}
+             */
+            data_frame_format?: "split" | "columnar" | "arrow";
         };
         /** DashboardEvaluationRequest */
         "DashboardEvaluationRequest-Output": {
             dashboard_evaluation_sql_query: components["schemas"]["DashboardEvaluationSQLQuery-Output"];
             /** Figure Configs */
             figure_configs: (components["schemas"]["BoxChartConfig"] | components["schemas"]["ScatterChartConfig"] | components["schemas"]["PieChartConfig"] | components["schemas"]["LineChartConfig"] | components["schemas"]["HistogramChartConfig"] | components["schemas"]["BarChartConfig"])[];
+            /**
+             * Data Frame Format
+             * @default split
+             * @enum {string}
+             */
+            data_frame_format?: "split" | "columnar" | "arrow";
         };
         /** DashboardEvaluationResponse */
         DashboardEvaluationResponse: {
             dashboard_evaluation_request: components["schemas"]["DashboardEvaluationRequest-Output"];
             data_frame: components["schemas"]["PandasDataFrame"];
             /** Figures */
-            figures: components["schemas"]["PlotlyFigure"][];
+            figures: (components["schemas"]["PlotlyFigure"] | null)[];
+            /**
+             * Figure Errors
+             * @default []
+             */
+            figure_errors: components["schemas"]["DashboardFigureError"][];
+        };
+        /** DashboardFigureError */
+        DashboardFigureError: {
+            /** Index */
+            index: number;
+            /** Message */
+            message: string;
         };
         /** DashboardEvaluationSQLQuery */
         "DashboardEvaluationSQLQuery-Input": {
@@ -639,6 +679,12 @@ export interface components {
             default_figures: components["schemas"]["PlotlyFigure"][];
             /** Selected Sql Dependency Id */
             selected_sql_dependency_id?: string | null;
+            /**
+             * Default Dataframe Format
+             * @default split
+             * @enum {string}
+             */
+            default_dataframe_format?: "split" | "columnar";
         };
         /** HTTPValidationError */
         HTTPValidationError: {
@@ -1085,12 +1131,46 @@ export interface components {
         };
         /** PandasDataFrame */
         PandasDataFrame: {
-            /** Data */
-            data: unknown[][];
+            /**
+             * Data
+             * @default []
+             */
+            data?: unknown[][];
             /** Columns */
             columns: string[];
             /** Index */
             index?: unknown[] | null;
+            /**
+             * Truncated
+             * @default false
+             */
+            truncated?: boolean;
+            /**
+             * Format
+             * @default split
+             * @enum {string}
+             */
+            format?: "split" | "columnar" | "arrow";
+            /** Column Data */
+            column_data?: unknown[][] | null;
+            /** Dtypes */
+            dtypes?: string[] | null;
+            /** Arrow */
+            arrow?: string | null;
+        };
+        /** Page[DashboardConfigSummary] */
+        Page_DashboardConfigSummary_: {
+            /** Items */
+            items: components["schemas"]["DashboardConfigSummary"][];
+            /** Next Cursor */
+            next_cursor?: string | null;
+        };
+        /** Page[SQLDependencySummary] */
+        Page_SQLDependencySummary_: {
+            /** Items */
+            items: components["schemas"]["SQLDependencySummary"][];
+            /** Next Cursor */
+            next_cursor?: string | null;
         };
         /** PieChartConfig */
         PieChartConfig: {
@@ -1291,6 +1371,8 @@ export interface components {
             id?: string;
             /** Table Name */
             table_name: string;
+            /** Schema Name */
+            schema_name?: string | null;
             /** Description */
             description: string | null;
             /** Comment */
@@ -1301,6 +1383,26 @@ export interface components {
              */
             columns: components["schemas"]["SQLTableColumn"][];
         };
+        /**
+         * SQLDependencySummary
+         * @description List view of a SQL dependency without its tables.
+         */
+        SQLDependencySummary: {
+            /** Pk */
+            pk: string;
+            /** Name */
+            name: string;
+            /** Type */
+            type?: ("sqlite" | "postgres" | "mysql" | "mssql") | null;
+            /** Host */
+            host?: string | null;
+            /** Database */
+            database?: string | null;
+            /** Table Count */
+            table_count?: number | null;
+            /** Schema Version */
+            schema_version?: number | null;
+        };
         /** SQLJoin */
         SQLJoin: {
             /** Table */
@@ -1636,7 +1738,10 @@ export type $defs = Record<string, never>;
 export interface operations {
     get_dashboards_api_dashboard_config_get: {
         parameters: {
-            query?: never;
+            query?: {
+                cursor?: string | null;
+                limit?: number | null;
+            };
             header?: never;
             path?: never;
             cookie?: never;
@@ -1649,7 +1754,16 @@ export interface operations {
                     [name: string]: unknown;
                 };
                 content: {
-                    "application/json": components["schemas"]["DashboardConfigModel"][];
+                    "application/json": components["schemas"]["Page_DashboardConfigSummary_"];
+                };
+            };
+            /** @description Validation Error */
+            422: {
+                headers: {
+                    [name: string]: unknown;
+                };
+                content: {
+                    "application/json": components["schemas"]["HTTPValidationError"];
                 };
             };
         };
@@ -1689,7 +1803,12 @@ export interface operations {
     };
     evaluate_dashboard_config_from_state_api_dashboard_config_evaluate_state_post: {
         parameters: {
-            query?: never;
+            query?: {
+                /** @description Serve the query result from the query cache */
+                use_cache?: boolean;
+                /** @description Maximum age in seconds of a cached query result */
+                max_age?: number | null;
+            };
             header?: never;
             path?: never;
             cookie?: never;
@@ -1753,7 +1872,10 @@ export interface operations {
     };
     get_all_sql_dependencies_api_sql_dependency_get: {
         parameters: {
-            query?: never;
+            query?: {
+                cursor?: string | null;
+                limit?: number | null;
+            };
             header?: never;
             path?: never;
             cookie?: never;
@@ -1766,7 +1888,16 @@ export interface operations {
                     [name: string]: unknown;
                 };
                 content: {
-                    "application/json": components["schemas"]["SQLBaseDependencyModel"][];
+                    "application/json": components["schemas"]["Page_SQLDependencySummary_"];
+                };
+            };
+            /** @description Validation Error */
+            422: {
+                headers: {
+                    [name: string]: unknown;
+                };
+                content: {
+                    "application/json": components["schemas"]["HTTPValidationError"];
                 };
             };
         };
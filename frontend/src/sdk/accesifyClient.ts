@@ -2,12 +2,48 @@ import type { components } from "../app/types/accesify";
 
 type DashboardConfigStateInput = components["schemas"]["DashboardConfigState-Input"];
 type DashboardConfigModel = components["schemas"]["DashboardConfigModel"];
+type DashboardConfigSummary = components["schemas"]["DashboardConfigSummary"];
 type DashboardEvaluationRequest = components["schemas"]["DashboardEvaluationRequest-Input"];
 type DashboardEvaluationResponse = components["schemas"]["DashboardEvaluationResponse"];
 type DashboardState = components["schemas"]["DashboardState"];
 type ValidationError = components["schemas"]["HTTPValidationError"];
 type SqlDependencyCreateRequest = components["schemas"]["SQLBaseDependencyCreateRequest"];
 type SqlDependencyModel = components["schemas"]["SQLBaseDependencyModel"];
+type SqlDependencySummary = components["schemas"]["SQLDependencySummary"];
+type DashboardConfigPage = components["schemas"]["Page_DashboardConfigSummary_"];
+type SqlDependencySummaryPage = components["schemas"]["Page_SQLDependencySummary_"];
+type PandasDataFrame = components["schemas"]["PandasDataFrame"];
+type PlotlyFigure = components["schemas"]["PlotlyFigure"];
+type DashboardFigureError = components["schemas"]["DashboardFigureError"];
+
+/** Events of POST /api/dashboard-config/evaluate-state/stream, one JSON object per line. */
+export type DashboardEvaluationEvent =
+  | {
+      type: "schema";
+      columns: { name: string; dtype: string }[];
+      row_count: number;
+      truncated: boolean;
+      figure_count: number;
+    }
+  | { type: "figure"; index: number; figure: PlotlyFigure }
+  | { type: "figure_error"; index: number; message: string }
+  | { type: "data_frame"; data_frame: PandasDataFrame }
+  | { type: "done" }
+  | { type: "error"; message: string };
+
+export interface ListOptions {
+  /** Cursor returned as `next_cursor` by the previous page. */
+  cursor?: string;
+  /** Approximate page size. Without a limit, everything is returned in one page. */
+  limit?: number;
+}
+
+export interface EvaluationOptions {
+  /** Serve the query result from the query cache, defaults to true. */
+  useCache?: boolean;
+  /** Maximum age in seconds of a cached query result, e.g. 0 to refresh it. */
+  maxAge?: number;
+}
 
 export interface AccesifyClientOptions {
   /** Override the base URL for the FastAPI service (e.g. http://localhost:8000). */
@@ -55,29 +91,74 @@ export class AccesifyClient {
       },
     });
 
-    const contentType = response.headers.get("content-type") ?? "";
-    const isJson = contentType.includes("application/json");
-    const payload = isJson ? await response.json() : await response.text();
+    const payload = await this.readPayload(response);
 
     if (!response.ok) {
-      const error = new Error(
-        typeof payload === "object" && payload !== null && "detail" in payload
-          ? String((payload as { detail: unknown }).detail)
-          : response.statusText || "Request failed"
-      ) as Error & { status: number; body: ApiErrorBody | string };
-      error.status = response.status;
-      error.body = (payload as ApiErrorBody) ?? null;
-      throw error;
+      throw this.buildError(response, payload);
     }
 
     return payload as T;
   }
 
-  /** GET /api/dashboard-config */
-  async getDashboards(): Promise<DashboardConfigModel[]> {
-    return this.request<DashboardConfigModel[]>("/api/dashboard-config", {
-      method: "GET",
-    });
+  private async readPayload(response: Response): Promise<unknown> {
+    const contentType = response.headers.get("content-type") ?? "";
+    const isJson = contentType.includes("application/json");
+    return isJson ? response.json() : response.text();
+  }
+
+  private buildError(response: Response, payload: unknown): Error {
+    const error = new Error(
+      typeof payload === "object" && payload !== null && "detail" in payload
+        ? String((payload as { detail: unknown }).detail)
+        : response.statusText || "Request failed"
+    ) as Error & { status: number; body: ApiErrorBody | string };
+    error.status = response.status;
+    error.body = (payload as ApiErrorBody) ?? null;
+    return error;
+  }
+
+  private buildListPath(path: string, options: ListOptions): string {
+    const params = new URLSearchParams();
+
+    if (options.cursor !== undefined) {
+      params.set("cursor", options.cursor);
+    }
+    if (options.limit !== undefined) {
+      params.set("limit", String(options.limit));
+    }
+
+    const query = params.toString();
+    return query ? `${path}?${query}` : path;
+  }
+
+  private buildEvaluationPath(path: string, options: EvaluationOptions): string {
+    const params = new URLSearchParams();
+
+    if (options.useCache !== undefined) {
+      params.set("use_cache", String(options.useCache));
+    }
+    if (options.maxAge !== undefined) {
+      params.set("max_age", String(options.maxAge));
+    }
+
+    const query = params.toString();
+    return query ? `${path}?${query}` : path;
+  }
+
+  /** GET /api/dashboard-config (all dashboards in one request) */
+  async getDashboards(): Promise<DashboardConfigSummary[]> {
+    const page = await this.getDashboardPage();
+    return page.items;
+  }
+
+  /** GET /api/dashboard-config?cursor=&limit= */
+  async getDashboardPage(options: ListOptions = {}): Promise<DashboardConfigPage> {
+    return this.request<DashboardConfigPage>(
+      this.buildListPath("/api/dashboard-config", options),
+      {
+        method: "GET",
+      }
+    );
   }
 
   /** POST /api/dashboard-config */
@@ -95,10 +176,11 @@ export class AccesifyClient {
 
   /** POST /api/dashboard-config/evaluate-state */
   async evaluateDashboard(
-    payload: DashboardEvaluationRequest
+    payload: DashboardEvaluationRequest,
+    options: EvaluationOptions = {}
   ): Promise<DashboardEvaluationResponse> {
     return this.request<DashboardEvaluationResponse>(
-      "/api/dashboard-config/evaluate-state",
+      this.buildEvaluationPath("/api/dashboard-config/evaluate-state", options),
       {
       method: "POST",
       headers: {
@@ -109,6 +191,64 @@ export class AccesifyClient {
     );
   }
 
+  /**
+   * POST /api/dashboard-config/evaluate-state/stream
+   *
+   * Calls `onEvent` for every newline delimited JSON event as it arrives: the schema of the
+   * data frame first, then each figure as soon as it is rendered, the data frame and a done event.
+   */
+  async evaluateDashboardStream(
+    payload: DashboardEvaluationRequest,
+    onEvent: (event: DashboardEvaluationEvent) => void,
+    signal?: AbortSignal,
+    options: EvaluationOptions = {}
+  ): Promise<void> {
+    const response = await this.fetchImpl(
+      this.buildUrl(
+        this.buildEvaluationPath("/api/dashboard-config/evaluate-state/stream", options)
+      ),
+      {
+        method: "POST",
+        headers: {
+          Accept: "application/x-ndjson",
+          "Content-Type": "application/json",
+        },
+        body: JSON.stringify(payload),
+        signal,
+      }
+    );
+
+    if (!response.ok) {
+      throw this.buildError(response, await this.readPayload(response));
+    }
+
+    if (!response.body) {
+      throw new Error("Streaming responses are not supported by this fetch implementation.");
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = "";
+
+    for (;;) {
+      const { done, value } = await reader.read();
+      buffered += decoder.decode(value, { stream: !done });
+
+      const lines = buffered.split("\n");
+      buffered = done ? "" : lines.pop() ?? "";
+
+      for (const line of lines) {
+        if (line.trim()) {
+          onEvent(JSON.parse(line) as DashboardEvaluationEvent);
+        }
+      }
+
+      if (done) {
+        return;
+      }
+    }
+  }
+
   /** GET /api/state/{state_id} */
   async getAgentState(stateId: string): Promise<DashboardState> {
     return this.request<DashboardState>(`/api/state/${encodeURIComponent(stateId)}`, {
@@ -116,11 +256,22 @@ export class AccesifyClient {
     });
   }
 
-  /** GET /api/sql-dependency */
-  async getSqlDependencies(): Promise<SqlDependencyModel[]> {
-    return this.request<SqlDependencyModel[]>("/api/sql-dependency", {
-      method: "GET",
-    });
+  /** GET /api/sql-dependency (summaries of all dependencies in one request) */
+  async getSqlDependencies(): Promise<SqlDependencySummary[]> {
+    const page = await this.getSqlDependencyPage();
+    return page.items;
+  }
+
+  /** GET /api/sql-dependency?cursor=&limit= */
+  async getSqlDependencyPage(
+    options: ListOptions = {}
+  ): Promise<SqlDependencySummaryPage> {
+    return this.request<SqlDependencySummaryPage>(
+      this.buildListPath("/api/sql-dependency", options),
+      {
+        method: "GET",
+      }
+    );
   }
 
   /** POST /api/sql-dependency */
@@ -140,12 +291,42 @@ export class AccesifyClient {
 export type {
   DashboardConfigStateInput,
   DashboardConfigModel,
+  DashboardConfigSummary,
   DashboardEvaluationRequest,
   DashboardEvaluationResponse,
   DashboardState,
   ValidationError,
   SqlDependencyCreateRequest,
   SqlDependencyModel,
+  SqlDependencySummary,
+  DashboardConfigPage,
+  SqlDependencySummaryPage,
+  PandasDataFrame,
+  PlotlyFigure,
+  DashboardFigureError,
 };
 
+/**
+ * Returns the cells of a data frame row by row, whichever of the split or columnar formats it was sent in.
+ * Arrow payloads need an Arrow reader, so they are rejected instead of rendering as an empty table.
+ */
+export function getDataFrameRows(dataFrame: PandasDataFrame): unknown[][] {
+  if (dataFrame.format === "arrow") {
+    throw new Error(
+      'Arrow data frames cannot be displayed, request the "columnar" format instead.'
+    );
+  }
+
+  if (dataFrame.format !== "columnar") {
+    return dataFrame.data ?? [];
+  }
+
+  const columnData = dataFrame.column_data ?? [];
+  const rowCount = columnData.length > 0 ? columnData[0].length : 0;
+
+  return Array.from({ length: rowCount }, (_, rowIndex) =>
+    columnData.map((values) => values[rowIndex])
+  );
+}
+
 export const accesifyClient = new AccesifyClient();